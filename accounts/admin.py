@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
-from .models import UserProfile, OTP
+from .models import UserProfile, OTP, UserSession
 
 class UserProfileInline(admin.StackedInline):
     model = UserProfile
@@ -33,3 +33,10 @@ class OTPAdmin(admin.ModelAdmin):
         return not obj.is_valid()
     is_expired.boolean = True
     is_expired.short_description = 'Expired'
+
+
+@admin.register(UserSession)
+class UserSessionAdmin(admin.ModelAdmin):
+    list_display = ['user', 'session_key', 'created_at', 'expire_date']
+    search_fields = ['user__username', 'session_key']
+    readonly_fields = ['created_at']
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from accounts.models import UserSession
+
+
+class Command(BaseCommand):
+    help = 'Remove expired entries from the per-user session index (run alongside clearsessions)'
+
+    def handle(self, *args, **kwargs):
+        count = UserSession.clear_expired()
+        self.stdout.write(self.style.SUCCESS(f'Removed {count} expired user sessions'))
@@ -1,6 +1,5 @@
 from django.contrib.auth import logout
-from django.contrib.sessions.models import Session
-from django.utils import timezone
+from .models import UserSession
 
 
 class SingleDeviceLoginMiddleware:
@@ -18,28 +17,16 @@ class SingleDeviceLoginMiddleware:
             current_session_key = request.session.session_key
             
             if current_session_key:
-                # Get all active sessions for this user
-                user_sessions = []
-                all_sessions = Session.objects.filter(expire_date__gte=timezone.now())
+                # Most recent login for this user (cache hit or one indexed lookup)
+                latest_session_key = UserSession.get_current_session_key(request.user.id)
                 
-                for session in all_sessions:
-                    session_data = session.get_decoded()
-                    if session_data.get('_auth_user_id') == str(request.user.id):
-                        user_sessions.append({
-                            'session_key': session.session_key,
-                            'expire_date': session.expire_date
-                        })
-                
-                # If there are multiple sessions, keep only the most recent one
-                if len(user_sessions) > 1:
-                    # Sort by expire_date (most recent last)
-                    user_sessions.sort(key=lambda x: x['expire_date'])
-                    
-                    # If current session is not the most recent, log out
-                    if current_session_key != user_sessions[-1]['session_key']:
-                        logout(request)
-                        # Don't redirect here, just log out silently
-                        # The user will be redirected by LoginRequiredMixin on next protected view
+                if latest_session_key is None:
+                    # Session predates the index: adopt it as the current one
+                    UserSession.register(request.user, request.session)
+                elif current_session_key != latest_session_key:
+                    logout(request)
+                    # Don't redirect here, just log out silently
+                    # The user will be redirected by LoginRequiredMixin on next protected view
 
         response = self.get_response(request)
         return response
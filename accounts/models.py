@@ -1,8 +1,12 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.conf import settings
+from django.core.cache import cache
 from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
+from importlib import import_module
 import random
 import string
 
@@ -135,3 +139,80 @@ class OTP(models.Model):
                 return None
         except cls.DoesNotExist:
             return None
+
+
+class UserSession(models.Model):
+    """Index of each user's login session, so single-device checks never scan django_session"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='login_sessions')
+    session_key = models.CharField(max_length=40, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expire_date = models.DateTimeField()
+
+    # Cached "current session key" per user
+    CACHE_KEY = 'accounts:current_session:{}'
+    CACHE_TIMEOUT = 300
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['expire_date']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.session_key}"
+
+    @classmethod
+    def get_current_session_key(cls, user_id):
+        """Key of the user's most recent login, from cache or one indexed lookup"""
+        cache_key = cls.CACHE_KEY.format(user_id)
+        session_key = cache.get(cache_key)
+        if session_key is None:
+            session_key = cls.objects.filter(
+                user_id=user_id,
+                expire_date__gte=timezone.now()
+            ).values_list('session_key', flat=True).first()
+            if session_key:
+                cache.set(cache_key, session_key, cls.CACHE_TIMEOUT)
+        return session_key
+
+    @classmethod
+    def register(cls, user, session):
+        """Make ``session`` the user's only session, ending every other one"""
+        session_store = import_module(settings.SESSION_ENGINE).SessionStore
+        old_keys = list(
+            cls.objects.filter(user=user).exclude(
+                session_key=session.session_key
+            ).values_list('session_key', flat=True)
+        )
+        for old_key in old_keys:
+            session_store(session_key=old_key).delete()
+
+        cls.objects.filter(user=user).exclude(session_key=session.session_key).delete()
+        cls.objects.update_or_create(
+            session_key=session.session_key,
+            defaults={'user': user, 'expire_date': session.get_expiry_date()}
+        )
+        cache.set(cls.CACHE_KEY.format(user.id), session.session_key, cls.CACHE_TIMEOUT)
+
+    @classmethod
+    def unregister(cls, user_id, session_key):
+        cls.objects.filter(session_key=session_key).delete()
+        cache.delete(cls.CACHE_KEY.format(user_id))
+
+    @classmethod
+    def clear_expired(cls):
+        return cls.objects.filter(expire_date__lt=timezone.now()).delete()[0]
+
+
+# Signals to keep the session index in step with logins and logouts
+@receiver(user_logged_in)
+def register_user_session(sender, request, user, **kwargs):
+    if request.session.session_key is None:
+        request.session.save()
+    UserSession.register(user, request.session)
+
+@receiver(user_logged_out)
+def unregister_user_session(sender, request, user, **kwargs):
+    if user is not None and request.session.session_key:
+        UserSession.unregister(user.id, request.session.session_key)
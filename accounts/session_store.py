@@ -0,0 +1,83 @@
+"""
+Session engine that keeps page views off the database write path.
+
+Sessions live in the shared cache with django_session behind it, like
+Django's cached_db engine. The difference is in save(): the row and its cache
+entry are only written when the session data changed since it was loaded, or
+when the expiry stored in the row has fallen more than
+SESSION_DB_WRITE_INTERVAL seconds behind. With SESSION_SAVE_EVERY_REQUEST the
+expiry still slides, in steps of that interval; neither the database nor the
+cache sees more than one write per interval per idle session instead of one
+per page view. An idle session can end up to one interval early.
+
+Keys, key cycling and deletion work exactly as in cached_db, so
+UserSession.register() and SingleDeviceLoginMiddleware are unaffected.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+
+KEY_PREFIX = 'accounts.session_store'
+
+
+def get_write_interval():
+    return getattr(settings, 'SESSION_DB_WRITE_INTERVAL', 300)
+
+
+class SessionStore(CachedDBStore):
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        # What the database row holds, as far as this request knows
+        self._stored_digest = None
+        self._stored_expiry = None
+
+    def _digest(self, data):
+        return hashlib.md5(self.serializer().dumps(data)).hexdigest()
+
+    def _remember(self, data, stored_expiry):
+        self._stored_digest = self._digest(data)
+        self._stored_expiry = stored_expiry
+
+    def load(self):
+        try:
+            entry = self._cache.get(self.cache_key)
+        except Exception:
+            # Invalid cache key: start a new session, as cached_db does
+            entry = None
+
+        if entry is None:
+            s = self._get_session_from_db()
+            if not s:
+                return {}
+            entry = {'data': self.decode(s.session_data), 'stored_expiry': s.expire_date.timestamp()}
+            self._cache.set(self.cache_key, entry, self.get_expiry_age(expiry=s.expire_date))
+
+        self._remember(entry['data'], entry['stored_expiry'])
+        return entry['data']
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+
+        data = self._get_session(no_load=must_create)
+        expiry_age = self.get_expiry_age()
+        unchanged = (
+            not must_create
+            and self._stored_expiry is not None
+            and self._digest(data) == self._stored_digest
+            and time.time() + expiry_age - self._stored_expiry < get_write_interval()
+        )
+        if unchanged:
+            # The cache entry expires with the row; both slide once the interval is up
+            return
+
+        # Skip cached_db's save, which would cache the bare session dict
+        DBStore.save(self, must_create)
+        stored_expiry = self.get_expiry_date().timestamp()
+        self._cache.set(self.cache_key, {'data': self._session, 'stored_expiry': stored_expiry}, expiry_age)
+        self._remember(self._session, stored_expiry)
@@ -1,7 +1,8 @@
-from django.core.mail import send_mail
 from django.conf import settings
+from django.db import transaction
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
+from notifications.outbox import queue_email
 
 
 def send_otp_email(email, otp_code, otp_type):
@@ -39,14 +40,11 @@ def send_otp_email(email, otp_code, otp_type):
         """
     
     try:
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[email],
-            fail_silently=False,
-        )
+        # Delivered by the outbox worker once the caller's transaction commits. Own
+        # savepoint, so a failed insert leaves the caller's transaction usable
+        with transaction.atomic():
+            queue_email(subject=subject, body=message, to=[email])
         return True
     except Exception as e:
-        print(f"Error sending email: {e}")
+        print(f"Error queueing email: {e}")
         return False
@@ -4,12 +4,12 @@ from django.contrib.auth.models import User
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import LoginView as BaseLoginView
 from django.contrib.auth.hashers import make_password
-from django.contrib.sessions.models import Session
 from django.views.generic import CreateView, TemplateView, UpdateView, ListView
 from django.views import View
 from django.contrib import messages
 from django.urls import reverse_lazy
 from django.db import transaction
+from django.db.models import Prefetch
 from django.utils import timezone
 from django.http import JsonResponse
 from .forms import (
@@ -20,6 +20,7 @@ from .forms import (
 from .models import UserProfile, OTP
 from .utils import send_otp_email
 from products.models import Product, Wishlist
+from products.pagination import CursorPaginationMixin
 
 
 class LoginView(BaseLoginView):
@@ -30,16 +31,8 @@ class LoginView(BaseLoginView):
         # Get the user before login
         user = form.get_user()
         
-        # Delete all existing sessions for this user
-        # Get all sessions
-        all_sessions = Session.objects.filter(expire_date__gte=timezone.now())
-        
-        for session in all_sessions:
-            session_data = session.get_decoded()
-            if session_data.get('_auth_user_id') == str(user.id):
-                session.delete()
-        
-        # Now perform the login (creates a new session)
+        # Perform the login (creates a new session); the user_logged_in
+        # signal ends the user's sessions on every other device
         response = super().form_valid(form)
         
         messages.success(self.request, f'Welcome back, {user.username}! You have been logged in.')
@@ -54,15 +47,7 @@ class RegisterView(CreateView):
     def form_valid(self, form):
         response = super().form_valid(form)
         
-        # Clear any existing sessions for this user (shouldn't be any for new user, but just in case)
-        user = self.object
-        all_sessions = Session.objects.filter(expire_date__gte=timezone.now())
-        for session in all_sessions:
-            session_data = session.get_decoded()
-            if session_data.get('_auth_user_id') == str(user.id):
-                session.delete()
-        
-        # Login the new user
+        # Login the new user (any other sessions are ended by the user_logged_in signal)
         login(self.request, self.object)
         messages.success(self.request, 'Registration successful! Welcome to STUDISWAP.')
         return response
@@ -121,20 +106,26 @@ class PublicProfileView(TemplateView):
         context['products'] = Product.objects.filter(
             seller=user, 
             status='active'
-        ).order_by('-created_at')[:10]
+        ).with_primary_image().order_by('-created_at')[:10]
         context['products_count'] = Product.objects.filter(
             seller=user, 
             status='active'
         ).count()
         return context
 
-class MyProductsView(LoginRequiredMixin, ListView):
+class MyProductsView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     template_name = 'accounts/my_products.html'
     context_object_name = 'products'
     paginate_by = 12
+    cursor_fragment_template = 'accounts/_my_product_cards.html'
 
     def get_queryset(self):
-        return Product.objects.filter(seller=self.request.user).order_by('-created_at')
+        return Product.objects.filter(seller=self.request.user).select_related(
+            'category'
+        ).with_primary_image().order_by('-created_at', '-id')
+
+    def get_cursor_ordering(self):
+        return ('-created_at', '-id')
 
 class MyWishlistView(LoginRequiredMixin, ListView):
     template_name = 'accounts/my_wishlist.html'
@@ -142,7 +133,9 @@ class MyWishlistView(LoginRequiredMixin, ListView):
     paginate_by = 12
 
     def get_queryset(self):
-        return Wishlist.objects.filter(user=self.request.user).select_related('product').order_by('-created_at')
+        return Wishlist.objects.filter(user=self.request.user).prefetch_related(
+            Prefetch('product', queryset=Product.objects.select_related('category').with_primary_image())
+        ).order_by('-created_at')
 
 
 # OTP-based Registration Views
@@ -168,15 +161,17 @@ class RegisterStepOneView(View):
                 'password': form.cleaned_data['password1'],
             }
             
-            # Generate and send OTP
+            # Generate and queue the OTP email together
             email = form.cleaned_data['email']
-            otp = OTP.generate_otp(
-                email=email,
-                otp_type='registration',
-                temp_data=request.session['registration_data']
-            )
+            with transaction.atomic():
+                otp = OTP.generate_otp(
+                    email=email,
+                    otp_type='registration',
+                    temp_data=request.session['registration_data']
+                )
+                sent = send_otp_email(email, otp.otp_code, 'registration')
             
-            if send_otp_email(email, otp.otp_code, 'registration'):
+            if sent:
                 messages.success(request, f'Verification code sent to {email}')
                 return redirect('accounts:register_verify_otp')
             else:
@@ -256,13 +251,15 @@ class ResendOTPView(View):
         email = request.session['registration_data'].get('email')
         
         # Generate new OTP
-        otp = OTP.generate_otp(
-            email=email,
-            otp_type='registration',
-            temp_data=request.session['registration_data']
-        )
+        with transaction.atomic():
+            otp = OTP.generate_otp(
+                email=email,
+                otp_type='registration',
+                temp_data=request.session['registration_data']
+            )
+            sent = send_otp_email(email, otp.otp_code, 'registration')
         
-        if send_otp_email(email, otp.otp_code, 'registration'):
+        if sent:
             messages.success(request, f'New verification code sent to {email}')
         else:
             messages.error(request, 'Failed to send verification email.')
@@ -286,10 +283,12 @@ class PasswordResetRequestView(View):
         if form.is_valid():
             email = form.cleaned_data['email']
             
-            # Generate and send OTP
-            otp = OTP.generate_otp(email=email, otp_type='password_reset')
+            # Generate and queue the OTP email together
+            with transaction.atomic():
+                otp = OTP.generate_otp(email=email, otp_type='password_reset')
+                sent = send_otp_email(email, otp.otp_code, 'password_reset')
             
-            if send_otp_email(email, otp.otp_code, 'password_reset'):
+            if sent:
                 request.session['reset_email'] = email
                 messages.success(request, f'Password reset code sent to {email}')
                 return redirect('accounts:password-reset-confirm')
@@ -356,9 +355,11 @@ class ResendPasswordResetOTPView(View):
         email = request.session['reset_email']
         
         # Generate new OTP
-        otp = OTP.generate_otp(email=email, otp_type='password_reset')
+        with transaction.atomic():
+            otp = OTP.generate_otp(email=email, otp_type='password_reset')
+            sent = send_otp_email(email, otp.otp_code, 'password_reset')
         
-        if send_otp_email(email, otp.otp_code, 'password_reset'):
+        if sent:
             messages.success(request, f'New reset code sent to {email}')
         else:
             messages.error(request, 'Failed to send reset email.')
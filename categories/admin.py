@@ -8,4 +8,5 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description']
     prepopulated_fields = {'slug': ('name',)}
     list_editable = ['is_active']
+    readonly_fields = ['path', 'active_product_count']
     ordering = ['name']
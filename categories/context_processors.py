@@ -0,0 +1,7 @@
+from django.utils.functional import SimpleLazyObject
+from .tree import get_tree
+
+
+def category_tree(request):
+    """Expose the cached category tree to templates, loaded only if used"""
+    return {'category_tree': SimpleLazyObject(get_tree)}
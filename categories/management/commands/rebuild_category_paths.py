@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from categories.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Recompute the materialized path of every category from its parent links'
+
+    def handle(self, *args, **kwargs):
+        changed = Category.rebuild_paths()
+        self.stdout.write(self.style.SUCCESS(f'Category paths rebuilt ({changed} corrected)'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from categories.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Recompute the active product count of every category, including subcategory rollups'
+
+    def handle(self, *args, **kwargs):
+        changed = Category.reconcile_product_counts()
+        self.stdout.write(self.style.SUCCESS(f'Category product counts reconciled ({changed} corrected)'))
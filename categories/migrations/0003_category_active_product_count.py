@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:00
+
+from django.db import migrations, models
+
+
+def seed_counts(apps, schema_editor):
+    Category = apps.get_model('categories', 'Category')
+    Product = apps.get_model('products', 'Product')
+
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+    totals = dict.fromkeys(parents, 0)
+    direct = (
+        Product.objects.filter(status='active').order_by()
+        .values_list('category_id').annotate(total=models.Count('id'))
+    )
+    for category_id, count in direct:
+        seen = set()
+        while category_id in totals and category_id not in seen:
+            seen.add(category_id)
+            totals[category_id] += count
+            category_id = parents[category_id]
+
+    for category_id, total in totals.items():
+        if total:
+            Category.objects.filter(pk=category_id).update(active_product_count=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0002_category_icon'),
+        ('products', '0006_product_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='active_product_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(seed_counts, migrations.RunPython.noop),
+    ]
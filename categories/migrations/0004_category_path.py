@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:01
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    Category = apps.get_model('categories', 'Category')
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+
+    def build(category_id, seen=()):
+        parent_id = parents.get(category_id)
+        if parent_id is None or parent_id in seen:
+            return f'/{category_id}/'
+        return f'{build(parent_id, seen + (category_id,))}{category_id}/'
+
+    for category_id in parents:
+        Category.objects.filter(pk=category_id).update(path=build(category_id))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0003_category_active_product_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
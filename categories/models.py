@@ -1,5 +1,26 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.urls import reverse
+from . import tree
+
+
+def subtree_range(path):
+    """
+    (lower, upper) bounds of every path under ``path``, itself included.
+    Paths end in '/' and '0' sorts right after it, so '/1/5/' covers
+    '/1/5/' up to but not including '/1/50'.
+    """
+    return path, path[:-1] + '0'
+
+
+class CategoryQuerySet(models.QuerySet):
+    def subtree(self, path):
+        """A category and all its descendants, as one indexed range scan on path"""
+        lower, upper = subtree_range(path)
+        return self.filter(path__gte=lower, path__lt=upper)
+
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -8,10 +29,17 @@ class Category(models.Model):
     icon = models.CharField(max_length=50, default='fas fa-tag', help_text='Font Awesome icon class (e.g., fas fa-book)')
     image = models.ImageField(upload_to='categories/', blank=True, null=True)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, blank=True, null=True, related_name='subcategories')
+    # Materialized path of ids from the root, e.g. '/1/5/12/'; maintained by save()
+    path = models.CharField(max_length=255, blank=True, db_index=True, editable=False)
     is_active = models.BooleanField(default=True)
+    # Active products in this category and every category below it, kept
+    # current by products.signals and repaired by reconcile_category_counts
+    active_product_count = models.IntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CategoryQuerySet.as_manager()
+
     class Meta:
         verbose_name_plural = "Categories"
         ordering = ['name']
@@ -19,6 +47,64 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    def clean(self):
+        super().clean()
+        if self.pk and self.parent_id and self.parent.path.startswith(self.path or f'/{self.pk}/'):
+            raise ValidationError({'parent': 'A category cannot be placed under itself or its subcategories.'})
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+
+        if self._state.adding:
+            # The path ends in our own id, so it can only be written once we have one
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                self.path = self._build_path()
+                Category.objects.filter(pk=self.pk).update(path=self.path)
+            return
+
+        # The counter and path are only ever changed with UPDATEs; never write back a stale copy
+        if update_fields is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in ('active_product_count', 'path')
+            ]
+        if update_fields is not None and 'parent' not in update_fields:
+            super().save(*args, **kwargs)
+            return
+
+        with transaction.atomic():
+            old_path = Category.objects.filter(pk=self.pk).values_list('path', flat=True).first()
+            super().save(*args, **kwargs)
+            self.path = self._build_path()
+            if old_path and old_path != self.path:
+                # Re-root the whole subtree in one statement
+                Category.objects.subtree(old_path).update(
+                    path=Concat(Value(self.path), Substr('path', len(old_path) + 1))
+                )
+            elif not old_path:
+                Category.objects.filter(pk=self.pk).update(path=self.path)
+
+    def _build_path(self):
+        parent_path = '/'
+        if self.parent_id:
+            parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or '/'
+        return f'{parent_path}{self.pk}/'
+
+    @property
+    def ancestor_ids(self):
+        """Ids from the root down to the parent, read off the path"""
+        return [int(part) for part in self.path.strip('/').split('/')[:-1] if part]
+
+    def get_ancestors(self):
+        """Breadcrumb trail from the root, in one query"""
+        ancestors = Category.objects.in_bulk(self.ancestor_ids)
+        return [ancestors[pk] for pk in self.ancestor_ids if pk in ancestors]
+
+    def get_descendants(self, include_self=False):
+        queryset = Category.objects.subtree(self.path)
+        return queryset if include_self else queryset.exclude(pk=self.pk)
+
     def get_absolute_url(self):
         return reverse('categories:category_detail', kwargs={'slug': self.slug})
 
@@ -29,3 +115,69 @@ class Category(models.Model):
     @property
     def is_parent(self):
         return self.parent is None
+
+    @classmethod
+    def get_lineage_ids(cls, category_id):
+        """``category_id`` and the ids of all its ancestors, from its path in one query"""
+        path = cls.objects.filter(pk=category_id).values_list('path', flat=True).first()
+        if not path:
+            return [category_id]
+        return [int(part) for part in path.strip('/').split('/')]
+
+    @classmethod
+    def adjust_active_product_count(cls, category_id, delta):
+        """Add ``delta`` to a category's count and to every ancestor's rollup"""
+        if delta and category_id is not None:
+            cls.objects.filter(pk__in=cls.get_lineage_ids(category_id)).update(
+                active_product_count=F('active_product_count') + delta
+            )
+            transaction.on_commit(tree.invalidate_product_counts)
+
+    @classmethod
+    def rebuild_paths(cls):
+        """Recompute every path from the parent links; returns the number fixed"""
+        categories = list(cls.objects.only('id', 'parent_id', 'path'))
+        parents = {category.pk: category.parent_id for category in categories}
+
+        def build(category_id, seen=()):
+            parent_id = parents.get(category_id)
+            if parent_id is None or parent_id in seen:
+                return f'/{category_id}/'
+            return f'{build(parent_id, seen + (category_id,))}{category_id}/'
+
+        changed = []
+        for category in categories:
+            path = build(category.pk)
+            if category.path != path:
+                category.path = path
+                changed.append(category)
+        cls.objects.bulk_update(changed, ['path'])
+        transaction.on_commit(tree.invalidate)
+        return len(changed)
+
+    @classmethod
+    def reconcile_product_counts(cls):
+        """Recompute every rollup from the products table in two queries and one bulk update"""
+        from products.models import Product
+
+        direct = dict(
+            Product.objects.filter(status='active').order_by().values_list('category_id')
+            .annotate(total=models.Count('id'))
+        )
+        categories = list(cls.objects.only('id', 'parent_id', 'active_product_count'))
+        parents = {category.pk: category.parent_id for category in categories}
+
+        totals = dict.fromkeys(parents, 0)
+        for category_id, count in direct.items():
+            seen = set()
+            while category_id in totals and category_id not in seen:
+                seen.add(category_id)
+                totals[category_id] += count
+                category_id = parents[category_id]
+
+        changed = [category for category in categories if category.active_product_count != totals[category.pk]]
+        for category in changed:
+            category.active_product_count = totals[category.pk]
+        cls.objects.bulk_update(changed, ['active_product_count'])
+        transaction.on_commit(tree.invalidate_product_counts)
+        return len(changed)
@@ -0,0 +1,36 @@
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from .models import Category
+from . import tree
+
+# Stand-in for a parent that was deferred when the instance was loaded
+UNKNOWN = object()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree(sender, **kwargs):
+    """Bump the tree version once the change is visible to other connections"""
+    transaction.on_commit(tree.invalidate)
+    # Counts leave out inactive categories
+    transaction.on_commit(tree.invalidate_product_counts)
+
+
+@receiver(post_init, sender=Category)
+def remember_parent(sender, instance, **kwargs):
+    instance._counted_parent = instance.__dict__.get('parent_id', UNKNOWN)
+
+
+@receiver(post_save, sender=Category)
+def move_product_rollup(sender, instance, created, **kwargs):
+    """Re-parenting carries the subtree's products from the old ancestors to the new ones"""
+    previous = instance._counted_parent
+    instance._counted_parent = instance.parent_id
+    if created or previous is UNKNOWN or previous == instance.parent_id:
+        return
+
+    count = Category.objects.filter(pk=instance.pk).values_list('active_product_count', flat=True).first()
+    if count:
+        Category.adjust_active_product_count(previous, -count)
+        Category.adjust_active_product_count(instance.parent_id, count)
@@ -0,0 +1,225 @@
+"""
+In-process category tree.
+
+The whole categories table is small and read on almost every page, so it is
+loaded once into immutable nodes indexed by id and slug and shared by
+forms, views and templates. A version number in the cache is bumped whenever
+a Category is saved or deleted (see categories.signals); each process
+compares it with the version its tree was built from and reloads with a
+single query when they differ, or after CATEGORY_TREE_TIMEOUT as a backstop.
+
+Product counts change with every listing, so they are not part of the tree:
+nodes read them from a {category id: count} dict cached under its own
+version, which a product write bumps without touching the tree. Like the
+category page's listing, a count leaves out products in inactive categories
+of the subtree, so a category change bumps the counts too.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+
+VERSION_KEY = 'categories:tree:version'
+COUNTS_VERSION_KEY = 'categories:counts:version'
+COUNTS_KEY = 'categories:counts:{}'
+
+# Category columns copied onto each node
+FIELDS = (
+    'id', 'name', 'slug', 'description', 'icon', 'image', 'parent_id', 'path', 'is_active',
+)
+
+_tree = None
+_lock = threading.Lock()
+
+
+def get_timeout():
+    return getattr(settings, 'CATEGORY_TREE_TIMEOUT', 300)
+
+
+class CategoryNode:
+    """Read-only stand-in for a Category row, usable in templates"""
+
+    __slots__ = (
+        'id', 'pk', 'name', 'slug', 'description', 'icon', 'image', 'parent_id', 'path',
+        'is_active', 'parent', 'children',
+    )
+
+    def __init__(self, row):
+        for field in FIELDS:
+            object.__setattr__(self, field, row[field])
+        object.__setattr__(self, 'pk', row['id'])
+        object.__setattr__(self, 'parent', None)
+        object.__setattr__(self, 'children', ())
+
+    def __setattr__(self, name, value):
+        raise AttributeError('CategoryNode is immutable')
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return f'<CategoryNode {self.slug}>'
+
+    def get_absolute_url(self):
+        return reverse('categories:category_detail', kwargs={'slug': self.slug})
+
+    @property
+    def get_subcategories(self):
+        """Active children, like Category.get_subcategories"""
+        return self.children
+
+    @property
+    def is_parent(self):
+        return self.parent_id is None
+
+    @property
+    def active_product_count(self):
+        return get_product_counts().get(self.id, 0)
+
+
+class CategoryTree:
+    """Every category, linked to its parent and active children"""
+
+    def __init__(self, rows, version=None):
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+        nodes = {row['id']: CategoryNode(row) for row in rows}
+        children = {}
+        for node in sorted(nodes.values(), key=lambda node: node.name):
+            if node.parent_id in nodes:
+                object.__setattr__(node, 'parent', nodes[node.parent_id])
+                if node.is_active:
+                    children.setdefault(node.parent_id, []).append(node)
+
+        for parent_id, child_nodes in children.items():
+            object.__setattr__(nodes[parent_id], 'children', tuple(child_nodes))
+
+        self.by_id = nodes
+        self.by_slug = {node.slug: node for node in nodes.values()}
+        self.active = tuple(sorted((node for node in nodes.values() if node.is_active), key=lambda node: node.name))
+        self.roots = tuple(node for node in self.active if node.parent_id is None)
+
+    @classmethod
+    def from_database(cls, version=None):
+        from .models import Category
+
+        rows = Category.objects.values(*FIELDS)
+        return cls(list(rows), version)
+
+    def get(self, category_id):
+        return self.by_id.get(category_id)
+
+    def get_by_slug(self, slug, active_only=True):
+        node = self.by_slug.get(slug)
+        if node is None or (active_only and not node.is_active):
+            return None
+        return node
+
+    def descendants(self, node):
+        """Active categories below ``node``, at any depth"""
+        found = []
+        stack = list(reversed(node.children))
+        while stack:
+            child = stack.pop()
+            found.append(child)
+            stack.extend(reversed(child.children))
+        return found
+
+    def ancestors(self, node):
+        """Breadcrumb trail from the root down to ``node``'s parent"""
+        trail = []
+        parent = node.parent
+        while parent is not None and parent not in trail:
+            trail.append(parent)
+            parent = parent.parent
+        return list(reversed(trail))
+
+    def choices(self, label=None):
+        """(id, label) pairs for every active category, ordered by name"""
+        label = label or str
+        return [(node.id, label(node)) for node in self.active]
+
+
+def _current_version(key=VERSION_KEY):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, None)
+        version = cache.get(key, 1)
+    return version
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def get_tree():
+    """The category tree, reloaded if a category changed since it was built"""
+    global _tree
+
+    version = _current_version()
+    tree = _tree
+    if tree is not None and tree.version == version and time.monotonic() - tree.loaded_at < get_timeout():
+        return tree
+
+    with _lock:
+        if _tree is tree:
+            _tree = CategoryTree.from_database(version)
+        return _tree
+
+
+def invalidate():
+    """Make every process reload the tree on its next access"""
+    global _tree
+
+    _bump(VERSION_KEY)
+    _tree = None
+
+
+def listed_counts(rows):
+    """
+    {id: active products in the active categories of its subtree} from
+    (id, parent_id, is_active, active_product_count) rows, whose rollups
+    count inactive categories too
+    """
+    rollups = {pk: count for pk, _, _, count in rows}
+    parents = {pk: parent_id for pk, parent_id, _, _ in rows}
+
+    # Products filed directly under each category
+    own = dict(rollups)
+    for pk, parent_id in parents.items():
+        if parent_id in own:
+            own[parent_id] -= rollups[pk]
+
+    counts = dict.fromkeys(rollups, 0)
+    for pk, _, is_active, _ in rows:
+        if not is_active or not own[pk]:
+            continue
+        category_id, seen = pk, set()
+        while category_id in counts and category_id not in seen:
+            seen.add(category_id)
+            counts[category_id] += own[pk]
+            category_id = parents[category_id]
+    return counts
+
+
+def get_product_counts():
+    """Listed products per category, subtree included, in one query per change"""
+    from .models import Category
+
+    key = COUNTS_KEY.format(_current_version(COUNTS_VERSION_KEY))
+    counts = cache.get(key)
+    if counts is None:
+        counts = listed_counts(Category.objects.values_list('id', 'parent_id', 'is_active', 'active_product_count'))
+        cache.set(key, counts, get_timeout())
+    return counts
+
+
+def invalidate_product_counts():
+    """Make the next get_product_counts() re-read the counters"""
+    _bump(COUNTS_VERSION_KEY)
@@ -1,7 +1,9 @@
-from django.shortcuts import render, get_object_or_404
+from django.http import Http404
 from django.views.generic import ListView, DetailView
 from .models import Category
+from .tree import get_tree
 from products.models import Product
+from products.page_cache import AnonymousPageCacheMixin
 
 class CategoryListView(ListView):
     model = Category
@@ -10,33 +12,35 @@ class CategoryListView(ListView):
     paginate_by = 20
 
     def get_queryset(self):
-        return Category.objects.filter(is_active=True, parent=None).order_by('name')
+        # Top-level categories, already ordered by name in the cached tree
+        return list(get_tree().roots)
 
-class CategoryDetailView(DetailView):
+class CategoryDetailView(AnonymousPageCacheMixin, DetailView):
     model = Category
     template_name = 'categories/category_detail.html'
     context_object_name = 'category'
 
     def get_object(self):
-        return get_object_or_404(Category, slug=self.kwargs['slug'], is_active=True)
+        category = get_tree().get_by_slug(self.kwargs['slug'])
+        if category is None:
+            raise Http404('No category matches the given query.')
+        return category
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        category = self.get_object()
+        category = self.object
+        tree = get_tree()
         
-        # Get products from this category and its subcategories
-        subcategories = category.subcategories.filter(is_active=True)
-        all_categories = [category] + list(subcategories)
+        # Products anywhere under this category: one range scan on the materialized path
+        subtree = Category.objects.subtree(category.path).filter(is_active=True).values('pk')
         
         context['products'] = Product.objects.filter(
-            category__in=all_categories,
+            category__in=subtree,
             status='active'
-        ).order_by('-created_at')[:20]
+        ).with_primary_image().order_by('-created_at')[:20]
         
-        context['subcategories'] = subcategories
-        context['products_count'] = Product.objects.filter(
-            category__in=all_categories,
-            status='active'
-        ).count()
+        context['subcategories'] = category.children
+        context['breadcrumbs'] = tree.ancestors(category)
+        context['products_count'] = category.active_product_count
         
         return context
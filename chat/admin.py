@@ -15,12 +15,22 @@ class ConversationAdmin(admin.ModelAdmin):
     list_display = ['product', 'buyer', 'seller', 'created_at', 'is_active', 'message_count']
     list_filter = ['is_active', 'created_at', 'product__category']
     search_fields = ['product__title', 'buyer__username', 'seller__username']
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = (
+        'created_at', 'updated_at', 'last_message', 'last_message_preview', 'last_message_at',
+        'buyer_unread', 'seller_unread',
+    )
     inlines = [MessageInline]
+    actions = ['rebuild_inbox']
     
     def message_count(self, obj):
         return obj.messages.count()
     message_count.short_description = 'Messages'
+    
+    def rebuild_inbox(self, request, queryset):
+        for conversation in queryset:
+            conversation.rebuild_inbox()
+        self.message_user(request, f'Inbox state rebuilt for {queryset.count()} conversations.')
+    rebuild_inbox.short_description = "Rebuild last message and unread counts"
 
 
 @admin.register(Message)
@@ -2,9 +2,10 @@ import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import User
+from django.db import transaction
+from . import inbox
 from .models import Conversation, Message
-from notifications.models import Notification
-from notifications.push_utils import send_message_notification
+from notifications import pipeline
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
@@ -78,8 +79,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 }
             )
             
-            # Create notification for the other user
-            await self.create_notification(message)
+            # Notify the other user from the background pipeline
+            await pipeline.aqueue_message_notification(message)
     
     # Receive message from conversation group
     async def chat_message(self, event):
@@ -115,48 +116,45 @@ class ChatConsumer(AsyncWebsocketConsumer):
     def save_message(self, message_text):
         try:
             conversation = Conversation.objects.get(id=self.conversation_id)
-            message = Message.objects.create(
-                conversation=conversation,
-                sender=self.user,
-                content=message_text
-            )
-            # Update conversation timestamp
-            conversation.save()
+            # The inbox fields are updated with the insert (chat.signals)
+            with transaction.atomic():
+                message = Message.objects.create(
+                    conversation=conversation,
+                    sender=self.user,
+                    content=message_text
+                )
             return message
         except Exception as e:
             print(f"Error saving message: {e}")
             return None
+
+
+class InboxConsumer(AsyncWebsocketConsumer):
+    """Pushes inbox changes and the unread notification count to every open tab of the connected user"""
+    async def connect(self):
+        self.user = self.scope['user']
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+        
+        self.user_group_name = inbox.group_name(self.user.id)
+        await self.channel_layer.group_add(self.user_group_name, self.channel_name)
+        await self.accept()
     
-    @database_sync_to_async
-    def create_notification(self, message):
-        try:
-            conversation = message.conversation
-            recipient = conversation.seller if self.user == conversation.buyer else conversation.buyer
-            
-            # Check notification preferences
-            if hasattr(recipient, 'notification_preferences'):
-                prefs = recipient.notification_preferences
-                if not prefs.new_message_notifications:
-                    return
-            
-            # Create in-app notification
-            Notification.create_notification(
-                recipient=recipient,
-                sender=self.user,
-                notification_type='new_message',
-                title=f'New message about {conversation.product.title}',
-                message=f'{self.user.get_full_name() or self.user.username} sent you a message',
-                content_object=message,
-                action_url=f'/chat/conversation/{conversation.id}/'
-            )
-            
-            # Send push notification
-            send_message_notification(
-                sender=self.user,
-                recipient=recipient,
-                conversation=conversation,
-                message_text=message.content
-            )
-            
-        except Exception as e:
-            print(f"Error creating notification: {e}")
+    async def disconnect(self, close_code):
+        if hasattr(self, 'user_group_name'):
+            await self.channel_layer.group_discard(self.user_group_name, self.channel_name)
+    
+    # A conversation's preview, order or unread count changed
+    async def inbox_update(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'conversation',
+            **event['conversation']
+        }))
+    
+    # The unread notification count changed (notifications.unread)
+    async def notifications_count(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'notifications',
+            'unread_count': event['unread_count']
+        }))
@@ -0,0 +1,57 @@
+"""
+Live inbox updates.
+
+Every logged-in user's sockets join the channel-layer group ``user_<id>``
+(see InboxConsumer). When a conversation's inbox state changes, publish()
+sends both participants a small event with the conversation's current
+preview and that participant's unread count. Mark-reads publish on commit;
+new messages are published by a notification pipeline job
+(notifications.pipeline), off the path that saves and broadcasts them. The events carry absolute values rather than increments, so a
+client that misses one or sees two out of order still ends up right.
+"""
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.utils import timezone
+
+
+def group_name(user_id):
+    return f'user_{user_id}'
+
+
+def send_to_user(user_id, event):
+    """Send a channel-layer event to every socket of one user"""
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    try:
+        async_to_sync(layer.group_send)(group_name(user_id), event)
+    except Exception as e:
+        print(f"Error sending {event['type']} to user {user_id}: {e}")
+
+
+def publish(conversation_id):
+    """Send both participants the current inbox state of a conversation"""
+    from .models import Conversation
+
+    conversation = Conversation.objects.select_related(
+        'buyer', 'seller', 'last_message'
+    ).filter(pk=conversation_id).first()
+    if conversation is None or not conversation.is_active:
+        return
+
+    sender = conversation.last_sender
+    state = {
+        'conversation_id': conversation.pk,
+        'preview': conversation.last_message_preview,
+        'sender_name': sender.username if sender else '',
+        # Same format as the list template's |date:'c', so clients can compare them
+        'last_message_at': timezone.localtime(conversation.last_message_at).isoformat() if conversation.last_message_at else None,
+    }
+    for user, unread in ((conversation.buyer, conversation.buyer_unread),
+                         (conversation.seller, conversation.seller_unread)):
+        send_to_user(user.pk, {'type': 'inbox.update', 'conversation': {**state, 'unread': unread}})
+
+
+def publish_on_commit(conversation_id):
+    transaction.on_commit(lambda: publish(conversation_id))
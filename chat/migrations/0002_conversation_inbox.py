@@ -0,0 +1,71 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def seed_inbox(apps, schema_editor):
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+
+    unread = {}
+    rows = (
+        Message.objects.filter(is_read=False).order_by()
+        .values_list('conversation_id', 'sender_id').annotate(total=models.Count('id'))
+    )
+    for conversation_id, sender_id, total in rows:
+        unread[conversation_id, sender_id] = total
+
+    for conversation in Conversation.objects.only('id', 'buyer_id', 'seller_id'):
+        last = Message.objects.filter(conversation_id=conversation.pk).order_by('-created_at', '-pk').first()
+        Conversation.objects.filter(pk=conversation.pk).update(
+            last_message=last,
+            last_message_preview=last.content[:140] if last else '',
+            last_message_at=last.created_at if last else None,
+            buyer_unread=unread.get((conversation.pk, conversation.seller_id), 0),
+            seller_unread=unread.get((conversation.pk, conversation.buyer_id), 0),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='buyer_unread',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_preview',
+            field=models.CharField(blank=True, max_length=140),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='seller_unread',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['buyer', 'is_active', '-updated_at'], name='conversation_buyer_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['seller', 'is_active', '-updated_at'], name='conversation_seller_inbox_idx'),
+        ),
+        migrations.RunPython(seed_inbox, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,13 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
 from django.contrib.auth.models import User
+from django.utils import timezone
 from products.models import Product
+from . import inbox
+
+
+# Characters of the latest message shown in the inbox
+PREVIEW_LENGTH = 140
 
 
 class Conversation(models.Model):
@@ -11,10 +18,21 @@ class Conversation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
+    # Inbox read model, kept up to date by chat.signals and mark_read()
+    last_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    buyer_unread = models.PositiveIntegerField(default=0)
+    seller_unread = models.PositiveIntegerField(default=0)
     
     class Meta:
         unique_together = ('product', 'buyer', 'seller')
         ordering = ['-updated_at']
+        indexes = [
+            # Each side of the inbox query: (buyer = me OR seller = me) AND is_active ORDER BY -updated_at
+            models.Index(fields=['buyer', 'is_active', '-updated_at'], name='conversation_buyer_inbox_idx'),
+            models.Index(fields=['seller', 'is_active', '-updated_at'], name='conversation_seller_inbox_idx'),
+        ]
     
     def __str__(self):
         return f"Conversation about {self.product.title} between {self.buyer.username} and {self.seller.username}"
@@ -30,6 +48,77 @@ class Conversation(models.Model):
     def latest_message(self):
         """Get the latest message in this conversation"""
         return self.messages.first()
+    
+    @property
+    def last_sender(self):
+        """Participant who sent the last message; select_related('last_message') saves the query"""
+        if self.last_message_id is None:
+            return None
+        last = self.last_message
+        return self.buyer if last.sender_id == self.buyer_id else self.seller
+    
+    def unread_field(self, user):
+        return 'buyer_unread' if user.pk == self.buyer_id else 'seller_unread'
+    
+    def unread_for(self, user):
+        """Messages from the other participant that ``user`` has not read yet"""
+        return getattr(self, self.unread_field(user))
+    
+    @classmethod
+    def record_message(cls, message):
+        """
+        Move the inbox state of ``message``'s conversation forward for a new
+        message. Whoever saved it publishes the change, through the
+        notification pipeline, once the sender's own broadcast is out.
+        """
+        conversation_id = message.conversation_id
+        unread = 'seller_unread' if message.sender_id == message.conversation.buyer_id else 'buyer_unread'
+        with transaction.atomic():
+            cls.objects.filter(pk=conversation_id).update(
+                **{unread: F(unread) + 1},
+                updated_at=timezone.now()
+            )
+            # A concurrent older message must not replace a newer preview
+            cls.objects.filter(
+                Q(last_message_at__isnull=True) | Q(last_message_at__lte=message.created_at),
+                pk=conversation_id
+            ).update(
+                last_message=message,
+                last_message_preview=message.content[:PREVIEW_LENGTH],
+                last_message_at=message.created_at
+            )
+    
+    def mark_read(self, user):
+        """Mark the other participant's messages as read by ``user``; returns how many were unread"""
+        field = self.unread_field(user)
+        with transaction.atomic():
+            # Lock the row first: a message saved meanwhile waits, then counts as unread
+            list(Conversation.objects.select_for_update().filter(pk=self.pk).values_list('pk'))
+            updated = self.messages.filter(is_read=False).exclude(sender_id=user.pk).update(is_read=True)
+            Conversation.objects.filter(pk=self.pk).update(**{field: 0})
+            inbox.publish_on_commit(self.pk)
+        setattr(self, field, 0)
+        return updated
+    
+    def rebuild_inbox(self):
+        """Recompute the inbox fields from the messages"""
+        last = self.messages.order_by('-created_at', '-pk').first()
+        unread = dict(
+            self.messages.filter(is_read=False).order_by()
+            .values_list('sender_id').annotate(total=models.Count('id'))
+        )
+        self.last_message = last
+        self.last_message_preview = last.content[:PREVIEW_LENGTH] if last else ''
+        self.last_message_at = last.created_at if last else None
+        self.buyer_unread = unread.get(self.seller_id, 0)
+        self.seller_unread = unread.get(self.buyer_id, 0)
+        Conversation.objects.filter(pk=self.pk).update(
+            last_message=last,
+            last_message_preview=self.last_message_preview,
+            last_message_at=self.last_message_at,
+            buyer_unread=self.buyer_unread,
+            seller_unread=self.seller_unread
+        )
 
 
 class Message(models.Model):
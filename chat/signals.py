@@ -1,9 +1,16 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from .models import Message
+from .models import Conversation, Message
 from notifications.models import Notification
 
 
+@receiver(post_save, sender=Message)
+def update_conversation_inbox(sender, instance, created, **kwargs):
+    """Keep the conversation's last message and unread counts in step with new messages"""
+    if created:
+        Conversation.record_message(instance)
+
+
 # Commenting out this signal since notifications are now handled in the WebSocket consumer
 # to avoid duplicate notifications
 
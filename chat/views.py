@@ -4,12 +4,15 @@ from django.contrib.auth.decorators import login_required
 from django.views.generic import ListView, DetailView
 from django.contrib import messages
 from django.http import JsonResponse
-from django.db.models import Q, Count
+from django.db import transaction
+from django.db.models import Q, Count, Prefetch
 from django.core.paginator import Paginator
 from products.models import Product
 from .models import Conversation, Message
 from .forms import MessageForm, ChatStartForm
+from notifications import pipeline
 from notifications.models import Notification
+from notifications import unread
 
 
 class ConversationListView(LoginRequiredMixin, ListView):
@@ -20,22 +23,21 @@ class ConversationListView(LoginRequiredMixin, ListView):
     paginate_by = 20
     
     def get_queryset(self):
+        # Everything a row shows comes from the conversation's inbox fields and
+        # joins, plus one query for the page's products and their primary images
         return Conversation.objects.filter(
             Q(buyer=self.request.user) | Q(seller=self.request.user),
             is_active=True
-        ).select_related('product', 'buyer', 'seller').prefetch_related('messages')
+        ).select_related('buyer', 'seller', 'last_message').prefetch_related(
+            Prefetch('product', queryset=Product.objects.with_primary_image())
+        )
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Count unread messages for each conversation
         for conversation in context['conversations']:
             other_user_func = conversation.other_user
-            other_user = other_user_func(self.request.user)
-            conversation.other_user_instance = other_user
-            conversation.unread_count = conversation.messages.filter(
-                sender=other_user, 
-                is_read=False
-            ).count()
+            conversation.other_user_instance = other_user_func(self.request.user)
+            conversation.unread_count = conversation.unread_for(self.request.user)
         return context
 
 
@@ -66,16 +68,17 @@ class ConversationDetailView(LoginRequiredMixin, DetailView):
         context['other_user'] = other_user_func(self.request.user)
         
         # Mark messages from other user as read
-        other_user = other_user_func(self.request.user)
-        conversation.messages.filter(sender=other_user, is_read=False).update(is_read=True)
+        if conversation.unread_for(self.request.user):
+            conversation.mark_read(self.request.user)
         
         # Mark all message notifications from this conversation as read
-        Notification.objects.filter(
+        updated = Notification.objects.filter(
             recipient=self.request.user,
             notification_type='new_message',
             is_read=False,
             action_url=f'/chat/conversation/{conversation.id}/'
         ).update(is_read=True)
+        unread.adjust(self.request.user.id, -updated)
         
         return context
     
@@ -87,23 +90,12 @@ class ConversationDetailView(LoginRequiredMixin, DetailView):
             message = form.save(commit=False)
             message.conversation = conversation
             message.sender = request.user
-            message.save()
-            
-            # Update conversation timestamp
-            conversation.save(update_fields=['updated_at'])
+            # The inbox fields are updated with the insert (chat.signals)
+            with transaction.atomic():
+                message.save()
             
-            # Create notification for the other user
-            other_user_func = conversation.other_user
-            other_user = other_user_func(request.user)
-            Notification.create_notification(
-                recipient=other_user,
-                sender=request.user,
-                notification_type='new_message',
-                title=f'New message about {conversation.product.title}',
-                message=f'{request.user.get_full_name() or request.user.username} sent you a message',
-                content_object=message,
-                action_url=f'/chat/conversation/{conversation.id}/'
-            )
+            # Notify the other user from the background pipeline
+            pipeline.queue_message_notification(message)
             
             messages.success(request, 'Message sent successfully!')
             return redirect('chat:conversation_detail', pk=conversation.pk)
@@ -134,22 +126,15 @@ def start_conversation(request, product_id):
         if form.is_valid():
             # Create the first message if this is a new conversation
             if created or not conversation.messages.exists():
-                Message.objects.create(
-                    conversation=conversation,
-                    sender=request.user,
-                    content=form.cleaned_data['message']
-                )
+                with transaction.atomic():
+                    Message.objects.create(
+                        conversation=conversation,
+                        sender=request.user,
+                        content=form.cleaned_data['message']
+                    )
                 
-                # Create notification for seller
-                Notification.create_notification(
-                    recipient=product.seller,
-                    sender=request.user,
-                    notification_type='product_inquiry',
-                    title=f'Someone is interested in your {product.title}',
-                    message=f'{request.user.get_full_name() or request.user.username} started a conversation about your product',
-                    content_object=conversation,
-                    action_url=f'/chat/conversation/{conversation.id}/'
-                )
+                # Notify the seller from the background pipeline
+                pipeline.queue_inquiry_notification(conversation)
                 
                 messages.success(request, 'Conversation started! You can now chat with the seller.')
             else:
@@ -175,12 +160,7 @@ def mark_messages_read(request, conversation_id):
             id=conversation_id
         )
         
-        other_user_func = conversation.other_user
-        other_user = other_user_func(request.user)
-        updated_count = conversation.messages.filter(
-            sender=other_user, 
-            is_read=False
-        ).update(is_read=True)
+        updated_count = conversation.mark_read(request.user)
         
         return JsonResponse({
             'success': True, 
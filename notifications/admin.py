@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Notification, NotificationPreference, WebPushDevice
+from django.utils import timezone
+from .models import Notification, NotificationPreference, OutgoingEmail, QueuedNotification, WebPushDevice
+from . import outbox, unread
 
 
 @admin.register(Notification)
@@ -10,15 +12,37 @@ class NotificationAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at',)
     actions = ['mark_as_read', 'mark_as_unread']
     
+    def _refresh_counts(self, recipient_ids):
+        for recipient_id in set(recipient_ids):
+            unread.refresh(recipient_id)
+    
     def mark_as_read(self, request, queryset):
+        recipient_ids = list(queryset.values_list('recipient_id', flat=True))
         updated = queryset.update(is_read=True)
+        self._refresh_counts(recipient_ids)
         self.message_user(request, f'{updated} notifications marked as read.')
     mark_as_read.short_description = "Mark selected notifications as read"
     
     def mark_as_unread(self, request, queryset):
+        recipient_ids = list(queryset.values_list('recipient_id', flat=True))
         updated = queryset.update(is_read=False)
+        self._refresh_counts(recipient_ids)
         self.message_user(request, f'{updated} notifications marked as unread.')
     mark_as_unread.short_description = "Mark selected notifications as unread"
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change:
+            self._refresh_counts([obj.recipient_id])
+    
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self._refresh_counts([obj.recipient_id])
+    
+    def delete_queryset(self, request, queryset):
+        recipient_ids = list(queryset.values_list('recipient_id', flat=True))
+        super().delete_queryset(request, queryset)
+        self._refresh_counts(recipient_ids)
 
 
 @admin.register(NotificationPreference)
@@ -53,3 +77,48 @@ class WebPushDeviceAdmin(admin.ModelAdmin):
         updated = queryset.update(is_active=False)
         self.message_user(request, f'{updated} devices deactivated.')
     deactivate_devices.short_description = "Deactivate selected devices"
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'recipients', 'status', 'attempts', 'created_at', 'sent_at', 'latency_display']
+    list_filter = ['status', 'created_at']
+    search_fields = ['subject', 'to', 'last_error']
+    readonly_fields = [
+        'subject', 'from_email', 'to', 'body', 'html_body', 'status', 'attempts', 'last_error',
+        'created_at', 'next_attempt_at', 'claimed_at', 'sent_at', 'latency_display',
+    ]
+    exclude = ['claimed_by']
+    actions = ['retry_now']
+
+    def recipients(self, obj):
+        return ', '.join(obj.to)
+
+    def latency_display(self, obj):
+        latency = obj.latency
+        return f'{latency:.1f}s' if latency is not None else '-'
+    latency_display.short_description = 'Latency'
+
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status=OutgoingEmail.STATUS_SENT).update(
+            status=OutgoingEmail.STATUS_PENDING,
+            next_attempt_at=timezone.now()
+        )
+        outbox.wake()
+        self.message_user(request, f'{updated} emails queued for another attempt.')
+    retry_now.short_description = "Retry selected emails now"
+
+
+@admin.register(QueuedNotification)
+class QueuedNotificationAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'payload', 'attempts', 'failed', 'enqueued_at', 'next_attempt_at']
+    list_filter = ['kind', 'failed']
+    search_fields = ['last_error']
+    readonly_fields = ['kind', 'payload', 'attempts', 'last_error', 'failed', 'enqueued_at', 'next_attempt_at', 'claimed_at']
+    exclude = ['claimed_by']
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        updated = queryset.update(failed=False, next_attempt_at=timezone.now(), claimed_by='', claimed_at=None)
+        self.message_user(request, f'{updated} notification jobs queued for another attempt.')
+    retry_now.short_description = "Retry selected jobs now"
@@ -0,0 +1,11 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import unread
+
+
+def unread_notifications(request):
+    """The navbar badge's starting value; read from the cache only on pages that show it"""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'unread_notification_count': SimpleLazyObject(lambda: unread.get_count(user.id))}
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from notifications.pipeline import process_fallback
+
+
+class Command(BaseCommand):
+    help = 'Handle every due notification job in the fallback table'
+
+    def handle(self, *args, **kwargs):
+        handled = process_fallback()
+        self.stdout.write(self.style.SUCCESS(f'Handled {handled} queued notification jobs'))
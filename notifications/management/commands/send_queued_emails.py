@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from notifications.outbox import deliver_pending
+
+
+class Command(BaseCommand):
+    help = 'Send every due message in the email outbox'
+
+    def handle(self, *args, **kwargs):
+        sent = deliver_pending()
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} queued emails'))
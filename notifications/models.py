@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
+from django.core.mail import EmailMultiAlternatives
+from django.utils import timezone
 import json
 
 
@@ -35,14 +37,22 @@ class Notification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Lets the notification pipeline check whether a job already ran
+            models.Index(fields=['content_type', 'object_id'], name='notification_target_idx'),
+        ]
     
     def __str__(self):
         return f"Notification for {self.recipient.username}: {self.title}"
     
     def mark_as_read(self):
         """Mark this notification as read"""
+        from . import unread
+
+        # Only the request that actually flips the flag takes it off the counter
+        if Notification.objects.filter(pk=self.pk, is_read=False).update(is_read=True):
+            unread.adjust(self.recipient_id, -1)
         self.is_read = True
-        self.save(update_fields=['is_read'])
     
     @classmethod
     def create_notification(cls, recipient, notification_type, title, message, sender=None, content_object=None, action_url=None):
@@ -96,3 +106,85 @@ class WebPushDevice(models.Model):
             return json.loads(self.subscription_info)
         except:
             return None
+
+
+class OutgoingEmail(models.Model):
+    """Email waiting in, or delivered from, the outbox (see notifications.outbox)"""
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)}"
+
+    @property
+    def latency(self):
+        """Seconds from queueing to delivery"""
+        if self.sent_at is None:
+            return None
+        return (self.sent_at - self.created_at).total_seconds()
+
+    def to_message(self, connection=None):
+        message = EmailMultiAlternatives(
+            subject=self.subject,
+            body=self.body,
+            from_email=self.from_email,
+            to=self.to,
+            connection=connection,
+        )
+        if self.html_body:
+            message.attach_alternative(self.html_body, 'text/html')
+        return message
+
+
+class QueuedNotification(models.Model):
+    """
+    Notification job that could not be handled from memory (see
+    notifications.pipeline): the queue was full or the job failed.
+    Handled rows are deleted.
+    """
+    kind = models.CharField(max_length=30)
+    payload = models.JSONField(default=dict)
+    enqueued_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    failed = models.BooleanField(default=False)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['enqueued_at']
+        indexes = [
+            models.Index(fields=['failed', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.payload}"
@@ -0,0 +1,182 @@
+"""
+Transactional email outbox.
+
+queue_email() stores a message as an OutgoingEmail row inside the caller's
+transaction, so an email goes out if and only if the action behind it
+committed, and the request never waits on SMTP. Once the transaction commits
+a worker thread in the same process is woken. It claims due messages in
+batches, sends each batch over a single SMTP connection and records the
+outcome of every message.
+
+Failed messages are retried with exponential backoff, starting at
+EMAIL_OUTBOX_RETRY_DELAY seconds and doubling, until EMAIL_OUTBOX_MAX_ATTEMPTS
+is reached. The worker also wakes every EMAIL_OUTBOX_POLL_INTERVAL seconds to
+pick up retries that came due and messages queued by other processes. Set
+EMAIL_OUTBOX_SYNC to deliver inline on commit instead. The
+send_queued_emails command drains the outbox once, for cron or after a
+restart.
+"""
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+# Messages sent over one SMTP connection
+BATCH_SIZE = 20
+
+# A claim older than this belongs to a worker that died mid-batch
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+_wakeup = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_max_attempts():
+    return getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 6)
+
+
+def get_retry_delay(attempts):
+    """Seconds before retry number ``attempts``: 30, 60, 120, ..."""
+    return getattr(settings, 'EMAIL_OUTBOX_RETRY_DELAY', 30) * 2 ** (attempts - 1)
+
+
+def queue_email(subject, body, to, html_body='', from_email=None):
+    """Add a message to the outbox; it is sent once the current transaction commits"""
+    from .models import OutgoingEmail
+
+    email = OutgoingEmail.objects.create(
+        subject=subject,
+        body=body,
+        html_body=html_body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+    )
+    transaction.on_commit(wake)
+    return email
+
+
+def wake():
+    """Have this process deliver due messages now"""
+    if getattr(settings, 'EMAIL_OUTBOX_SYNC', False):
+        deliver_pending()
+        return
+    _ensure_worker()
+    _wakeup.set()
+
+
+def claim_batch(limit=BATCH_SIZE):
+    """Mark up to ``limit`` due messages as being sent by this worker and return them"""
+    from .models import OutgoingEmail
+
+    now = timezone.now()
+    OutgoingEmail.objects.filter(
+        status=OutgoingEmail.STATUS_SENDING,
+        claimed_at__lt=now - CLAIM_TIMEOUT
+    ).update(status=OutgoingEmail.STATUS_PENDING)
+
+    due = list(
+        OutgoingEmail.objects.filter(
+            status=OutgoingEmail.STATUS_PENDING,
+            next_attempt_at__lte=now
+        ).order_by('next_attempt_at').values_list('pk', flat=True)[:limit]
+    )
+    if not due:
+        return []
+
+    # Another process may have claimed some of them in the meantime
+    token = uuid.uuid4().hex
+    OutgoingEmail.objects.filter(pk__in=due, status=OutgoingEmail.STATUS_PENDING).update(
+        status=OutgoingEmail.STATUS_SENDING,
+        claimed_by=token,
+        claimed_at=now
+    )
+    return list(OutgoingEmail.objects.filter(claimed_by=token, status=OutgoingEmail.STATUS_SENDING))
+
+
+def _record_failure(email, error):
+    from .models import OutgoingEmail
+
+    email.attempts += 1
+    email.last_error = str(error)[:1000]
+    if email.attempts >= get_max_attempts():
+        email.status = OutgoingEmail.STATUS_FAILED
+    else:
+        email.status = OutgoingEmail.STATUS_PENDING
+        email.next_attempt_at = timezone.now() + timedelta(seconds=get_retry_delay(email.attempts))
+
+
+def deliver_batch(emails):
+    """Send ``emails`` over one connection and store each outcome; returns how many were sent"""
+    from .models import OutgoingEmail
+
+    connection = get_connection(fail_silently=False)
+    sent = 0
+    try:
+        connection.open()
+    except Exception as e:
+        print(f"Error connecting to the mail server: {e}")
+        for email in emails:
+            _record_failure(email, e)
+    else:
+        try:
+            for email in emails:
+                try:
+                    connection.send_messages([email.to_message(connection)])
+                except Exception as e:
+                    _record_failure(email, e)
+                else:
+                    email.attempts += 1
+                    email.status = OutgoingEmail.STATUS_SENT
+                    email.sent_at = timezone.now()
+                    email.last_error = ''
+                    sent += 1
+        finally:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    OutgoingEmail.objects.bulk_update(
+        emails, ['status', 'attempts', 'last_error', 'next_attempt_at', 'sent_at']
+    )
+    return sent
+
+
+def deliver_pending():
+    """Send every due message, batch by batch; returns how many were sent"""
+    sent = 0
+    while True:
+        emails = claim_batch()
+        if not emails:
+            return sent
+        sent += deliver_batch(emails)
+
+
+def _run_worker():
+    interval = getattr(settings, 'EMAIL_OUTBOX_POLL_INTERVAL', 30)
+    while True:
+        _wakeup.wait(interval)
+        _wakeup.clear()
+        try:
+            deliver_pending()
+        except Exception as e:
+            print(f"Error delivering queued emails: {e}")
+        finally:
+            close_old_connections()
+
+
+def _ensure_worker():
+    global _worker
+
+    if _worker is not None:
+        return
+
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_run_worker, name='email-outbox', daemon=True)
+            _worker.start()
@@ -0,0 +1,420 @@
+"""
+Background notification pipeline.
+
+Sending a chat message should cost one INSERT and one channel-layer
+broadcast. Everything that follows from it, such as publishing both inboxes,
+checking the recipient's preferences, creating the Notification row and
+pushing to their devices, is a job on this process's in-memory queue. A worker thread handles the jobs in
+order. Callers only pass ids, so enqueueing never touches the database.
+
+Jobs may run more than once, so each does one thing and can be repeated:
+a new message is recorded as a Notification unless a previous attempt
+already did, and only then queues a separate push job, whose retries
+cannot create notifications or move the unread counter again.
+
+When the queue is full (NOTIFICATION_QUEUE_MAX_SIZE), or handling a job
+fails, the job is written to the QueuedNotification table. Every process's
+worker polls that table every NOTIFICATION_QUEUE_POLL_INTERVAL seconds and
+retries with doubling delays until NOTIFICATION_QUEUE_MAX_ATTEMPTS. Jobs
+still in memory are lost if the process dies. Set NOTIFICATION_QUEUE_SYNC
+to handle jobs inline instead. stats() reports the queue depth, lag and
+overflow counters of the current process.
+"""
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+NEW_MESSAGE = 'new_message'
+PUSH_MESSAGE = 'push_message'
+PRODUCT_INQUIRY = 'product_inquiry'
+INBOX_UPDATE = 'inbox_update'
+
+# Fallback rows claimed per poll
+BATCH_SIZE = 50
+
+# A claim older than this belongs to a worker that died mid-batch
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+_queue = None
+_worker = None
+_worker_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {
+    'enqueued': 0,
+    'processed': 0,
+    'failed': 0,
+    'spilled': 0,
+    'dropped': 0,
+    'last_lag': 0.0,
+    'max_lag': 0.0,
+    'total_lag': 0.0,
+}
+
+
+def get_max_size():
+    return getattr(settings, 'NOTIFICATION_QUEUE_MAX_SIZE', 1000)
+
+
+def get_max_attempts():
+    return getattr(settings, 'NOTIFICATION_QUEUE_MAX_ATTEMPTS', 5)
+
+
+def get_retry_delay(attempts):
+    """Seconds before retry number ``attempts``: 30, 60, 120, ..."""
+    return getattr(settings, 'NOTIFICATION_QUEUE_RETRY_DELAY', 30) * 2 ** (attempts - 1)
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def _record_lag(enqueued_at):
+    lag = max(0.0, time.time() - enqueued_at)
+    with _stats_lock:
+        _stats['last_lag'] = lag
+        _stats['max_lag'] = max(_stats['max_lag'], lag)
+        _stats['total_lag'] += lag
+
+
+def _create_once(recipient, notification_type, content_object, **kwargs):
+    """Create a notification, unless an earlier attempt at the same job already did"""
+    from django.contrib.contenttypes.models import ContentType
+    from .models import Notification
+
+    exists = Notification.objects.filter(
+        recipient=recipient,
+        notification_type=notification_type,
+        content_type=ContentType.objects.get_for_model(content_object),
+        object_id=content_object.pk
+    ).exists()
+    if not exists:
+        Notification.create_notification(
+            recipient=recipient,
+            notification_type=notification_type,
+            content_object=content_object,
+            **kwargs
+        )
+
+
+def _load_message(message_id):
+    from chat.models import Message
+
+    return Message.objects.select_related(
+        'sender', 'conversation__product', 'conversation__buyer', 'conversation__seller'
+    ).filter(pk=message_id).first()
+
+
+def _notify_new_message(message_id):
+    message = _load_message(message_id)
+    if message is None:
+        return
+
+    sender = message.sender
+    conversation = message.conversation
+    recipient = conversation.other_user(sender)
+
+    # Check notification preferences
+    if hasattr(recipient, 'notification_preferences'):
+        if not recipient.notification_preferences.new_message_notifications:
+            return
+
+    _create_once(
+        recipient=recipient,
+        sender=sender,
+        notification_type='new_message',
+        title=f'New message about {conversation.product.title}',
+        message=f'{sender.get_full_name() or sender.username} sent you a message',
+        content_object=message,
+        action_url=f'/chat/conversation/{conversation.id}/'
+    )
+    enqueue(PUSH_MESSAGE, {'message_id': message_id})
+
+
+def _push_message(message_id):
+    from .push_utils import send_message_notification
+
+    message = _load_message(message_id)
+    if message is None:
+        return
+
+    # Devices replace a notification with the same tag, so a retried push shows once
+    send_message_notification(
+        sender=message.sender,
+        recipient=message.conversation.other_user(message.sender),
+        conversation=message.conversation,
+        message_text=message.content
+    )
+
+
+def _notify_product_inquiry(conversation_id):
+    from chat.models import Conversation
+
+    conversation = Conversation.objects.select_related(
+        'product', 'buyer', 'seller'
+    ).filter(pk=conversation_id).first()
+    if conversation is None:
+        return
+
+    buyer = conversation.buyer
+    _create_once(
+        recipient=conversation.seller,
+        sender=buyer,
+        notification_type='product_inquiry',
+        title=f'Someone is interested in your {conversation.product.title}',
+        message=f'{buyer.get_full_name() or buyer.username} started a conversation about your product',
+        content_object=conversation,
+        action_url=f'/chat/conversation/{conversation.id}/'
+    )
+
+
+def _publish_inbox(conversation_id):
+    from chat import inbox
+
+    inbox.publish(conversation_id)
+
+
+HANDLERS = {
+    NEW_MESSAGE: _notify_new_message,
+    PUSH_MESSAGE: _push_message,
+    PRODUCT_INQUIRY: _notify_product_inquiry,
+    INBOX_UPDATE: _publish_inbox,
+}
+
+
+def handle(kind, payload):
+    HANDLERS[kind](**payload)
+
+
+def enqueue(kind, payload):
+    """Queue a job in this process; spills to the fallback table when the queue is full"""
+    job = {'kind': kind, 'payload': payload, 'enqueued_at': time.time()}
+    if getattr(settings, 'NOTIFICATION_QUEUE_SYNC', False):
+        _process(job)
+        return
+    if not _offer(job):
+        spill(job)
+
+
+async def aenqueue(kind, payload):
+    """enqueue() for async callers; only an overflow reaches the database"""
+    job = {'kind': kind, 'payload': payload, 'enqueued_at': time.time()}
+    if getattr(settings, 'NOTIFICATION_QUEUE_SYNC', False):
+        await sync_to_async(_process)(job)
+        return
+    if not _offer(job):
+        await sync_to_async(spill)(job)
+
+
+def _offer(job):
+    _ensure_worker()
+    try:
+        _queue.put_nowait(job)
+    except queue.Full:
+        return False
+    _count('enqueued')
+    return True
+
+
+def queue_message_notification(message):
+    """
+    Publish both inboxes and notify the other participant of ``message``
+    once the current transaction commits
+    """
+    def queue_jobs():
+        enqueue(INBOX_UPDATE, {'conversation_id': message.conversation_id})
+        enqueue(NEW_MESSAGE, {'message_id': message.pk})
+
+    transaction.on_commit(queue_jobs)
+
+
+async def aqueue_message_notification(message):
+    """queue_message_notification() for the chat consumer, which saves in autocommit"""
+    await aenqueue(INBOX_UPDATE, {'conversation_id': message.conversation_id})
+    await aenqueue(NEW_MESSAGE, {'message_id': message.pk})
+
+
+def queue_inquiry_notification(conversation):
+    """
+    Publish both inboxes and tell the seller a buyer started ``conversation``,
+    once the current transaction commits
+    """
+    def queue_jobs():
+        enqueue(INBOX_UPDATE, {'conversation_id': conversation.pk})
+        enqueue(PRODUCT_INQUIRY, {'conversation_id': conversation.pk})
+
+    transaction.on_commit(queue_jobs)
+
+
+def spill(job, error=None):
+    """
+    Store a job in the fallback table for a worker to pick up later: at once
+    after an overflow, after the retry delay when handling it raised ``error``
+    """
+    from .models import QueuedNotification
+
+    attempts = 0 if error is None else 1
+    try:
+        QueuedNotification.objects.create(
+            kind=job['kind'],
+            payload=job['payload'],
+            enqueued_at=datetime.fromtimestamp(job['enqueued_at'], tz=dt_timezone.utc),
+            attempts=attempts,
+            last_error='' if error is None else str(error)[:1000],
+            next_attempt_at=timezone.now() + timedelta(seconds=get_retry_delay(attempts) if attempts else 0),
+        )
+    except Exception as e:
+        print(f"Error storing notification job {job['kind']} {job['payload']}: {e}")
+        _count('dropped')
+    else:
+        _count('spilled')
+
+
+def _process(job):
+    _record_lag(job['enqueued_at'])
+    try:
+        handle(job['kind'], job['payload'])
+    except Exception as e:
+        print(f"Error handling notification job {job['kind']} {job['payload']}: {e}")
+        _count('failed')
+        spill(job, e)
+    else:
+        _count('processed')
+
+
+def claim_batch(limit=BATCH_SIZE):
+    """Mark up to ``limit`` due fallback rows as taken by this worker and return them"""
+    from .models import QueuedNotification
+
+    now = timezone.now()
+    QueuedNotification.objects.filter(
+        failed=False,
+        claimed_at__lt=now - CLAIM_TIMEOUT
+    ).update(claimed_by='', claimed_at=None)
+
+    due = list(
+        QueuedNotification.objects.filter(
+            failed=False,
+            claimed_by='',
+            next_attempt_at__lte=now
+        ).order_by('next_attempt_at').values_list('pk', flat=True)[:limit]
+    )
+    if not due:
+        return []
+
+    # Another process may have claimed some of them in the meantime
+    token = uuid.uuid4().hex
+    QueuedNotification.objects.filter(pk__in=due, claimed_by='').update(claimed_by=token, claimed_at=now)
+    return list(QueuedNotification.objects.filter(claimed_by=token))
+
+
+def process_fallback():
+    """Handle every due row of the fallback table; returns how many succeeded"""
+    from .models import QueuedNotification
+
+    handled = 0
+    while True:
+        rows = claim_batch()
+        if not rows:
+            return handled
+
+        done = []
+        for row in rows:
+            _record_lag(row.enqueued_at.timestamp())
+            try:
+                handle(row.kind, row.payload)
+            except Exception as e:
+                print(f"Error handling notification job {row.kind} {row.payload}: {e}")
+                _count('failed')
+                row.attempts += 1
+                row.last_error = str(e)[:1000]
+                row.failed = row.attempts >= get_max_attempts()
+                row.next_attempt_at = timezone.now() + timedelta(seconds=get_retry_delay(row.attempts))
+                row.claimed_by = ''
+                row.claimed_at = None
+            else:
+                _count('processed')
+                done.append(row.pk)
+
+        QueuedNotification.objects.filter(pk__in=done).delete()
+        retried = [row for row in rows if row.pk not in done]
+        QueuedNotification.objects.bulk_update(
+            retried, ['attempts', 'last_error', 'failed', 'next_attempt_at', 'claimed_by', 'claimed_at']
+        )
+        handled += len(done)
+
+
+def _run_worker():
+    interval = getattr(settings, 'NOTIFICATION_QUEUE_POLL_INTERVAL', 30)
+    # Poll the table right away for jobs left by a previous run
+    next_poll = 0
+    while True:
+        try:
+            job = _queue.get(timeout=max(0, next_poll - time.monotonic()))
+        except queue.Empty:
+            job = None
+        try:
+            if job is not None:
+                _process(job)
+            if time.monotonic() >= next_poll:
+                next_poll = time.monotonic() + interval
+                process_fallback()
+        except Exception as e:
+            print(f"Error processing queued notifications: {e}")
+        finally:
+            close_old_connections()
+
+
+def _ensure_worker():
+    global _queue, _worker
+
+    if _worker is not None:
+        return
+
+    with _worker_lock:
+        if _worker is None:
+            _queue = queue.Queue(maxsize=get_max_size())
+            _worker = threading.Thread(target=_run_worker, name='notification-queue', daemon=True)
+            _worker.start()
+
+
+def stats():
+    """Queue depth, lag (seconds from enqueue to handling) and counters for this process"""
+    from .models import QueuedNotification
+
+    with _stats_lock:
+        counters = dict(_stats)
+
+    depth = _queue.qsize() if _queue is not None else 0
+    oldest = 0.0
+    if _queue is not None:
+        with _queue.mutex:
+            if _queue.queue:
+                oldest = time.time() - _queue.queue[0]['enqueued_at']
+
+    handled = counters['processed'] + counters['failed']
+    return {
+        'pid': os.getpid(),
+        'depth': depth,
+        'max_size': get_max_size(),
+        'oldest_lag': round(oldest, 3),
+        'last_lag': round(counters['last_lag'], 3),
+        'max_lag': round(counters['max_lag'], 3),
+        'avg_lag': round(counters['total_lag'] / handled, 3) if handled else 0.0,
+        'enqueued': counters['enqueued'],
+        'processed': counters['processed'],
+        'failed': counters['failed'],
+        'spilled': counters['spilled'],
+        'dropped': counters['dropped'],
+        'fallback_pending': QueuedNotification.objects.filter(failed=False).count(),
+        'fallback_failed': QueuedNotification.objects.filter(failed=True).count(),
+    }
@@ -0,0 +1,189 @@
+"""
+Concurrent Web Push delivery.
+
+PushDispatcher sends a payload to many devices at once on a bounded thread
+pool (WEBPUSH_MAX_WORKERS). Each push service (fcm.googleapis.com,
+updates.push.services.mozilla.com, ...) gets its own keep-alive
+requests.Session, so repeated pushes reuse open HTTPS connections instead of
+doing a TLS handshake per device. The VAPID key is parsed once and the signed
+JWT for each push service audience is reused until it is close to expiry.
+
+A batch reports every device's outcome in one go once its last push
+finishes; devices the push service reports as gone (404/410) are deactivated
+with a single UPDATE.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.db import close_old_connections
+from py_vapid import Vapid
+from pywebpush import WebPusher
+
+SENT = 'sent'
+GONE = 'gone'
+FAILED = 'failed'
+
+# VAPID tokens are signed for 12 hours and replaced an hour before they expire
+VAPID_TOKEN_LIFETIME = 12 * 60 * 60
+VAPID_REFRESH_MARGIN = 60 * 60
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_max_workers():
+    return getattr(settings, 'WEBPUSH_MAX_WORKERS', 8)
+
+
+def get_timeout():
+    """Seconds to wait on a push service before counting the push as failed"""
+    return getattr(settings, 'WEBPUSH_TIMEOUT', 10)
+
+
+def audience(endpoint):
+    parts = urlsplit(endpoint)
+    return f'{parts.scheme}://{parts.netloc}'
+
+
+class VapidSigner:
+    """VAPID Authorization headers, signed once per audience and reused until near expiry"""
+
+    def __init__(self, private_key, subject):
+        if os.path.isfile(private_key):
+            self.vapid = Vapid.from_file(private_key_file=private_key)
+        else:
+            self.vapid = Vapid.from_string(private_key=private_key)
+        self.subject = subject
+        self._headers = {}
+        self._lock = threading.Lock()
+
+    def headers(self, aud):
+        now = time.time()
+        with self._lock:
+            cached = self._headers.get(aud)
+            if cached is None or cached[1] - now < VAPID_REFRESH_MARGIN:
+                exp = int(now) + VAPID_TOKEN_LIFETIME
+                cached = (self.vapid.sign({'sub': self.subject, 'aud': aud, 'exp': exp}), exp)
+                self._headers[aud] = cached
+        # WebPusher.send adds its own headers to the dict it is given
+        return dict(cached[0])
+
+
+class PushBatch:
+    """One payload on its way to several devices; outcomes are reported when all are done"""
+
+    def __init__(self, pending):
+        self.outcomes = {}
+        self._pending = pending
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        if not pending:
+            self._done.set()
+
+    def _finish(self, device_id, outcome):
+        with self._lock:
+            self.outcomes[device_id] = outcome
+            self._pending -= 1
+            last = self._pending == 0
+        if last:
+            try:
+                report_outcomes(self.outcomes)
+            finally:
+                close_old_connections()
+                self._done.set()
+
+    def wait(self, timeout=None):
+        """Block until every push in the batch has finished; returns {device_id: outcome}"""
+        self._done.wait(timeout)
+        return dict(self.outcomes)
+
+    @property
+    def sent(self):
+        return sum(1 for outcome in self.outcomes.values() if outcome == SENT)
+
+
+def report_outcomes(outcomes):
+    """Store a finished batch: deactivate every device that is gone in one query"""
+    from .models import WebPushDevice
+
+    gone = [device_id for device_id, outcome in outcomes.items() if outcome == GONE]
+    if gone:
+        try:
+            WebPushDevice.objects.filter(pk__in=gone).update(is_active=False)
+        except Exception as e:
+            print(f"Error deactivating push devices {gone}: {e}")
+
+
+class PushDispatcher:
+    def __init__(self, private_key, subject, max_workers=None):
+        self.key = (private_key, subject)
+        self.signer = VapidSigner(private_key, subject)
+        self.max_workers = max_workers or get_max_workers()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='webpush')
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session(self, aud):
+        """Keep-alive session for one push service, sized for the whole pool"""
+        with self._lock:
+            session = self._sessions.get(aud)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._sessions[aud] = session
+        return session
+
+    def push(self, device_id, subscription_info, data):
+        """Send one push and return its outcome"""
+        try:
+            aud = audience(subscription_info['endpoint'])
+            response = WebPusher(subscription_info, requests_session=self.session(aud)).send(
+                data,
+                headers=self.signer.headers(aud),
+                timeout=get_timeout()
+            )
+        except Exception as e:
+            print(f"Error sending push notification to device {device_id}: {e}")
+            return FAILED
+
+        if response.status_code in (404, 410):
+            return GONE
+        if response.status_code > 202:
+            print(f"WebPush error for device {device_id}: {response.status_code} {response.reason}")
+            return FAILED
+        return SENT
+
+    def dispatch(self, subscriptions, data):
+        """
+        Queue ``data`` for every (device_id, subscription_info) pair and return
+        the PushBatch without waiting for the push services.
+        """
+        subscriptions = list(subscriptions)
+        batch = PushBatch(len(subscriptions))
+        for device_id, subscription_info in subscriptions:
+            future = self._executor.submit(self.push, device_id, subscription_info, data)
+            future.add_done_callback(
+                lambda f, device_id=device_id: batch._finish(
+                    device_id, FAILED if f.exception() else f.result()
+                )
+            )
+        return batch
+
+
+def get_dispatcher():
+    """The process-wide dispatcher for the configured VAPID key"""
+    global _dispatcher
+
+    key = (settings.VAPID_PRIVATE_KEY, settings.VAPID_ADMIN_EMAIL)
+    with _dispatcher_lock:
+        if _dispatcher is None or _dispatcher.key != key:
+            _dispatcher = PushDispatcher(*key)
+        return _dispatcher
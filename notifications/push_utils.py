@@ -3,7 +3,7 @@ Utility functions for sending push notifications
 """
 from django.conf import settings
 from .models import WebPushDevice
-from pywebpush import webpush, WebPushException
+from .push_dispatcher import get_dispatcher
 import json
 
 
@@ -34,9 +34,6 @@ def send_push_notification(user, title, message, url=None, tag='studiswap-notifi
     # Get all active devices for this user
     devices = WebPushDevice.objects.filter(user=user, is_active=True)
     
-    if not devices.exists():
-        return 0
-    
     # Prepare notification data
     notification_data = {
         'title': title,
@@ -50,39 +47,20 @@ def send_push_notification(user, title, message, url=None, tag='studiswap-notifi
         'requireInteraction': False
     }
     
-    success_count = 0
-    
-    for device in devices:
+    subscriptions = []
+    for device_id, raw in devices.values_list('id', 'subscription_info'):
         try:
-            subscription_info = device.get_subscription_info()
-            
-            if not subscription_info:
-                continue
-            
-            # Send push notification
-            webpush(
-                subscription_info=subscription_info,
-                data=json.dumps(notification_data),
-                vapid_private_key=settings.VAPID_PRIVATE_KEY,
-                vapid_claims={
-                    "sub": settings.VAPID_ADMIN_EMAIL
-                }
-            )
-            
-            success_count += 1
-            
-        except WebPushException as e:
-            print(f"WebPush error for device {device.id}: {e}")
-            
-            # If subscription is invalid, deactivate the device
-            if e.response and e.response.status_code in [404, 410]:
-                device.is_active = False
-                device.save()
-                
-        except Exception as e:
-            print(f"Error sending push notification to device {device.id}: {e}")
+            subscriptions.append((device_id, json.loads(raw)))
+        except ValueError:
+            continue
+    
+    if not subscriptions:
+        return 0
     
-    return success_count
+    # Devices are pushed to concurrently; gone ones are deactivated together
+    batch = get_dispatcher().dispatch(subscriptions, json.dumps(notification_data))
+    batch.wait()
+    return batch.sent
 
 
 def send_message_notification(sender, recipient, conversation, message_text):
@@ -1,6 +1,7 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from .models import NotificationPreference
+from .models import Notification, NotificationPreference
+from . import unread
 from django.contrib.auth.models import User
 
 
@@ -9,3 +10,10 @@ def create_notification_preferences(sender, instance, created, **kwargs):
     """Create default notification preferences for new users"""
     if created:
         NotificationPreference.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Notification)
+def count_new_notification(sender, instance, created, **kwargs):
+    """Bump the recipient's cached unread count and push it to their open tabs"""
+    if created and not instance.is_read:
+        unread.adjust(instance.recipient_id, 1)
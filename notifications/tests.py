@@ -1,3 +1,425 @@
-from django.test import TestCase
+import base64
+import json
+import re
+import socket
+import socketserver
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from cryptography.hazmat.primitives.asymmetric import ec
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from . import outbox, push_dispatcher
+from .models import OutgoingEmail, WebPushDevice
+from .push_dispatcher import FAILED, GONE, SENT, PushDispatcher, audience, report_outcomes
+
+JWT_RE = re.compile(r't=([\w-]+\.[\w-]+\.[\w-]+)')
+
+
+def generate_vapid_key():
+    """A fresh VAPID private key, base64url-encoded the way VapidSigner reads it"""
+    private_value = ec.generate_private_key(ec.SECP256R1()).private_numbers().private_value
+    return base64.urlsafe_b64encode(private_value.to_bytes(32, 'big')).decode().rstrip('=')
+
+
+def jwt_claims(authorization):
+    payload = JWT_RE.search(authorization).group(1).split('.')[1]
+    return json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+
+
+class PushServiceHandler(BaseHTTPRequestHandler):
+    """Push service stand-in answering with the status at the start of the path (/201/..., /410/...)"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        with server.lock:
+            server.received.append((self.path, self.headers['Authorization'], self.client_address))
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        time.sleep(server.delay)
+        with server.lock:
+            server.in_flight -= 1
+
+        self.send_response(int(self.path.split('/')[1]))
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_push_service(delay=0.05):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PushServiceHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.received = []
+    server.in_flight = server.max_in_flight = 0
+    server.delay = delay
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class PushDispatcherTests(SimpleTestCase):
+    """
+    Deliver payload-less pushes, which pywebpush sends unencrypted, to local
+    push services and check what reaches them.
+    """
+    max_workers = 2
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.private_key = generate_vapid_key()
+        cls.services = [start_push_service(), start_push_service()]
+
+    @classmethod
+    def tearDownClass(cls):
+        for server in cls.services:
+            server.shutdown()
+            server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        for server in self.services:
+            server.received.clear()
+            server.max_in_flight = 0
+
+        self.dispatcher = PushDispatcher(self.private_key, 'mailto:admin@example.com', max_workers=self.max_workers)
+        self.addCleanup(self.dispatcher._executor.shutdown)
+
+        # Outcomes are stored by report_outcomes, tested on its own below
+        patcher = mock.patch.object(push_dispatcher, 'report_outcomes')
+        self.report_outcomes = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def endpoint(self, server, status, device_id):
+        host, port = server.server_address
+        return f'http://{host}:{port}/{status}/{device_id}'
+
+    def dispatch(self, endpoints):
+        batch = self.dispatcher.dispatch(
+            [(device_id, {'endpoint': endpoint}) for device_id, endpoint in enumerate(endpoints)],
+            None
+        )
+        outcomes = batch.wait(timeout=10)
+        self.assertEqual(len(outcomes), len(endpoints), 'Batch did not finish')
+        return batch, outcomes
+
+    def test_outcomes_by_status(self):
+        service = self.services[0]
+        batch, outcomes = self.dispatch([
+            self.endpoint(service, 201, 'a'),
+            self.endpoint(service, 404, 'b'),
+            self.endpoint(service, 410, 'c'),
+        ])
+
+        self.assertEqual(outcomes, {0: SENT, 1: GONE, 2: GONE})
+        self.assertEqual(batch.sent, 1)
+        # The whole batch is reported once, after its last push
+        self.report_outcomes.assert_called_once_with({0: SENT, 1: GONE, 2: GONE})
+
+    def test_unreachable_push_service_fails(self):
+        server = start_push_service()
+        endpoint = self.endpoint(server, 201, 'a')
+        server.shutdown()
+        server.server_close()
+
+        # Errors are reported with print(); keep the test output clean
+        with mock.patch('builtins.print'):
+            batch, outcomes = self.dispatch([endpoint])
+
+        self.assertEqual(outcomes, {0: FAILED})
+        self.report_outcomes.assert_called_once_with({0: FAILED})
+
+    def test_vapid_token_reused_per_audience(self):
+        first, second = self.services
+        self.dispatch([self.endpoint(first, 201, i) for i in range(3)] + [self.endpoint(second, 201, 'x')])
+        self.dispatch([self.endpoint(first, 201, 'again'), self.endpoint(second, 410, 'y')])
+
+        for server in self.services:
+            tokens = {authorization for _, authorization, _ in server.received}
+            self.assertEqual(len(tokens), 1)
+            claims = jwt_claims(tokens.pop())
+            self.assertEqual(claims['aud'], audience(self.endpoint(server, 201, 'a')))
+            self.assertEqual(claims['sub'], 'mailto:admin@example.com')
+
+        self.assertNotEqual(first.received[0][1], second.received[0][1])
+
+    def test_vapid_token_refreshed_near_expiry(self):
+        aud = audience(self.endpoint(self.services[0], 201, 'a'))
+        now = time.time()
+        signer = self.dispatcher.signer
+
+        with mock.patch.object(push_dispatcher.time, 'time', return_value=now):
+            token = signer.headers(aud)['Authorization']
+
+        refresh_at = now + push_dispatcher.VAPID_TOKEN_LIFETIME - push_dispatcher.VAPID_REFRESH_MARGIN
+        with mock.patch.object(push_dispatcher.time, 'time', return_value=refresh_at - 60):
+            self.assertEqual(signer.headers(aud)['Authorization'], token)
+        with mock.patch.object(push_dispatcher.time, 'time', return_value=refresh_at + 60):
+            refreshed = signer.headers(aud)['Authorization']
+
+        self.assertNotEqual(refreshed, token)
+        self.assertGreater(jwt_claims(refreshed)['exp'], jwt_claims(token)['exp'])
+
+    def test_one_session_per_push_service(self):
+        first, second = self.services
+        for _ in range(2):
+            self.dispatch([self.endpoint(server, 201, i) for server in self.services for i in range(4)])
+
+        self.assertEqual(
+            set(self.dispatcher._sessions),
+            {audience(self.endpoint(server, 201, 'a')) for server in self.services}
+        )
+        # Keep-alive: 8 pushes per service over at most one connection per worker
+        for server in (first, second):
+            self.assertEqual(len(server.received), 8)
+            self.assertLessEqual(len({address for _, _, address in server.received}), self.max_workers)
+
+    def test_concurrency_bounded_by_max_workers(self):
+        service = self.services[0]
+        self.dispatch([self.endpoint(service, 201, i) for i in range(6)])
+
+        self.assertEqual(service.max_in_flight, self.max_workers)
+
+
+class ReportOutcomesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('pushuser', 'push@example.com', 'password')
+        cls.devices = [
+            WebPushDevice.objects.create(user=user, subscription_info=json.dumps({'endpoint': f'https://push.example.com/{i}'}))
+            for i in range(4)
+        ]
+
+    def test_gone_devices_deactivated_in_one_update(self):
+        sent, failed, gone, also_gone = (device.pk for device in self.devices)
+
+        with self.assertNumQueries(1):
+            report_outcomes({sent: SENT, failed: FAILED, gone: GONE, also_gone: GONE})
+
+        active = dict(WebPushDevice.objects.values_list('pk', 'is_active'))
+        self.assertEqual(active, {sent: True, failed: True, gone: False, also_gone: False})
+
+    def test_nothing_gone_costs_no_query(self):
+        with self.assertNumQueries(0):
+            report_outcomes({self.devices[0].pk: SENT, self.devices[1].pk: FAILED})
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Mail server stand-in: accepts every command, and answers the end of a
+    message with 451 while ``server.reject`` is positive
+    """
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 localhost')
+
+        data = None
+        for raw in self.rfile:
+            line = raw.decode().rstrip('\r\n')
+            if data is not None:
+                if line != '.':
+                    data.append(line[1:] if line.startswith('..') else line)
+                    continue
+                with server.lock:
+                    rejected = server.reject > 0
+                    server.reject -= rejected
+                    if not rejected:
+                        server.messages.append('\n'.join(data))
+                self.reply('451 Try again later' if rejected else '250 Queued')
+                data = None
+                continue
+
+            command = line.split(' ', 1)[0].upper()
+            if command == 'EHLO':
+                self.reply('250 localhost')
+            elif command == 'DATA':
+                data = []
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+def start_smtp_server():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.messages = []
+    server.reject = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def closed_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@override_settings(EMAIL_OUTBOX_SYNC=True, EMAIL_OUTBOX_MAX_ATTEMPTS=3, EMAIL_OUTBOX_RETRY_DELAY=30)
+class EmailOutboxTests(TestCase):
+    """Deliver outbox messages to a local SMTP server with the real SMTP backend"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.smtp = start_smtp_server()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.smtp.shutdown()
+        cls.smtp.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.smtp.connections = 0
+        self.smtp.messages.clear()
+        self.smtp.reject = 0
+        self.use_port(self.smtp.server_address[1])
+
+    def use_port(self, port):
+        settings = self.settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=port,
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+            EMAIL_USE_TLS=False,
+            EMAIL_USE_SSL=False,
+            EMAIL_TIMEOUT=5,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def queue(self, subject='Your OTP'):
+        return outbox.queue_email(subject=subject, body='123456', to=['user@example.com'])
+
+    def make_due(self):
+        OutgoingEmail.objects.filter(status=OutgoingEmail.STATUS_PENDING).update(next_attempt_at=timezone.now())
+
+    def assertRetryScheduled(self, email, attempts, delay, before, after):
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.STATUS_PENDING)
+        self.assertEqual(email.attempts, attempts)
+        self.assertIn('451', email.last_error)
+        self.assertGreaterEqual(email.next_attempt_at, before + timedelta(seconds=delay))
+        self.assertLessEqual(email.next_attempt_at, after + timedelta(seconds=delay))
+
+    def test_sent_once_the_transaction_commits(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                email = self.queue()
+            self.assertEqual(self.smtp.messages, [])
+
+        self.assertEqual(len(self.smtp.messages), 1)
+        self.assertIn('Subject: Your OTP', self.smtp.messages[0])
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.STATUS_SENT)
+        self.assertEqual(email.attempts, 1)
+        self.assertIsNotNone(email.sent_at)
+
+    def test_rolled_back_email_is_never_sent(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.queue()
+                raise RuntimeError('action failed')
+
+        self.assertEqual(callbacks, [])
+        self.assertFalse(OutgoingEmail.objects.exists())
+        self.assertEqual(self.smtp.messages, [])
+
+    def test_batch_shares_one_connection(self):
+        for i in range(3):
+            self.queue(subject=f'Message {i}')
+
+        self.assertEqual(outbox.deliver_pending(), 3)
+        self.assertEqual(self.smtp.connections, 1)
+        self.assertEqual(len(self.smtp.messages), 3)
+
+    def test_failed_message_retried_with_doubling_delay(self):
+        self.smtp.reject = 2
+        email = self.queue()
+
+        before = timezone.now()
+        self.assertEqual(outbox.deliver_pending(), 0)
+        self.assertRetryScheduled(email, attempts=1, delay=30, before=before, after=timezone.now())
+
+        # Not due yet: nothing is claimed and the server isn't contacted
+        self.assertEqual(outbox.deliver_pending(), 0)
+        self.assertEqual(self.smtp.connections, 1)
+
+        self.make_due()
+        before = timezone.now()
+        self.assertEqual(outbox.deliver_pending(), 0)
+        self.assertRetryScheduled(email, attempts=2, delay=60, before=before, after=timezone.now())
+
+        self.make_due()
+        self.assertEqual(outbox.deliver_pending(), 1)
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.STATUS_SENT)
+        self.assertEqual(email.attempts, 3)
+        self.assertEqual(email.last_error, '')
+        self.assertEqual(len(self.smtp.messages), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        self.smtp.reject = 10
+        email = self.queue()
+
+        for _ in range(3):
+            self.make_due()
+            outbox.deliver_pending()
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.STATUS_FAILED)
+        self.assertEqual(email.attempts, 3)
+
+        self.make_due()
+        self.assertEqual(outbox.claim_batch(), [])
+
+    def test_unreachable_server_counts_an_attempt_for_the_whole_batch(self):
+        self.use_port(closed_port())
+        emails = [self.queue(subject=f'Message {i}') for i in range(2)]
+
+        # Errors are reported with print(); keep the test output clean
+        with mock.patch('builtins.print'):
+            self.assertEqual(outbox.deliver_pending(), 0)
+
+        for email in emails:
+            email.refresh_from_db()
+            self.assertEqual(email.status, OutgoingEmail.STATUS_PENDING)
+            self.assertEqual(email.attempts, 1)
+            self.assertNotEqual(email.last_error, '')
+
+    def test_claim_of_a_dead_worker_is_taken_over(self):
+        stale, live = self.queue(subject='Stale'), self.queue(subject='Live')
+        OutgoingEmail.objects.filter(pk=stale.pk).update(
+            status=OutgoingEmail.STATUS_SENDING,
+            claimed_at=timezone.now() - outbox.CLAIM_TIMEOUT - timedelta(minutes=1)
+        )
+        OutgoingEmail.objects.filter(pk=live.pk).update(
+            status=OutgoingEmail.STATUS_SENDING,
+            claimed_at=timezone.now()
+        )
+
+        self.assertEqual(outbox.deliver_pending(), 1)
+        self.assertEqual(OutgoingEmail.objects.get(pk=stale.pk).status, OutgoingEmail.STATUS_SENT)
+        self.assertEqual(OutgoingEmail.objects.get(pk=live.pk).status, OutgoingEmail.STATUS_SENDING)
@@ -0,0 +1,76 @@
+"""
+Cached unread-notification counters.
+
+Each user's unread count lives in the cache, so rendering the navbar badge or
+answering /notifications/unread-count/ costs a cache read instead of a COUNT.
+The counter is COUNTed once on a miss and then moved by exact deltas after
+every change commits: +1 for a new notification, -n when n are marked read
+or deleted. Bulk deletes recount instead. Each change also pushes the new
+count to the user's open tabs over the ``user_<id>`` channel-layer group
+(see chat.consumers.InboxConsumer), which replaces polling.
+
+NOTIFICATION_COUNT_TIMEOUT bounds how long a counter that missed a change,
+such as a queryset update from the shell, can stay wrong.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from chat.inbox import send_to_user
+
+COUNT_KEY = 'notifications:unread:{}'
+
+
+def get_timeout():
+    return getattr(settings, 'NOTIFICATION_COUNT_TIMEOUT', 3600)
+
+
+def _count_unread(user_id):
+    from .models import Notification
+    return Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+
+
+def get_count(user_id):
+    """The user's unread count, from the cache when possible"""
+    key = COUNT_KEY.format(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = _count_unread(user_id)
+        cache.add(key, count, get_timeout())
+    return count
+
+
+def _publish(user_id, count):
+    send_to_user(user_id, {'type': 'notifications.count', 'unread_count': count})
+
+
+def _apply(user_id, delta):
+    key = COUNT_KEY.format(user_id)
+    try:
+        count = cache.incr(key, delta)
+    except ValueError:
+        # Not cached: the next read counts, and this one may as well
+        count = get_count(user_id)
+    else:
+        if count < 0:
+            # Two requests raced to take away the same notification
+            cache.delete(key)
+            count = get_count(user_id)
+    _publish(user_id, count)
+
+
+def _recount(user_id):
+    count = _count_unread(user_id)
+    cache.set(COUNT_KEY.format(user_id), count, get_timeout())
+    _publish(user_id, count)
+
+
+def adjust(user_id, delta):
+    """Move the user's counter by ``delta`` once the current transaction commits"""
+    if delta:
+        transaction.on_commit(lambda: _apply(user_id, delta))
+
+
+def refresh(user_id):
+    """Recount the user's unread notifications once the current transaction commits"""
+    transaction.on_commit(lambda: _recount(user_id))
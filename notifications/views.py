@@ -11,6 +11,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 from .models import Notification, NotificationPreference, WebPushDevice
 from .forms import NotificationPreferenceForm
+from . import unread
 import json
 
 
@@ -36,10 +37,7 @@ class NotificationListView(LoginRequiredMixin, ListView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['unread_count'] = Notification.objects.filter(
-            recipient=self.request.user, 
-            is_read=False
-        ).count()
+        context['unread_count'] = unread.get_count(self.request.user.id)
         context['notification_types'] = Notification.NOTIFICATION_TYPES
         context['current_filter'] = self.request.GET.get('type', 'all')
         return context
@@ -66,6 +64,7 @@ def mark_all_read(request):
             recipient=request.user, 
             is_read=False
         ).update(is_read=True)
+        unread.adjust(request.user.id, -updated_count)
         
         messages.success(request, f'Marked {updated_count} notifications as read.')
         
@@ -83,6 +82,8 @@ def delete_notification(request, notification_id):
     if request.method == 'POST':
         notification = get_object_or_404(Notification, id=notification_id, recipient=request.user)
         notification.delete()
+        if not notification.is_read:
+            unread.adjust(request.user.id, -1)
         
         messages.success(request, 'Notification deleted.')
         
@@ -99,6 +100,7 @@ def clear_all_notifications(request):
     """Clear all notifications for the current user"""
     if request.method == 'POST':
         deleted_count = Notification.objects.filter(recipient=request.user).delete()[0]
+        unread.refresh(request.user.id)
         messages.success(request, f'Cleared {deleted_count} notifications.')
         
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -130,12 +132,7 @@ class NotificationPreferenceView(LoginRequiredMixin, UpdateView):
 @login_required
 def get_unread_count(request):
     """AJAX view to get unread notification count"""
-    count = Notification.objects.filter(
-        recipient=request.user, 
-        is_read=False
-    ).count()
-    
-    return JsonResponse({'unread_count': count})
+    return JsonResponse({'unread_count': unread.get_count(request.user.id)})
 
 
 @login_required
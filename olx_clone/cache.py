@@ -0,0 +1,529 @@
+"""
+Two-tier cache backend.
+
+Tier one is a bounded LRU dict inside each process; tier two is a SQLite
+file shared by every worker process on the host, so a value written by one
+daphne worker is seen by the others without an external cache server.
+
+Reads try the LRU first and fall back to the shared store, copying what they
+find into the LRU for at most L1_TIMEOUT seconds. Every write to the shared
+store is also appended to an invalidation log. Each process replays the log
+at most every SYNC_INTERVAL seconds and drops the keys other processes have
+changed, so a version counter bumped in one worker (products.facets,
+products.page_cache, categories.tree) reaches every LRU within that interval.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'olx_clone.cache.TieredCache',
+            'LOCATION': BASE_DIR / 'cache.sqlite3',
+            'OPTIONS': {
+                'MAX_ENTRIES': 20000, 'L1_MAX_ENTRIES': 2000, 'L1_TIMEOUT': 5,
+                'LOCAL_PREFIXES': ['pagecache:lock:'], 'LOCAL_MAX_ENTRIES': 10000,
+            },
+        }
+    }
+
+Keys starting with one of LOCAL_PREFIXES never reach the shared store: they
+live in a second per-process LRU (LOCAL_MAX_ENTRIES) for their full timeout,
+and add() on them is atomic within the process only. That suits short-lived
+or high-churn keys such as regeneration locks and dedupe markers, where a
+per-process answer is good enough and a shared-store write per request is not.
+
+Hit, miss and eviction counters are kept per process and published to the
+shared store every STATS_INTERVAL seconds; stats() collects them all.
+
+When the shared store stays locked past SQLite's busy timeout, the operation
+is counted in ``errors`` and degrades instead of raising: reads miss, writes
+are skipped and the LRU forgets the key, incr() raises ValueError as if the
+key were missing.
+"""
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache_entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)',
+    'CREATE INDEX IF NOT EXISTS cache_entries_expires ON cache_entries (expires)',
+    'CREATE TABLE IF NOT EXISTS cache_log ('
+    'seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, origin TEXT NOT NULL, logged_at REAL NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS cache_stats (origin TEXT PRIMARY KEY, stats TEXT NOT NULL, updated_at REAL NOT NULL)',
+)
+
+STAT_NAMES = (
+    'l1_hits', 'l1_misses', 'l2_hits', 'l2_misses',
+    'l1_evictions', 'l2_evictions', 'invalidations', 'sets', 'deletes', 'errors',
+)
+
+# Shared-store writes between two checks of MAX_ENTRIES
+CULL_EVERY = 100
+
+# Published stats of processes silent for this long are dropped
+STATS_EXPIRY = 3600
+
+
+class LocalTier:
+    """The per-process LRU, shared by every thread's backend instance"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = dict.fromkeys(STAT_NAMES, 0)
+        self.origin = f'{os.uname().nodename}:{os.getpid()}'
+        self.last_seq = None
+        self.next_sync = 0
+        self.next_publish = 0
+        self.writes = 0
+
+    def get(self, key, now):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self.entries[key]
+                self.stats['l1_misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats['l1_hits'] += 1
+            return entry
+
+    def put(self, key, value, expires):
+        with self.lock:
+            self._put(key, value, expires)
+
+    def add(self, key, value, expires, now):
+        """put() unless a live entry exists; True if stored"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > now:
+                return False
+            self._put(key, value, expires)
+            return True
+
+    def incr(self, key, delta, now):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[1] <= now:
+                raise ValueError(f"Key '{key}' not found")
+            value = entry[0] + delta
+            self._put(key, value, entry[1])
+            return value
+
+    def _put(self, key, value, expires):
+        self.entries[key] = (value, expires)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats['l1_evictions'] += 1
+
+    def drop(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.stats[name] += amount
+
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+def _get_tier(location, max_entries, local=False):
+    # Keyed on the pid too, so a forked worker starts with its own empty LRU
+    key = (location, local, os.getpid())
+    with _tiers_lock:
+        if key not in _tiers:
+            _tiers[key] = LocalTier(max_entries)
+        return _tiers[key]
+
+
+class TieredCache(BaseCache):
+    """Per-process LRU in front of a SQLite file shared by all workers"""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.location = str(location)
+        self.l1_timeout = float(options.get('L1_TIMEOUT', 5))
+        self.sync_interval = float(options.get('SYNC_INTERVAL', 0.5))
+        self.stats_interval = float(options.get('STATS_INTERVAL', 10))
+        self.tier = _get_tier(self.location, int(options.get('L1_MAX_ENTRIES', 2000)))
+        self.local_prefixes = tuple(options.get('LOCAL_PREFIXES', ()))
+        self.local = _get_tier(self.location, int(options.get('LOCAL_MAX_ENTRIES', 10000)), local=True)
+        self._local = threading.local()
+
+    # Shared store
+
+    @property
+    def db(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.location, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+        return connection
+
+    def _write(self, statements, default=None):
+        """
+        Run ``statements(db)`` in one write transaction, holding SQLite's write
+        lock; returns ``default`` if the lock can't be had within the timeout
+        """
+        try:
+            db = self.db
+            db.execute('BEGIN IMMEDIATE')
+        except sqlite3.OperationalError:
+            self.tier.count('errors')
+            return default
+        try:
+            result = statements(db)
+            db.execute('COMMIT')
+        except sqlite3.OperationalError:
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+            self.tier.count('errors')
+            return default
+        except BaseException:
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+            raise
+        return result
+
+    def _log(self, db, keys, now):
+        db.executemany(
+            'INSERT INTO cache_log (key, origin, logged_at) VALUES (?, ?, ?)',
+            [(key, self.tier.origin, now) for key in keys]
+        )
+
+    def _sync(self, now):
+        """Drop LRU entries that other processes changed since the last sync"""
+        tier = self.tier
+        if now < tier.next_sync:
+            return
+        tier.next_sync = now + self.sync_interval
+
+        try:
+            self._replay_log(now)
+        except sqlite3.OperationalError:
+            # Retried at the next interval; stale LRU entries still expire after L1_TIMEOUT
+            tier.count('errors')
+
+    def _replay_log(self, now):
+        tier = self.tier
+        if tier.last_seq is None:
+            tier.last_seq = self.db.execute('SELECT COALESCE(MAX(seq), 0) FROM cache_log').fetchone()[0]
+            return
+
+        rows = self.db.execute(
+            'SELECT seq, key, origin FROM cache_log WHERE seq > ? ORDER BY seq', (tier.last_seq,)
+        ).fetchall()
+        if rows:
+            # Our own writes already updated the LRU
+            changed = [key for _, key, origin in rows if origin != tier.origin]
+            tier.drop(changed)
+            tier.count('invalidations', len(changed))
+            tier.last_seq = max(tier.last_seq, rows[-1][0])
+
+        if now >= tier.next_publish:
+            tier.next_publish = now + self.stats_interval
+            self._publish(now)
+
+    def _publish(self, now):
+        with self.tier.lock:
+            stats = dict(self.tier.stats, l1_entries=len(self.tier.entries))
+        stats['local_entries'] = len(self.local.entries)
+        self.db.execute(
+            'INSERT OR REPLACE INTO cache_stats (origin, stats, updated_at) VALUES (?, ?, ?)',
+            (self.tier.origin, json.dumps(stats), now)
+        )
+
+    def _maybe_cull(self, db, now):
+        self.tier.writes += 1
+        if self.tier.writes % CULL_EVERY:
+            return
+
+        # LRUs never hold an entry longer than L1_TIMEOUT, so older log rows are spent
+        db.execute('DELETE FROM cache_log WHERE logged_at < ?', (now - max(self.l1_timeout, self.sync_interval) - 60,))
+        db.execute('DELETE FROM cache_stats WHERE updated_at < ?', (now - STATS_EXPIRY,))
+        if db.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0] <= self._max_entries:
+            return
+        db.execute('DELETE FROM cache_entries WHERE expires <= ?', (now,))
+        count = db.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+        if count > self._max_entries:
+            culled = db.execute(
+                'DELETE FROM cache_entries WHERE key IN '
+                '(SELECT key FROM cache_entries ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency or 1,)
+            ).rowcount
+            self.tier.count('l2_evictions', culled)
+
+    def _fetch(self, keys, now):
+        """{key: (value, expires)} for live shared-store entries; nothing if the store is locked"""
+        found = {}
+        keys = list(keys)
+        try:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self.db.execute(
+                    f'SELECT key, value, expires FROM cache_entries '
+                    f'WHERE key IN ({",".join("?" * len(chunk))}) AND (expires IS NULL OR expires > ?)',
+                    (*chunk, now)
+                ).fetchall()
+                for key, value, expires in rows:
+                    found[key] = (pickle.loads(value), expires)
+        except sqlite3.OperationalError:
+            self.tier.count('errors')
+            return {}
+        return found
+
+    def _remember(self, key, value, expires, now):
+        l1_expires = now + self.l1_timeout
+        self.tier.put(key, value, l1_expires if expires is None else min(expires, l1_expires))
+
+    def _is_local(self, key):
+        """True for keys kept in this process only (LOCAL_PREFIXES)"""
+        return key.startswith(self.local_prefixes)
+
+    def _local_expires(self, timeout):
+        expires = self.get_backend_timeout(timeout)
+        return float('inf') if expires is None else expires
+
+    # Cache API
+
+    def get(self, key, default=None, version=None):
+        if self._is_local(key):
+            entry = self.local.get(self.make_and_validate_key(key, version=version), time.time())
+            return default if entry is None else entry[0]
+
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        self._sync(now)
+
+        entry = self.tier.get(key, now)
+        if entry is not None:
+            return entry[0]
+
+        found = self._fetch([key], now)
+        if key not in found:
+            self.tier.count('l2_misses')
+            return default
+        self.tier.count('l2_hits')
+        value, expires = found[key]
+        self._remember(key, value, expires, now)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys, result, absent = list(keys), {}, object()
+        for key in keys:
+            if self._is_local(key):
+                value = self.get(key, absent, version=version)
+                if value is not absent:
+                    result[key] = value
+
+        keys = {self.make_and_validate_key(key, version=version): key for key in keys if not self._is_local(key)}
+        now = time.time()
+        self._sync(now)
+
+        missing = []
+        for key, original in keys.items():
+            entry = self.tier.get(key, now)
+            if entry is not None:
+                result[original] = entry[0]
+            else:
+                missing.append(key)
+
+        if missing:
+            found = self._fetch(missing, now)
+            self.tier.count('l2_hits', len(found))
+            self.tier.count('l2_misses', len(missing) - len(found))
+            for key, (value, expires) in found.items():
+                self._remember(key, value, expires, now)
+                result[keys[key]] = value
+        return result
+
+    def has_key(self, key, version=None):
+        missing = object()
+        return self.get(key, missing, version=version) is not missing
+
+    def _store(self, items, timeout, only_new=False):
+        """Write ``items`` to the shared store; with ``only_new``, unless a live entry exists"""
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        rows = [(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires) for key, value in items]
+
+        def statements(db):
+            if only_new and db.execute(
+                'SELECT 1 FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (rows[0][0], now)
+            ).fetchone():
+                return False
+            db.executemany('INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)', rows)
+            self._log(db, [row[0] for row in rows], now)
+            self._maybe_cull(db, now)
+            return True
+
+        stored = self._write(statements)
+        if stored is None:
+            # Not written; don't keep serving the value it should have replaced
+            self.tier.drop([key for key, _ in items])
+            return False
+        if stored:
+            self.tier.count('sets', len(rows))
+            for key, value in items:
+                self._remember(key, value, expires, now)
+        return stored
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if self._is_local(key):
+            self.local.put(self.make_and_validate_key(key, version=version), value, self._local_expires(timeout))
+            return
+        key = self.make_and_validate_key(key, version=version)
+        self._store([(key, value)], timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if self._is_local(key):
+            key = self.make_and_validate_key(key, version=version)
+            return self.local.add(key, value, self._local_expires(timeout), time.time())
+        key = self.make_and_validate_key(key, version=version)
+        return self._store([(key, value)], timeout, only_new=True)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        if self._is_local(key):
+            absent = object()
+            value = self.get(key, absent, version=version)
+            if value is absent:
+                return False
+            self.set(key, value, timeout, version=version)
+            return True
+
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+
+        def statements(db):
+            touched = db.execute(
+                'UPDATE cache_entries SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (expires, key, now)
+            ).rowcount
+            self._log(db, [key], now)
+            return touched > 0
+
+        touched = self._write(statements, default=False)
+        self.tier.drop([key])
+        return touched
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        items = []
+        for key, value in data.items():
+            if self._is_local(key):
+                self.set(key, value, timeout, version=version)
+            else:
+                items.append((self.make_and_validate_key(key, version=version), value))
+        if items:
+            self._store(items, timeout)
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        for key in keys:
+            if self._is_local(key):
+                self.delete(key, version=version)
+        self._delete([self.make_and_validate_key(key, version=version) for key in keys if not self._is_local(key)])
+
+    def delete(self, key, version=None):
+        if self._is_local(key):
+            key = self.make_and_validate_key(key, version=version)
+            with self.local.lock:
+                return self.local.entries.pop(key, None) is not None
+        return self._delete([self.make_and_validate_key(key, version=version)])
+
+    def _delete(self, keys):
+        if not keys:
+            return False
+        now = time.time()
+
+        def statements(db):
+            deleted = db.executemany('DELETE FROM cache_entries WHERE key = ?', [(key,) for key in keys]).rowcount
+            self._log(db, keys, now)
+            return deleted
+
+        deleted = self._write(statements, default=0)
+        self.tier.drop(keys)
+        self.tier.count('deletes', len(keys))
+        return deleted > 0
+
+    def incr(self, key, delta=1, version=None):
+        """Atomic across processes: read and write happen under SQLite's write lock"""
+        if self._is_local(key):
+            return self.local.incr(self.make_and_validate_key(key, version=version), delta, time.time())
+
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+
+        def statements(db):
+            row = db.execute(
+                'SELECT value, expires FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (key, now)
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            db.execute(
+                'UPDATE cache_entries SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key)
+            )
+            self._log(db, [key], now)
+            return value, row[1]
+
+        result = self._write(statements)
+        if result is None:
+            raise ValueError(f"Key '{key}' could not be incremented: cache store locked")
+        value, expires = result
+        self.tier.count('sets')
+        self._remember(key, value, expires, now)
+        return value
+
+    def clear(self):
+        now = time.time()
+
+        def statements(db):
+            keys = [row[0] for row in db.execute('SELECT key FROM cache_entries')]
+            db.execute('DELETE FROM cache_entries')
+            self._log(db, keys, now)
+
+        self._write(statements)
+        for tier in (self.tier, self.local):
+            with tier.lock:
+                tier.entries.clear()
+
+    def close(self, **kwargs):
+        # Connections are per thread and reused across requests
+        pass
+
+    def stats(self):
+        """Counters for every process that used this store recently, and their totals"""
+        now = time.time()
+        self._publish(now)
+        processes = {
+            origin: json.loads(stats)
+            for origin, stats in self.db.execute(
+                'SELECT origin, stats FROM cache_stats WHERE updated_at >= ? ORDER BY origin',
+                (now - STATS_EXPIRY,)
+            )
+        }
+        totals = dict.fromkeys(STAT_NAMES, 0)
+        for stats in processes.values():
+            for name in STAT_NAMES:
+                totals[name] += stats.get(name, 0)
+        entries = self.db.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+        return {'shared_entries': entries, 'totals': totals, 'processes': processes}
@@ -91,6 +91,8 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'django.template.context_processors.media',
+                'categories.context_processors.category_tree',
+                'notifications.context_processors.unread_notifications',
             ],
         },
     },
@@ -110,6 +112,27 @@ DATABASES = {
 }
 
 
+# Cache
+# Per-process LRU in front of a SQLite file shared by every worker (olx_clone.cache)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'olx_clone.cache.TieredCache',
+        'LOCATION': BASE_DIR / 'cache.sqlite3',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+            'L1_MAX_ENTRIES': 2000,
+            'L1_TIMEOUT': 5,  # Seconds a worker may serve a value without re-reading it
+            'SYNC_INTERVAL': 0.5,  # Seconds between checks for keys changed by other workers
+            # Per-worker keys, never written to the shared file: page regeneration locks, view dedupe markers
+            'LOCAL_PREFIXES': ['pagecache:lock:', 'views:seen:'],
+            'LOCAL_MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -164,9 +187,11 @@ LOGIN_REDIRECT_URL = 'products:shop'
 LOGOUT_REDIRECT_URL = 'products:landing'
 
 # Session Settings
+SESSION_ENGINE = 'accounts.session_store'  # Cache first; django_session written on change
 SESSION_COOKIE_AGE = 604800  # 7 days in seconds (7 * 24 * 60 * 60)
 SESSION_SAVE_EVERY_REQUEST = True  # Update session expiry on every request
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False  # Session persists after browser closes
+SESSION_DB_WRITE_INTERVAL = 300  # Unchanged sessions refresh their database expiry at most this often
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -207,6 +232,26 @@ else:
 # Default from email (fallback)
 DEFAULT_FROM_EMAIL = os.environ.get('EMAIL_HOST_USER', 'noreply@studiswap.in')
 
+# Email outbox (notifications.outbox): delivered by a background worker after commit,
+# retried with doubling delays from EMAIL_OUTBOX_RETRY_DELAY seconds (set EMAIL_OUTBOX_SYNC to send inline)
+EMAIL_OUTBOX_SYNC = False
+EMAIL_OUTBOX_MAX_ATTEMPTS = 6
+EMAIL_OUTBOX_RETRY_DELAY = 30
+EMAIL_OUTBOX_POLL_INTERVAL = 30
+
+# Notification pipeline (notifications.pipeline): chat notifications and pushes are handled by a
+# background worker per process; overflow and failures go to the QueuedNotification table and are
+# retried with doubling delays from NOTIFICATION_QUEUE_RETRY_DELAY seconds (set NOTIFICATION_QUEUE_SYNC to handle inline)
+NOTIFICATION_QUEUE_SYNC = False
+NOTIFICATION_QUEUE_MAX_SIZE = 1000
+NOTIFICATION_QUEUE_MAX_ATTEMPTS = 5
+NOTIFICATION_QUEUE_RETRY_DELAY = 30
+NOTIFICATION_QUEUE_POLL_INTERVAL = 30
+
+# Unread notification counters are cached per user and moved on every change; this bounds
+# how long one that missed a change (e.g. a bulk update from the shell) can stay wrong
+NOTIFICATION_COUNT_TIMEOUT = 3600
+
 # OTP Configuration
 OTP_EXPIRY_MINUTES = 10  # OTP valid for 10 minutes
 OTP_LENGTH = 6  # 6-digit OTP
@@ -214,10 +259,54 @@ OTP_LENGTH = 6  # 6-digit OTP
 # Session Configuration
 SESSION_COOKIE_AGE = 604800  # 7 days in seconds (7 * 24 * 60 * 60)
 
+# Product image renditions: worker threads per process (set IMAGE_RENDITIONS_SYNC to build inline)
+IMAGE_RENDITION_WORKERS = int(os.environ.get('IMAGE_RENDITION_WORKERS', 2))
+IMAGE_RENDITIONS_SYNC = False
+
+# Related products are recomputed on a background thread (set RELATED_PRODUCTS_SYNC to run inline)
+RELATED_PRODUCTS_SYNC = False
+
+# Category tree is rebuilt when a category changes, or after this many seconds
+CATEGORY_TREE_TIMEOUT = 300
+
+# Search suggestions snapshot shared by all worker processes (suffixed per database);
+# edits are published from a background thread after this many seconds
+# (set SEARCH_SUGGEST_SYNC to load and publish inline)
+SEARCH_SUGGEST_SNAPSHOT = BASE_DIR / 'search_suggest.snapshot'
+SEARCH_SUGGEST_PUBLISH_DELAY = 2
+SEARCH_SUGGEST_SYNC = False
+
+# Typo-tolerant search: retried with corrected terms below this many hits,
+# spending at most this many milliseconds on the correction
+FUZZY_SEARCH_MIN_RESULTS = 3
+FUZZY_SEARCH_BUDGET_MS = 5
+
+# Search facet counts are cached per normalized query for this many seconds
+SEARCH_FACET_CACHE_TIMEOUT = 300
+
+# Anonymous page cache: pages are fresh for PAGE_CACHE_TIMEOUT seconds (0 disables it),
+# then served stale for up to PAGE_CACHE_STALE_TIMEOUT more while one request regenerates them
+PAGE_CACHE_TIMEOUT = 60
+PAGE_CACHE_STALE_TIMEOUT = 300
+
+# Cached product card fragments are re-keyed on every product change; this only
+# bounds how long a renamed category can show on old cards
+PRODUCT_CARD_CACHE_TIMEOUT = 3600
+
+# Product view counter: buffered hits are written back every N seconds (0 = write immediately)
+VIEW_COUNT_FLUSH_INTERVAL = int(os.environ.get('VIEW_COUNT_FLUSH_INTERVAL', 5))
+# Repeat views of a product by one visitor are counted once per this many seconds
+VIEW_COUNT_DEDUP_TIMEOUT = 6 * 60 * 60
+
 # Web Push Notification Configuration
 # Generate VAPID keys using: python manage.py generate_vapid_keys
 VAPID_PRIVATE_KEY = os.environ.get('VAPID_PRIVATE_KEY', '')
 VAPID_PUBLIC_KEY = os.environ.get('VAPID_PUBLIC_KEY', '')
 VAPID_ADMIN_EMAIL = os.environ.get('VAPID_ADMIN_EMAIL', 'mailto:studiswap@gmail.com')
+
+# Web Push delivery: devices pushed to at once per process, and seconds to wait on a push service
+WEBPUSH_MAX_WORKERS = 8
+WEBPUSH_TIMEOUT = 10
+
 SESSION_SAVE_EVERY_REQUEST = True  # Extend session on each request
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False  # Keep session even after closing browser
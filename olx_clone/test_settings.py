@@ -0,0 +1,13 @@
+"""
+Settings for the test suite:
+
+    python manage.py test --settings=olx_clone.test_settings
+"""
+from .settings import *  # noqa: F401,F403
+
+# A private in-memory cache, so tests neither read nor pollute the shared cache file
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
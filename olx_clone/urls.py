@@ -18,8 +18,11 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from . import views
 
 urlpatterns = [
+    path('admin/cache-stats/', views.cache_stats, name='cache_stats'),
+    path('admin/notification-queue/', views.notification_queue_stats, name='notification_queue_stats'),
     path('admin/', admin.site.urls),
     path('accounts/', include('accounts.urls')),
     path('categories/', include('categories.urls')),
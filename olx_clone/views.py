@@ -0,0 +1,18 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
+from django.http import JsonResponse
+from notifications import pipeline
+
+
+@staff_member_required
+def cache_stats(request):
+    """Hit, miss and eviction counters of the shared cache, per worker process"""
+    if not hasattr(cache, 'stats'):
+        return JsonResponse({'error': 'The configured cache backend keeps no statistics'}, status=404)
+    return JsonResponse(cache.stats())
+
+
+@staff_member_required
+def notification_queue_stats(request):
+    """Depth, lag and overflow counters of the notification pipeline in this worker process"""
+    return JsonResponse(pipeline.stats())
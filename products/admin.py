@@ -1,9 +1,10 @@
 from django.contrib import admin
-from .models import Product, ProductImage, Wishlist, Contact
+from .models import Product, ProductImage, Wishlist, Contact, SiteCounter
 
 class ProductImageInline(admin.TabularInline):
     model = ProductImage
     extra = 3
+    exclude = ['width', 'height', 'renditions']
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
@@ -36,9 +37,10 @@ class ProductAdmin(admin.ModelAdmin):
 
 @admin.register(ProductImage)
 class ProductImageAdmin(admin.ModelAdmin):
-    list_display = ['product', 'is_primary', 'created_at']
+    list_display = ['product', 'is_primary', 'width', 'height', 'created_at']
     list_filter = ['is_primary', 'created_at']
     list_editable = ['is_primary']
+    readonly_fields = ['width', 'height', 'renditions']
 
 @admin.register(Wishlist)
 class WishlistAdmin(admin.ModelAdmin):
@@ -53,3 +55,8 @@ class ContactAdmin(admin.ModelAdmin):
     search_fields = ['product__title', 'buyer__username', 'seller__username']
     list_editable = ['is_read']
     readonly_fields = ['created_at']
+
+@admin.register(SiteCounter)
+class SiteCounterAdmin(admin.ModelAdmin):
+    list_display = ['name', 'value', 'updated_at']
+    readonly_fields = ['updated_at']
@@ -0,0 +1,170 @@
+"""
+Facet counts for the search results page.
+
+All facets (category, condition, city and price band) are computed from a
+single GROUP BY over the products matching the text query and price range.
+Each facet's counts then come from summing those groups in Python while
+ignoring the facet's own selection, so picking "Electronics" still shows how
+many results the other categories hold. Results are cached per normalized
+query and dropped whenever a product changes.
+"""
+import hashlib
+import json
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, Value, When
+
+from .search import search_products, tokenize
+
+VERSION_KEY = 'products:facets:version'
+CACHE_KEY = 'products:facets:{}:{}'
+
+# (key, label, min price, max price). Both bounds are inclusive, like the
+# min_price/max_price search filters, so a band's refine URL lists exactly the
+# products it counted; prices have two decimal places.
+PRICE_BANDS = (
+    ('under_500', 'Under ₹500', None, Decimal('499.99')),
+    ('500_2000', '₹500 - ₹2,000', Decimal('500'), Decimal('1999.99')),
+    ('2000_10000', '₹2,000 - ₹10,000', Decimal('2000'), Decimal('9999.99')),
+    ('10000_50000', '₹10,000 - ₹50,000', Decimal('10000'), Decimal('49999.99')),
+    ('over_50000', 'Over ₹50,000', Decimal('50000'), None),
+)
+
+# Cities listed in the facet, most results first
+MAX_CITIES = 10
+
+
+def get_cache_timeout():
+    return getattr(settings, 'SEARCH_FACET_CACHE_TIMEOUT', 300)
+
+
+def normalize_filters(cleaned_data):
+    """Reduce a ProductSearchForm's cleaned_data to a canonical dict"""
+    category = cleaned_data.get('category')
+    min_price = cleaned_data.get('min_price')
+    max_price = cleaned_data.get('max_price')
+    return {
+        'query': ' '.join(tokenize(cleaned_data.get('query') or '')),
+        'category': category.pk if category else None,
+        'condition': cleaned_data.get('condition') or '',
+        'city': (cleaned_data.get('city') or '').strip().lower(),
+        'min_price': str(min_price) if min_price is not None else None,
+        'max_price': str(max_price) if max_price is not None else None,
+    }
+
+
+def _price_band_expression():
+    whens = []
+    for key, _, low, high in PRICE_BANDS:
+        bounds = {}
+        if low is not None:
+            bounds['price__gte'] = low
+        if high is not None:
+            bounds['price__lte'] = high
+        whens.append(When(then=Value(key), **bounds))
+    return Case(*whens, output_field=CharField())
+
+
+def _grouped_rows(filters):
+    """One query: result counts per (category, condition, city, price band)"""
+    from .models import Product
+
+    queryset = Product.objects.filter(status='active')
+
+    if filters['query']:
+        matching, _ = search_products(Product.objects.filter(status='active'), filters['query'])
+        queryset = queryset.filter(pk__in=matching.values('pk'))
+
+    if filters['min_price']:
+        queryset = queryset.filter(price__gte=filters['min_price'])
+    if filters['max_price']:
+        queryset = queryset.filter(price__lte=filters['max_price'])
+
+    return list(
+        queryset.order_by()
+        .annotate(price_band=_price_band_expression())
+        .values('category_id', 'condition', 'city', 'price_band')
+        .annotate(total=Count('id'))
+    )
+
+
+def _matches(row, filters, ignore):
+    """Whether a group passes every selected filter except ``ignore``"""
+    if ignore != 'category' and filters['category'] and row['category_id'] != filters['category']:
+        return False
+    if ignore != 'condition' and filters['condition'] and row['condition'] != filters['condition']:
+        return False
+    if ignore != 'city' and filters['city'] and filters['city'] not in (row['city'] or '').lower():
+        return False
+    return True
+
+
+def compute_facets(filters):
+    """Facet counts for normalized ``filters``, without touching the cache"""
+    rows = _grouped_rows(filters)
+
+    categories = defaultdict(int)
+    conditions = defaultdict(int)
+    price_bands = defaultdict(int)
+    cities = defaultdict(lambda: defaultdict(int))
+
+    for row in rows:
+        total = row['total']
+        if _matches(row, filters, 'category'):
+            categories[row['category_id']] += total
+        if _matches(row, filters, 'condition'):
+            conditions[row['condition']] += total
+        if _matches(row, filters, 'price_band') and row['price_band']:
+            price_bands[row['price_band']] += total
+        if _matches(row, filters, 'city') and row['city']:
+            # Group "Pune" and "pune " together under the most common spelling
+            name = row['city'].strip()
+            cities[name.lower()][name] += total
+
+    top_cities = sorted(
+        ((max(spellings, key=spellings.get), sum(spellings.values())) for spellings in cities.values()),
+        key=lambda item: (-item[1], item[0])
+    )[:MAX_CITIES]
+
+    return {
+        'category': dict(categories),
+        'condition': dict(conditions),
+        'city': [{'name': name, 'count': count} for name, count in top_cities],
+        'price_band': [
+            {'key': key, 'label': label, 'min': low, 'max': high, 'count': price_bands[key]}
+            for key, label, low, high in PRICE_BANDS
+            if price_bands.get(key)
+        ],
+    }
+
+
+def _cache_key(filters):
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(VERSION_KEY, version, None)
+    digest = hashlib.md5(json.dumps(filters, sort_keys=True).encode()).hexdigest()
+    return CACHE_KEY.format(version, digest)
+
+
+def get_facets(cleaned_data):
+    """Facet counts for a search, served from cache when possible"""
+    filters = normalize_filters(cleaned_data)
+    cache_key = _cache_key(filters)
+
+    facets = cache.get(cache_key)
+    if facets is None:
+        facets = compute_facets(filters)
+        cache.set(cache_key, facets, get_cache_timeout())
+    return facets
+
+
+def invalidate():
+    """Orphan every cached facet set, e.g. after a product changes"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 1, None)
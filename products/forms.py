@@ -1,6 +1,8 @@
 from django import forms
+from django.urls import reverse_lazy
 from .models import Product, ProductImage, Contact
 from categories.models import Category
+from categories.tree import get_tree
 
 class ProductForm(forms.ModelForm):
     class Meta:
@@ -19,6 +21,8 @@ class ProductForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['category'].queryset = Category.objects.filter(is_active=True)
+        # Render options from the cached tree; the queryset is only hit to validate a submission
+        self.fields['category'].choices = [('', self.fields['category'].empty_label)] + get_tree().choices()
         
         # Add CSS classes to form fields
         for field in self.fields.values():
@@ -30,7 +34,9 @@ class ProductSearchForm(forms.Form):
         required=False,
         widget=forms.TextInput(attrs={
             'placeholder': 'Search products...',
-            'class': 'form-control'
+            'class': 'form-control',
+            'autocomplete': 'off',
+            'data-suggest-url': reverse_lazy('products:search_suggest'),
         })
     )
     category = forms.ModelChoiceField(
@@ -74,7 +80,8 @@ class ProductSearchForm(forms.Form):
     )
     sort_by = forms.ChoiceField(
         choices=[
-            ('', 'Most Recent'),
+            ('', 'Best Match'),
+            ('newest', 'Most Recent'),
             ('price_low', 'Price: Low to High'),
             ('price_high', 'Price: High to Low'),
             ('title_asc', 'Title: A to Z'),
@@ -84,4 +91,24 @@ class ProductSearchForm(forms.Form):
         widget=forms.Select(attrs={'class': 'form-select'})
     )
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.set_category_choices()
 
+    def set_category_choices(self, label=None):
+        """Fill the category options from the cached tree instead of a query"""
+        field = self.fields['category']
+        field.choices = [('', field.empty_label)] + get_tree().choices(label)
+
+    def apply_facets(self, facets):
+        """Show result counts next to category and condition options"""
+        category_counts = facets['category']
+        self.set_category_choices(
+            lambda category: f'{category.name} ({category_counts.get(category.pk, 0)})'
+        )
+
+        condition_counts = facets['condition']
+        self.fields['condition'].choices = [('', 'All Conditions')] + [
+            (value, f'{label} ({condition_counts.get(value, 0)})')
+            for value, label in Product.CONDITION_CHOICES
+        ]
@@ -0,0 +1,189 @@
+"""
+Typo-tolerant fallback for product search.
+
+When a text query finds too few products, each query term that matches
+nothing in the catalogue vocabulary is looked up in a trigram index over
+the words of active product titles and brands. The candidates are checked
+with an edit distance that gives up once it exceeds the allowed number of
+typos, and the closest, most common one replaces the term, so "cassio
+calculas" is searched as "casio calculus".
+
+The vocabulary comes from the in-memory suggestion index, so building it
+costs no queries, and it is built off the request path: searches skip the
+correction until the first build is ready. Every lookup runs against a
+deadline (FUZZY_SEARCH_BUDGET_MS) and keeps whatever it has found when time
+runs out.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+from . import suggest
+from .search import tokenize
+
+# Shortest query term we try to correct; short words have too many neighbours
+MIN_TERM_LENGTH = 4
+
+# Candidates checked with the edit distance, best trigram overlap first
+MAX_CANDIDATES = 30
+
+# Trigrams shared by more words than this are skipped once others matched
+MAX_POSTINGS = 1000
+
+_matcher = None
+_matcher_source = None
+_building = False
+_lock = threading.Lock()
+
+
+def get_budget():
+    """Seconds a single query correction may take"""
+    return getattr(settings, 'FUZZY_SEARCH_BUDGET_MS', 5) / 1000
+
+
+def get_min_results():
+    """Below this many hits the fuzzy fallback kicks in"""
+    return getattr(settings, 'FUZZY_SEARCH_MIN_RESULTS', 3)
+
+
+def max_distance(term):
+    return 1 if len(term) <= 5 else 2
+
+
+def trigrams(term):
+    padded = f'  {term} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def bounded_levenshtein(a, b, limit):
+    """Edit distance between ``a`` and ``b``, or ``limit + 1`` once it is exceeded"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i] + [0] * len(b)
+        for j, char_b in enumerate(b, start=1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            )
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class FuzzyMatcher:
+    """Trigram index over catalogue words, weighted by how many listings use them"""
+
+    def __init__(self, frequencies):
+        self.frequencies = frequencies
+        self.sorted_terms = sorted(frequencies)
+        self.index = defaultdict(list)
+        for term in frequencies:
+            # Words shorter than this are too far from any term we correct
+            if len(term) >= MIN_TERM_LENGTH - 1:
+                for gram in trigrams(term):
+                    self.index[gram].append(term)
+
+    @classmethod
+    def from_suggest_index(cls, index):
+        frequencies = Counter()
+        for title, slug, brand, category_id, views in index.products.values():
+            # Every word counts, not just the first MAX_TERMS of a long title
+            frequencies.update(set(tokenize(f'{title} {brand}', limit=None)))
+        return cls(frequencies)
+
+    def is_known(self, term):
+        """True if ``term`` is a word, or a prefix of a word, in the catalogue"""
+        position = bisect_left(self.sorted_terms, term)
+        return position < len(self.sorted_terms) and self.sorted_terms[position].startswith(term)
+
+    def correct(self, term, deadline):
+        """Closest catalogue word within the typo limit, or None"""
+        limit = max_distance(term)
+        overlap = Counter()
+        # Rarest trigrams first; very common ones say little and cost the most
+        for gram in sorted(trigrams(term), key=lambda gram: len(self.index.get(gram, ()))):
+            postings = self.index.get(gram, ())
+            if time.perf_counter() > deadline or (overlap and len(postings) > MAX_POSTINGS):
+                break
+            overlap.update(postings)
+
+        best = None
+        for candidate, _ in overlap.most_common(MAX_CANDIDATES):
+            if time.perf_counter() > deadline:
+                break
+            distance = bounded_levenshtein(term, candidate, limit)
+            if distance > limit:
+                continue
+            rank = (distance, -self.frequencies[candidate], candidate)
+            if best is None or rank < best:
+                best = rank
+        return best[2] if best else None
+
+
+def _build(index):
+    global _matcher, _matcher_source, _building
+
+    try:
+        matcher = FuzzyMatcher.from_suggest_index(index)
+        with _lock:
+            _matcher, _matcher_source = matcher, (index, index.revision)
+    except Exception as e:
+        print(f"Error building fuzzy search index: {e}")
+    finally:
+        _building = False
+
+
+def get_matcher():
+    """
+    The matcher for the current catalogue, or None before the first one is
+    ready. Matchers are built on a background thread (inline with
+    SEARCH_SUGGEST_SYNC); a stale one keeps serving meanwhile.
+    """
+    global _building
+
+    index = suggest.get_index()
+    if index is None:
+        return None
+    if _matcher_source == (index, index.revision):
+        return _matcher
+
+    if getattr(settings, 'SEARCH_SUGGEST_SYNC', False):
+        _build(index)
+        return _matcher
+
+    with _lock:
+        if _building:
+            return _matcher
+        _building = True
+    threading.Thread(target=_build, args=(index,), name='fuzzy-search-index', daemon=True).start()
+    return _matcher
+
+
+def correct_query(query):
+    """
+    Return ``query`` with unknown terms replaced by their closest catalogue
+    words, or None when nothing could be corrected within the time budget.
+    """
+    matcher = get_matcher()
+    if matcher is None:
+        return None
+
+    deadline = time.perf_counter() + get_budget()
+
+    corrected, changed = [], False
+    for term in tokenize(query):
+        replacement = None
+        if len(term) >= MIN_TERM_LENGTH and not term.isdigit() and not matcher.is_known(term):
+            replacement = matcher.correct(term, deadline)
+        corrected.append(replacement or term)
+        changed = changed or replacement is not None
+
+    return ' '.join(corrected) if changed else None
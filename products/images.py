@@ -0,0 +1,158 @@
+"""
+Derivative images for product photos.
+
+Every uploaded ProductImage gets card, gallery and zoom renditions in WebP
+and JPEG, with EXIF stripped and orientation applied. Work runs in a small
+thread pool after the upload transaction commits; until it finishes the
+templates keep serving the original file.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import page_cache
+
+# Bounding boxes; images are scaled down to fit, never up
+RENDITION_SIZES = {
+    'card': (400, 300),
+    'gallery': (1024, 768),
+    'zoom': (2048, 1536),
+}
+
+# Next size up, used as the 2x candidate in srcset
+HIGH_DENSITY = {
+    'card': 'gallery',
+    'gallery': 'zoom',
+}
+
+FORMATS = (
+    ('webp', 'WEBP'),
+    ('jpg', 'JPEG'),
+)
+
+QUALITY = 80
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'IMAGE_RENDITION_WORKERS', 2),
+                thread_name_prefix='image-renditions'
+            )
+    return _executor
+
+
+def needs_renditions(product_image):
+    return bool(product_image.image) and product_image.renditions.get('source') != product_image.image.name
+
+
+def _to_rgb(image):
+    """Flatten transparency onto white; JPEG has no alpha channel"""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def rendition_name(product_image, size, extension):
+    return f'products/renditions/{product_image.pk}/{size}.{extension}'
+
+
+def generate_renditions(product_image):
+    """Build every rendition for ``product_image`` and record them on the row"""
+    from .models import Product, ProductImage
+
+    source = product_image.image.name
+
+    with product_image.image.open('rb') as image_file:
+        with Image.open(image_file) as original:
+            # exif_transpose bakes in the rotation; re-encoding drops the EXIF block
+            oriented = ImageOps.exif_transpose(original)
+            width, height = oriented.size
+            rgb = _to_rgb(oriented)
+
+    renditions = {'source': source}
+    for size, bounds in RENDITION_SIZES.items():
+        resized = rgb.copy()
+        resized.thumbnail(bounds, Image.LANCZOS)
+        entry = {'width': resized.width, 'height': resized.height}
+
+        for extension, pil_format in FORMATS:
+            buffer = BytesIO()
+            resized.save(buffer, pil_format, quality=QUALITY, optimize=True)
+
+            name = rendition_name(product_image, size, extension)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            entry[extension] = default_storage.save(name, ContentFile(buffer.getvalue()))
+
+        renditions[size] = entry
+
+    # update() so saving the results doesn't re-trigger the pipeline
+    updated = ProductImage.objects.filter(pk=product_image.pk, image=source).update(
+        width=width,
+        height=height,
+        renditions=renditions
+    )
+    if updated:
+        # Re-key the product's cached cards so they pick up the srcset; update()
+        # sends no post_save, so the pages showing them are purged here
+        Product.objects.filter(pk=product_image.product_id).update(updated_at=timezone.now())
+        tag = page_cache.product_tag(product_image.product_id)
+        transaction.on_commit(lambda: page_cache.purge(tag, page_cache.FEED))
+    product_image.width, product_image.height = width, height
+    product_image.renditions = renditions
+    return renditions
+
+
+def _process(product_image_id):
+    from .models import ProductImage
+
+    try:
+        product_image = ProductImage.objects.filter(pk=product_image_id).first()
+        if product_image and needs_renditions(product_image):
+            generate_renditions(product_image)
+    except Exception as e:
+        print(f"Error generating renditions for image {product_image_id}: {e}")
+    finally:
+        close_old_connections()
+
+
+def schedule_renditions(product_image_id):
+    """Queue rendition generation on the worker pool"""
+    if getattr(settings, 'IMAGE_RENDITIONS_SYNC', False):
+        _process(product_image_id)
+    else:
+        _get_executor().submit(_process, product_image_id)
+
+
+def delete_renditions(product_image):
+    for size in RENDITION_SIZES:
+        entry = product_image.renditions.get(size) or {}
+        for extension, _ in FORMATS:
+            name = entry.get(extension)
+            if name and default_storage.exists(name):
+                default_storage.delete(name)
+
+
+def get_rendition_url(product_image, size, extension='jpg'):
+    """URL of a rendition, or of the original upload while it is pending"""
+    entry = product_image.renditions.get(size)
+    if entry and entry.get(extension):
+        return default_storage.url(entry[extension])
+    return product_image.image.url
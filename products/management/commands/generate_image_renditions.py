@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from products.images import generate_renditions, needs_renditions
+from products.models import ProductImage
+
+
+class Command(BaseCommand):
+    help = 'Generate card/gallery/zoom renditions for product images that lack them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate existing renditions too')
+
+    def handle(self, *args, **options):
+        count = 0
+
+        for product_image in ProductImage.objects.iterator():
+            if not options['force'] and not needs_renditions(product_image):
+                continue
+            try:
+                generate_renditions(product_image)
+                count += 1
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Image {product_image.id}: {e}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Generated renditions for {count} images'))
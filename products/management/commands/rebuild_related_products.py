@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from products import similarity
+
+
+class Command(BaseCommand):
+    help = 'Recompute the related-products table for every active product'
+
+    def handle(self, *args, **kwargs):
+        count = similarity.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f'Stored {count} related-product pairs'))
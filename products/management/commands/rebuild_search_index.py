@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from products import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product full-text search index'
+
+    def handle(self, *args, **kwargs):
+        backend = search.get_backend()
+
+        if backend != 'fts5':
+            self.stdout.write(self.style.WARNING(
+                f'Nothing to rebuild for backend: {backend or "none"}'
+            ))
+            return
+
+        count = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} products'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from products import suggest
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search suggestion index and its shared snapshot'
+
+    def handle(self, *args, **kwargs):
+        index = suggest.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(index.products)} products and {len(index.categories)} categories '
+            f'({len(index.entries)} prefix entries)'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from products.models import SiteCounter
+
+
+class Command(BaseCommand):
+    help = 'Recompute the landing page statistics from the database (run periodically, e.g. from cron)'
+
+    def handle(self, *args, **kwargs):
+        totals = SiteCounter.reconcile()
+
+        for name, value in totals.items():
+            self.stdout.write(f'{name}: {value}')
+
+        self.stdout.write(self.style.SUCCESS('Site statistics reconciled'))
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:00
+
+from django.db import migrations
+
+
+POSTGRES_SEARCH_INDEX = """
+CREATE INDEX IF NOT EXISTS products_product_search_idx ON products_product USING GIN ((
+    setweight(to_tsvector('simple'::regconfig, COALESCE(("title")::text, '')), 'A') ||
+    setweight(to_tsvector('simple'::regconfig, COALESCE(("brand")::text, '')), 'B') ||
+    setweight(to_tsvector('simple'::regconfig, COALESCE(("model")::text, '')), 'B') ||
+    setweight(to_tsvector('simple'::regconfig, COALESCE(("description")::text, '')), 'C')
+))
+"""
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS products_product_fts USING fts5("
+            "title, description, brand, model, "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO products_product_fts (rowid, title, description, brand, model) "
+            "SELECT id, title, description, brand, model FROM products_product"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_SEARCH_INDEX)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS products_product_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS products_product_search_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
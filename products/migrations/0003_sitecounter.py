@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:45
+
+from django.db import migrations, models
+
+
+def seed_counters(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    SiteCounter = apps.get_model('products', 'SiteCounter')
+    User = apps.get_model('auth', 'User')
+
+    SiteCounter.objects.bulk_create([
+        SiteCounter(name='active_products', value=Product.objects.filter(status='active').count()),
+        SiteCounter(name='sold_products', value=Product.objects.filter(status='sold').count()),
+        SiteCounter(name='active_users', value=User.objects.filter(is_active=True).count()),
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('products', '0002_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
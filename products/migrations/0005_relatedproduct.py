@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_productimage_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='products.product')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbour_of', to='products.product')),
+            ],
+            options={
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['product', '-score'], name='products_re_product_ebcd12_idx')],
+                'unique_together': {('product', 'related')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_updated_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['status', 'title', 'id'], name='product_status_title_idx'),
+        ),
+    ]
@@ -1,9 +1,27 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.text import slugify
 from categories.models import Category
 
+class ProductQuerySet(models.QuerySet):
+    def with_primary_image(self):
+        """Attach the primary image path and renditions in the same query"""
+        images = ProductImage.objects.filter(
+            product=OuterRef('pk')
+        ).order_by(*ProductImage._meta.ordering)
+        return self.annotate(
+            primary_image_path=Subquery(images.values('image')[:1]),
+            primary_image_renditions=Subquery(
+                images.values('renditions')[:1],
+                output_field=models.JSONField()
+            ),
+        )
+
+
 class Product(models.Model):
     CONDITION_CHOICES = [
         ('new', 'New'),
@@ -25,7 +43,8 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     condition = models.CharField(max_length=20, choices=CONDITION_CHOICES, default='good')
-    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='products')
+    # Indexed through the (seller, ...) composites below
+    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='products', db_index=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     
     # Location fields
@@ -45,14 +64,25 @@ class Product(models.Model):
     
     # SEO fields
     views_count = models.PositiveIntegerField(default=0)
+
+    objects = ProductQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
+        # Listing queries filter on status (or seller) and sort by a keyset ending
+        # in id, so the composites end in id too; checked against EXPLAIN QUERY
+        # PLAN in products/tests.py
         indexes = [
             models.Index(fields=['-created_at']),
-            models.Index(fields=['status']),
-            models.Index(fields=['category']),
             models.Index(fields=['city']),
+            models.Index(fields=['status', '-created_at', '-id'], name='product_status_recent_idx'),
+            models.Index(fields=['status', 'category', '-created_at', '-id'], name='product_status_cat_recent_idx'),
+            models.Index(fields=['status', 'price', 'id'], name='product_status_price_idx'),
+            models.Index(fields=['status', 'title', 'id'], name='product_status_title_idx'),
+            models.Index(fields=['seller', 'status', '-created_at', '-id'], name='product_seller_status_idx'),
+            models.Index(fields=['seller', '-created_at', '-id'], name='product_seller_recent_idx'),
+            # Lets each process's similarity index pick up edits made elsewhere
+            models.Index(fields=['updated_at'], name='product_updated_idx'),
         ]
 
     def __str__(self):
@@ -61,19 +91,44 @@ class Product(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'updated_at' not in update_fields:
+            # updated_at keys the cached product cards, so partial saves bump it too
+            kwargs['update_fields'] = {*update_fields, 'updated_at'}
+        # Counter updates in post_save commit or roll back with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def get_absolute_url(self):
         return reverse('products:product_detail', kwargs={'slug': self.slug})
 
+    @cached_property
+    def primary_image(self):
+        if hasattr(self, 'primary_image_path'):
+            # Annotated by ProductQuerySet.with_primary_image(): no extra query
+            if not self.primary_image_path:
+                return None
+            return ProductImage(
+                product=self,
+                image=self.primary_image_path,
+                renditions=self.primary_image_renditions or {}
+            )
+        return self.images.first()
+
     @property
     def main_image(self):
-        image = self.images.first()
+        image = self.primary_image
         return image.image.url if image else None
 
+    @property
+    def live_views_count(self):
+        """Stored view count plus hits still buffered in this process"""
+        from . import view_counter
+        return self.views_count + view_counter.pending(self.pk)
+
     def increment_views(self):
-        self.views_count += 1
-        self.save(update_fields=['views_count'])
+        from . import view_counter
+        view_counter.add(self.pk)
 
 
 class ProductImage(models.Model):
@@ -83,8 +138,19 @@ class ProductImage(models.Model):
     is_primary = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Filled in by products.images once the derivatives are ready
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    renditions = models.JSONField(default=dict, blank=True)
+
     class Meta:
+        # The first image in this order is the product's primary image, both
+        # for Product.primary_image and ProductQuerySet.with_primary_image()
         ordering = ['-is_primary', 'created_at']
+        indexes = [
+            # Serves the per-card primary image lookup in with_primary_image()
+            models.Index(fields=['product', '-is_primary', 'created_at'], name='productimage_primary_idx'),
+        ]
 
     def __str__(self):
         return f"Image for {self.product.title}"
@@ -123,3 +189,57 @@ class Contact(models.Model):
 
     def __str__(self):
         return f"Contact for {self.product.title} from {self.buyer.username}"
+
+
+class SiteCounter(models.Model):
+    """Precomputed site-wide totals so the landing page needs no COUNT queries"""
+    ACTIVE_PRODUCTS = 'active_products'
+    ACTIVE_USERS = 'active_users'
+    SOLD_PRODUCTS = 'sold_products'
+
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+    @classmethod
+    def increment(cls, name, delta=1):
+        """Atomically adjust a counter; missing rows are created by reconcile_site_stats"""
+        if delta:
+            cls.objects.filter(name=name).update(value=F('value') + delta, updated_at=timezone.now())
+
+    @classmethod
+    def get_values(cls):
+        """All counters as a dict, in one query"""
+        return dict(cls.objects.values_list('name', 'value'))
+
+    @classmethod
+    def reconcile(cls):
+        """Recompute every counter from the source tables"""
+        totals = {
+            cls.ACTIVE_PRODUCTS: Product.objects.filter(status='active').count(),
+            cls.SOLD_PRODUCTS: Product.objects.filter(status='sold').count(),
+            cls.ACTIVE_USERS: User.objects.filter(is_active=True).count(),
+        }
+        for name, value in totals.items():
+            cls.objects.update_or_create(name=name, defaults={'value': value})
+        return totals
+
+
+class RelatedProduct(models.Model):
+    """Precomputed nearest neighbours of a product, maintained by products.similarity"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='neighbour_of')
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['-score']
+        unique_together = ['product', 'related']
+        indexes = [
+            models.Index(fields=['product', '-score']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.score:.3f})"
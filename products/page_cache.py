@@ -0,0 +1,197 @@
+"""
+Full-page cache for anonymous visitors.
+
+Logged-out GET requests to the landing, shop, category and product pages are
+served from the cache, keyed on host, path, query string and whether the
+request is a "load more" XHR. Each stored page carries the versions of the
+tags it was rendered under:
+
+* ``categories``: every page, since the navbar lists the category tree
+* ``feed``: pages listing products (landing, shop, category pages)
+* ``product:<id>``: a product page and every product card it shows
+
+Purging a tag just bumps its version, so all pages rendered under the old one
+become stale at once. Every purge also bumps a global counter, and a page
+rendered while it moved is not stored: its product tags are only known once
+the render has read the products, too late to tell whether a purge landed in
+between. Stale and expired pages are kept for a grace period
+(PAGE_CACHE_STALE_TIMEOUT): the first request to find one takes a short lock
+and renders the page again while concurrent requests keep getting the stale
+copy, so an expiry never sends every worker to the database at the same time.
+The lock is a plain cache key; with the default settings it stays in the
+worker's memory (the cache's LOCAL_PREFIXES), so each worker regenerates a
+stale page at most once without a shared-store write per attempt.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+CATEGORIES = 'categories'
+FEED = 'feed'
+# Pseudo-tag bumped by every purge; never stored with a page
+PURGES = '*'
+
+TAG_KEY = 'pagecache:tag:{}'
+PAGE_KEY = 'pagecache:page:{}'
+LOCK_KEY = 'pagecache:lock:{}'
+
+# Seconds one request may spend regenerating a page before another may try
+LOCK_TIMEOUT = 30
+
+
+def get_timeout():
+    """Seconds a cached page is served as fresh (0 disables the cache)"""
+    return getattr(settings, 'PAGE_CACHE_TIMEOUT', 60)
+
+
+def get_stale_timeout():
+    """Seconds past expiry a page may still be served while it is regenerated"""
+    return getattr(settings, 'PAGE_CACHE_STALE_TIMEOUT', 300)
+
+
+def product_tag(product_id):
+    return f'product:{product_id}'
+
+
+def purge(*tags):
+    """Mark every page rendered under any of ``tags`` as stale"""
+    for tag in (*tags, PURGES):
+        key = TAG_KEY.format(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, None)
+
+
+def _tag_versions(tags):
+    keys = {tag: TAG_KEY.format(tag) for tag in tags}
+    found = cache.get_many(keys.values())
+    return {tag: found.get(key, 0) for tag, key in keys.items()}
+
+
+def _has_pending_messages(request):
+    # Flash messages are per visitor and consumed by the render
+    return 'messages' in request.COOKIES or '_messages' in request.session
+
+
+def is_cacheable(request):
+    return (
+        get_timeout() > 0
+        and request.method == 'GET'
+        and not request.user.is_authenticated
+        and not _has_pending_messages(request)
+    )
+
+
+def page_key(request):
+    is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+    url = f'{request.get_host()}{request.get_full_path()}|{int(is_ajax)}'
+    return hashlib.md5(url.encode()).hexdigest()
+
+
+def lookup(key):
+    """(entry, fresh) for a stored page, or (None, False)"""
+    entry = cache.get(PAGE_KEY.format(key))
+    if entry is None:
+        return None, False
+
+    fresh = entry['expires'] > time.time() and _tag_versions(entry['tags']) == entry['tags']
+    return entry, fresh
+
+
+def purge_count():
+    """Read before rendering a page and handed to store()"""
+    return cache.get(TAG_KEY.format(PURGES), 0)
+
+
+def store(key, response, tags, purges, extra=None):
+    """
+    Save a rendered page under its tags' current versions, unless anything
+    was purged since ``purges`` was read: the page may then show data from
+    before the purge. Returns True if stored.
+    """
+    current = _tag_versions(set(tags) | {CATEGORIES, PURGES})
+    if current.pop(PURGES) != purges:
+        return False
+
+    timeout = get_timeout()
+    entry = {
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'tags': current,
+        'expires': time.time() + timeout,
+        'extra': extra or {},
+    }
+    cache.set(PAGE_KEY.format(key), entry, timeout + get_stale_timeout())
+    return True
+
+
+def acquire(key):
+    """True for the one request allowed to regenerate a stale page"""
+    return cache.add(LOCK_KEY.format(key), 1, LOCK_TIMEOUT)
+
+
+def release(key):
+    cache.delete(LOCK_KEY.format(key))
+
+
+def build_response(entry, state):
+    response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    response['X-Page-Cache'] = state
+    return response
+
+
+class AnonymousPageCacheMixin:
+    """
+    Serve anonymous GETs of a template view from the page cache.
+
+    Views add to ``page_cache_tags`` while building their context; the feed
+    tag is included for listing pages via ``page_cache_feed``.
+    """
+    page_cache_feed = True
+
+    def dispatch(self, request, *args, **kwargs):
+        self.page_cache_tags = {FEED} if self.page_cache_feed else set()
+        self.page_cache_extra = {}
+        if not is_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        key = page_key(request)
+        entry, fresh = lookup(key)
+        # Only a stale page needs the lock; with nothing to serve, everyone renders
+        locked = entry is not None and not fresh and acquire(key)
+        if entry is not None and not locked:
+            self.page_cache_hit(entry)
+            return build_response(entry, 'HIT' if fresh else 'STALE')
+
+        purges = purge_count()
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+        except Exception:
+            if locked:
+                release(key)
+            raise
+
+        if response.status_code != 200 or not hasattr(response, 'add_post_render_callback'):
+            if locked:
+                release(key)
+            return response
+
+        def save(rendered):
+            try:
+                store(key, rendered, self.page_cache_tags, purges, self.page_cache_extra)
+            except Exception as e:
+                print(f"Error caching page {request.path}: {e}")
+            finally:
+                if locked:
+                    release(key)
+
+        response.add_post_render_callback(save)
+        response['X-Page-Cache'] = 'MISS'
+        return response
+
+    def page_cache_hit(self, entry):
+        """Per-request work that must still happen when a cached page is served"""
@@ -0,0 +1,176 @@
+"""
+Keyset (cursor) pagination for product lists.
+
+Instead of OFFSET/LIMIT plus a COUNT(*), each page is fetched with a WHERE
+clause on the sort key of the last row seen, so deep pages cost the same as
+the first one. Cursors are signed, opaque tokens carrying the direction and
+the sort-key values of the boundary row.
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from django.core import signing
+from django.db.models import Q
+from django.http import Http404, JsonResponse
+from django.template.loader import render_to_string
+
+CURSOR_SALT = 'products.pagination.cursor'
+
+
+class CursorPage:
+    """A slice of results plus the cursors needed to move either way"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def _serialize(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(direction, obj, ordering):
+    values = [_serialize(getattr(obj, field.lstrip('-'))) for field in ordering]
+    return signing.dumps({'d': direction, 'v': values}, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor, ordering):
+    """Return (direction, values); raises Http404 for tampered or stale tokens"""
+    try:
+        data = signing.loads(cursor, salt=CURSOR_SALT)
+        direction, values = data['d'], data['v']
+    except (signing.BadSignature, KeyError, TypeError):
+        raise Http404('Invalid cursor')
+
+    if direction not in ('next', 'prev') or len(values) != len(ordering):
+        raise Http404('Invalid cursor')
+    return direction, values
+
+
+def _keyset_filter(ordering, values, direction):
+    """
+    Rows strictly after ``values`` in ``ordering``, e.g. for (-created_at, -id):
+    created_at < v0 OR (created_at = v0 AND id < v1)
+    """
+    condition = Q()
+    equal_so_far = {}
+
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        descending = field.startswith('-')
+        if direction == 'prev':
+            descending = not descending
+        lookup = f'{name}__lt' if descending else f'{name}__gt'
+
+        condition |= Q(**equal_so_far, **{lookup: value})
+        equal_so_far[name] = value
+
+    return condition
+
+
+def _reverse(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+def paginate_by_cursor(queryset, ordering, page_size, cursor=None):
+    """
+    Fetch one page of ``queryset`` ordered by ``ordering``, which must end in
+    a unique column (normally ``id``) so the sort key is a total order.
+    """
+    direction, values = decode_cursor(cursor, ordering) if cursor else ('next', None)
+
+    if direction == 'prev':
+        queryset = queryset.order_by(*_reverse(ordering))
+    else:
+        queryset = queryset.order_by(*ordering)
+
+    if values is not None:
+        queryset = queryset.filter(_keyset_filter(ordering, values, direction))
+
+    rows = list(queryset[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if direction == 'prev':
+        rows.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, values is not None
+
+    return CursorPage(
+        rows,
+        next_cursor=encode_cursor('next', rows[-1], ordering) if rows and has_next else None,
+        previous_cursor=encode_cursor('prev', rows[0], ordering) if rows and has_previous else None,
+    )
+
+
+class CursorPaginationMixin:
+    """
+    Opt-in keyset pagination for a ListView.
+
+    Views return their sort key from get_cursor_ordering(); returning None (or
+    a legacy ``?page=N`` link) keeps Django's offset pagination. AJAX requests
+    get back only the rendered cards of the next slice, for "Load more".
+    """
+    cursor_query_param = 'cursor'
+    cursor_fragment_template = None
+    cursor_page = None
+
+    def get_cursor_ordering(self):
+        return None
+
+    def paginate_queryset(self, queryset, page_size):
+        ordering = self.get_cursor_ordering()
+        if not ordering or self.page_kwarg in self.request.GET:
+            return super().paginate_queryset(queryset, page_size)
+
+        self.cursor_page = paginate_by_cursor(
+            queryset, ordering, page_size,
+            cursor=self.request.GET.get(self.cursor_query_param)
+        )
+        return (None, self.cursor_page, self.cursor_page.object_list, False)
+
+    def get_cursor_url(self, cursor):
+        if cursor is None:
+            return None
+        params = self.request.GET.copy()
+        params.pop(self.page_kwarg, None)
+        params[self.cursor_query_param] = cursor
+        return f'?{params.urlencode()}'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if self.cursor_page is not None:
+            context['cursor_page'] = self.cursor_page
+            context['next_page_url'] = self.get_cursor_url(self.cursor_page.next_cursor)
+            context['previous_page_url'] = self.get_cursor_url(self.cursor_page.previous_cursor)
+        return context
+
+    def render_to_response(self, context, **response_kwargs):
+        is_ajax = self.request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+        if is_ajax and self.cursor_page is not None and self.cursor_fragment_template:
+            return JsonResponse({
+                'html': render_to_string(self.cursor_fragment_template, context, request=self.request),
+                'next_url': context['next_page_url'],
+            })
+        return super().render_to_response(context, **response_kwargs)
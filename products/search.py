@@ -0,0 +1,146 @@
+"""
+Full-text search index for products.
+
+On SQLite the index is an FTS5 virtual table (``products_product_fts``) whose
+rowid is the product id, ranked with bm25(). On PostgreSQL the same columns
+are matched through a weighted tsvector expression backed by a GIN index and
+ranked with ts_rank_cd. Any other backend falls back to the icontains scan.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+FTS_TABLE = 'products_product_fts'
+INDEXED_FIELDS = ('title', 'description', 'brand', 'model')
+
+# bm25() column weights, in INDEXED_FIELDS order
+BM25_WEIGHTS = (10.0, 1.0, 5.0, 5.0)
+
+# Longest query we turn into a MATCH expression
+MAX_TERMS = 8
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_fts_available = None
+
+
+def get_backend():
+    """Return 'fts5', 'postgres' or None for the default connection"""
+    global _fts_available
+
+    if connection.vendor == 'postgresql':
+        return 'postgres'
+    if connection.vendor != 'sqlite':
+        return None
+
+    if _fts_available is None:
+        _fts_available = FTS_TABLE in connection.introspection.table_names()
+    return 'fts5' if _fts_available else None
+
+
+def tokenize(query, limit=MAX_TERMS):
+    """Split a user query into lowercase search terms, keeping the first ``limit`` (None for all)"""
+    return TOKEN_RE.findall(query.lower())[:limit]
+
+
+def build_match_expression(terms):
+    """Every term must match, each as a prefix: '"calc"* "casio"*'"""
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def index_product(product):
+    """Insert or refresh a product's row in the FTS5 table"""
+    if get_backend() != 'fts5':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description, brand, model) '
+            f'VALUES (%s, %s, %s, %s, %s)',
+            [product.pk] + [getattr(product, field) or '' for field in INDEXED_FIELDS]
+        )
+
+
+def unindex_product(product_id):
+    """Remove a product from the FTS5 table"""
+    if get_backend() != 'fts5':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product_id])
+
+
+def rebuild_index():
+    """Repopulate the FTS5 table from products_product"""
+    if get_backend() != 'fts5':
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description, brand, model) '
+            f'SELECT id, title, description, brand, model FROM products_product'
+        )
+        return cursor.rowcount
+
+
+def _postgres_vector():
+    from django.contrib.postgres.search import SearchVector
+
+    return (
+        SearchVector('title', weight='A', config='simple') +
+        SearchVector('brand', weight='B', config='simple') +
+        SearchVector('model', weight='B', config='simple') +
+        SearchVector('description', weight='C', config='simple')
+    )
+
+
+def search_products(queryset, query):
+    """
+    Restrict a Product queryset to rows matching ``query``.
+
+    Returns ``(queryset, ranked)``. When ``ranked`` is True the queryset is
+    annotated with ``search_rank`` where lower values are better matches.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return queryset, False
+
+    backend = get_backend()
+
+    if backend == 'fts5':
+        weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+        queryset = queryset.extra(
+            tables=[FTS_TABLE],
+            where=[
+                f'{FTS_TABLE}.rowid = products_product.id',
+                f'{FTS_TABLE} MATCH %s',
+            ],
+            params=[build_match_expression(terms)],
+            select={'search_rank': f'bm25({FTS_TABLE}, {weights})'},
+        )
+        return queryset, True
+
+    if backend == 'postgres':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        search_query = SearchQuery(
+            ' & '.join(f'{term}:*' for term in terms),
+            search_type='raw',
+            config='simple'
+        )
+        vector = _postgres_vector()
+        queryset = queryset.annotate(
+            search_vector=vector,
+            search_rank=-SearchRank(vector, search_query, cover_density=True),
+        ).filter(search_vector=search_query)
+        return queryset, True
+
+    return queryset.filter(
+        Q(title__icontains=query) |
+        Q(description__icontains=query) |
+        Q(brand__icontains=query) |
+        Q(model__icontains=query)
+    ), False
@@ -0,0 +1,211 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Product, ProductImage, RelatedProduct, SiteCounter
+from categories.models import Category
+from . import facets, images, page_cache, search, similarity, suggest
+
+# Stand-in for a status that was deferred when the instance was loaded
+UNKNOWN = object()
+
+# Product status -> landing page counter it contributes to
+STATUS_COUNTERS = {
+    'active': SiteCounter.ACTIVE_PRODUCTS,
+    'sold': SiteCounter.SOLD_PRODUCTS,
+}
+
+
+@receiver(post_save, sender=Product)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    """Keep the full-text index in step with the searchable columns"""
+    if update_fields and not set(update_fields) & set(search.INDEXED_FIELDS):
+        return
+    search.index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.unindex_product(instance.pk)
+
+
+# Search suggestions
+
+# Fields that appear in, or decide membership of, the suggestion index
+SUGGEST_FIELDS = {'title', 'slug', 'brand', 'category', 'status'}
+
+
+@receiver(post_save, sender=Product)
+def update_search_suggestions(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not set(update_fields) & SUGGEST_FIELDS:
+        return
+    transaction.on_commit(lambda: suggest.update_product(instance))
+
+
+@receiver(post_delete, sender=Product)
+def remove_search_suggestions(sender, instance, **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(lambda: suggest.remove_product(product_id))
+
+
+@receiver(post_save, sender=Category)
+def update_category_suggestions(sender, instance, **kwargs):
+    transaction.on_commit(lambda: suggest.update_category(instance))
+
+
+@receiver(post_delete, sender=Category)
+def remove_category_suggestions(sender, instance, **kwargs):
+    category_id = instance.pk
+    transaction.on_commit(lambda: suggest.remove_category(category_id))
+
+
+# Search facets
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_search_facets(sender, **kwargs):
+    facets.invalidate()
+
+
+# Anonymous page cache
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def purge_product_pages(sender, instance, **kwargs):
+    tag = page_cache.product_tag(instance.pk)
+    transaction.on_commit(lambda: page_cache.purge(tag, page_cache.FEED))
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def touch_product(sender, instance, **kwargs):
+    """A new or removed photo changes the product's cards (products.templatetags.product_cards)"""
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def purge_product_image_pages(sender, instance, **kwargs):
+    tag = page_cache.product_tag(instance.product_id)
+    transaction.on_commit(lambda: page_cache.purge(tag, page_cache.FEED))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def purge_category_pages(sender, **kwargs):
+    # Every cached page shows the category tree in its navbar
+    transaction.on_commit(lambda: page_cache.purge(page_cache.CATEGORIES))
+
+
+# Related products
+
+# Fields that feed the similarity vectors or decide whether a product is listed
+SIMILARITY_FIELDS = {'title', 'brand', 'model', 'description', 'category', 'status'}
+
+
+@receiver(post_save, sender=Product)
+def update_related_products(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not set(update_fields) & SIMILARITY_FIELDS:
+        return
+    transaction.on_commit(lambda: similarity.schedule_update(instance.pk))
+
+
+@receiver(pre_delete, sender=Product)
+def refresh_related_products(sender, instance, **kwargs):
+    """Products listing this one lose a neighbour when the rows cascade away"""
+    product_ids = list(
+        RelatedProduct.objects.filter(related=instance).values_list('product_id', flat=True)
+    )
+    if product_ids:
+        transaction.on_commit(lambda: similarity.schedule_refresh(product_ids))
+
+
+# Site statistics
+
+@receiver(post_init, sender=Product)
+def remember_product_status(sender, instance, **kwargs):
+    # Read __dict__ so deferred fields don't trigger a query
+    instance._counted_status = instance.__dict__.get('status', UNKNOWN)
+    instance._counted_category = instance.__dict__.get('category_id', UNKNOWN)
+
+
+# Connected before update_product_counters, which records the new status
+@receiver(post_save, sender=Product)
+def update_category_counters(sender, instance, created, **kwargs):
+    """Move the product between category rollups on status or category changes"""
+    if created:
+        previous_status, previous_category = None, None
+    else:
+        previous_status, previous_category = instance._counted_status, instance._counted_category
+    if previous_status is UNKNOWN or previous_category is UNKNOWN:
+        return
+
+    was_active = previous_status == 'active'
+    is_active = instance.status == 'active'
+    moved = previous_category != instance.category_id
+
+    if was_active and (moved or not is_active):
+        Category.adjust_active_product_count(previous_category, -1)
+    if is_active and (moved or not was_active):
+        Category.adjust_active_product_count(instance.category_id, 1)
+    instance._counted_category = instance.category_id
+
+
+@receiver(post_delete, sender=Product)
+def release_category_counters(sender, instance, **kwargs):
+    if instance._counted_status == 'active' and instance._counted_category is not UNKNOWN:
+        Category.adjust_active_product_count(instance._counted_category, -1)
+
+
+@receiver(post_save, sender=Product)
+def update_product_counters(sender, instance, created, **kwargs):
+    """Move the product between status counters when its status changes"""
+    previous = None if created else instance._counted_status
+    if previous is UNKNOWN or previous == instance.status:
+        return
+
+    if previous in STATUS_COUNTERS:
+        SiteCounter.increment(STATUS_COUNTERS[previous], -1)
+    if instance.status in STATUS_COUNTERS:
+        SiteCounter.increment(STATUS_COUNTERS[instance.status], 1)
+    instance._counted_status = instance.status
+
+
+@receiver(post_delete, sender=Product)
+def release_product_counters(sender, instance, **kwargs):
+    if instance._counted_status in STATUS_COUNTERS:
+        SiteCounter.increment(STATUS_COUNTERS[instance._counted_status], -1)
+
+
+@receiver(post_init, sender=User)
+def remember_user_active(sender, instance, **kwargs):
+    instance._counted_active = instance.__dict__.get('is_active', UNKNOWN)
+
+
+@receiver(post_save, sender=User)
+def update_user_counter(sender, instance, created, **kwargs):
+    previous = False if created else instance._counted_active
+    if previous is not UNKNOWN and previous != instance.is_active:
+        SiteCounter.increment(SiteCounter.ACTIVE_USERS, 1 if instance.is_active else -1)
+        instance._counted_active = instance.is_active
+
+
+@receiver(post_delete, sender=User)
+def release_user_counter(sender, instance, **kwargs):
+    if instance._counted_active is True:
+        SiteCounter.increment(SiteCounter.ACTIVE_USERS, -1)
+
+
+# Image renditions
+
+@receiver(post_save, sender=ProductImage)
+def queue_image_renditions(sender, instance, **kwargs):
+    """Build derivatives off the request thread once the upload is committed"""
+    if images.needs_renditions(instance):
+        transaction.on_commit(lambda: images.schedule_renditions(instance.pk))
+
+
+@receiver(post_delete, sender=ProductImage)
+def delete_image_renditions(sender, instance, **kwargs):
+    images.delete_renditions(instance)
@@ -0,0 +1,299 @@
+"""
+Content-based related products.
+
+Active products are turned into TF-IDF vectors over their title, brand,
+model, description and category, and the top-k cosine neighbours of each
+product are stored in RelatedProduct, so the detail page reads them with a
+single query. Vectors are sparse dicts: the catalogue is small enough that
+this needs no NumPy/SciPy and rebuilding from scratch takes well under a
+second, while edits only recompute the rows they can affect.
+"""
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+TOP_K = 12
+
+# Closest products whose lists an edit may enter; further ones are left to
+# rebuild_related_products
+CANDIDATE_LIMIT = 50
+
+ROW_FIELDS = ('id', 'title', 'brand', 'model', 'description', 'category_id')
+
+# Field weights in the term-frequency vector
+FIELD_WEIGHTS = (
+    ('title', 3.0),
+    ('brand', 2.0),
+    ('model', 2.0),
+    ('description', 1.0),
+)
+CATEGORY_WEIGHT = 2.0
+
+TOKEN_RE = re.compile(r'[a-z0-9]{2,}')
+STOP_WORDS = frozenset("""
+    a an and are as at be by for from has have in is it its of on or that the
+    this to was with will very good new used condition sale sell selling price
+""".split())
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Kept between updates; every change goes through _index_lock
+_index = None
+_index_lock = threading.Lock()
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall((text or '').lower()) if token not in STOP_WORDS]
+
+
+def _term_frequencies(row):
+    terms = Counter()
+    for field, weight in FIELD_WEIGHTS:
+        for token in tokenize(row[field]):
+            terms[token] += weight
+    terms[f'category:{row["category_id"]}'] += CATEGORY_WEIGHT
+    return terms
+
+
+class SimilarityIndex:
+    """
+    TF-IDF vectors plus an inverted index for every active product.
+
+    put() and remove() keep the document frequencies and postings exact, but
+    only re-weight the product being changed: other vectors keep the idf they
+    were built with until the next full rebuild, a drift of one document in
+    the whole catalogue per edit.
+    """
+
+    def __init__(self, rows=()):
+        self.frequencies = {}
+        self.document_frequency = Counter()
+        self.vectors = {}
+        self.postings = defaultdict(dict)
+        self.synced_at = None
+
+        for row in rows:
+            self._add_terms(row['id'], _term_frequencies(row))
+        for product_id in self.frequencies:
+            self._vectorize(product_id)
+
+    @classmethod
+    def from_database(cls):
+        from .models import Product
+
+        started = timezone.now()
+        index = cls(Product.objects.filter(status='active').values(*ROW_FIELDS))
+        index.synced_at = started
+        return index
+
+    def _add_terms(self, product_id, terms):
+        self.frequencies[product_id] = terms
+        self.document_frequency.update(terms.keys())
+
+    def _vectorize(self, product_id):
+        terms = self.frequencies[product_id]
+        total = len(self.frequencies)
+        # Sublinear tf and smoothed idf, so terms shared by every product still count a little
+        vector = {
+            term: (1 + math.log(tf)) * (math.log((1 + total) / (1 + self.document_frequency[term])) + 1)
+            for term, tf in terms.items()
+        }
+        norm = math.sqrt(sum(value * value for value in vector.values()))
+        if not norm:
+            return
+        vector = {term: value / norm for term, value in vector.items() if value}
+        self.vectors[product_id] = vector
+        for term, value in vector.items():
+            self.postings[term][product_id] = value
+
+    def remove(self, product_id):
+        terms = self.frequencies.pop(product_id, None)
+        if terms is None:
+            return
+        self.document_frequency.subtract(terms.keys())
+        for term in terms:
+            if self.document_frequency[term] <= 0:
+                del self.document_frequency[term]
+        for term in self.vectors.pop(product_id, {}):
+            postings = self.postings[term]
+            postings.pop(product_id, None)
+            if not postings:
+                del self.postings[term]
+
+    def put(self, row):
+        """Add or replace one product"""
+        self.remove(row['id'])
+        self._add_terms(row['id'], _term_frequencies(row))
+        self._vectorize(row['id'])
+
+    def sync(self):
+        """Apply products saved since the last sync, by any process"""
+        from .models import Product
+
+        started = timezone.now()
+        rows = Product.objects.filter(updated_at__gte=self.synced_at).values(*ROW_FIELDS, 'status')
+        for row in rows:
+            if row['status'] == 'active':
+                self.put(row)
+            else:
+                self.remove(row['id'])
+        self.synced_at = started
+
+    def scores(self, product_id):
+        """Cosine score against every product sharing at least one term"""
+        vector = self.vectors.get(product_id)
+        if not vector:
+            return {}
+
+        scores = defaultdict(float)
+        for term, value in vector.items():
+            for other, other_value in self.postings[term].items():
+                if other != product_id:
+                    scores[other] += value * other_value
+        return scores
+
+    def neighbours(self, product_id, k=TOP_K):
+        """Top-k (related_id, cosine score) pairs"""
+        return _top(self.scores(product_id).items(), k)
+
+
+def _top(pairs, k=TOP_K):
+    return sorted(pairs, key=lambda item: (-item[1], -item[0]))[:k]
+
+
+def get_index():
+    """This process's index, brought up to date with products saved elsewhere"""
+    global _index
+
+    if _index is None:
+        _index = SimilarityIndex.from_database()
+    else:
+        _index.sync()
+    return _index
+
+
+def _store(index, lists):
+    """Replace the neighbour rows of every product in ``lists`` ({product_id: [(related_id, score)]})"""
+    from .models import Product, RelatedProduct
+
+    # Another process may have deleted products this index still holds
+    mentioned = set(lists) | {related_id for pairs in lists.values() for related_id, _ in pairs}
+    live = set(Product.objects.filter(pk__in=mentioned, status='active').values_list('pk', flat=True))
+    for product_id in mentioned - live:
+        index.remove(product_id)
+
+    rows = [
+        RelatedProduct(product_id=product_id, related_id=related_id, score=score)
+        for product_id, pairs in lists.items() if product_id in live
+        for related_id, score in pairs if related_id in live
+    ]
+    with transaction.atomic():
+        RelatedProduct.objects.filter(product_id__in=lists.keys()).delete()
+        RelatedProduct.objects.bulk_create(rows)
+    return len(rows)
+
+
+def rebuild_all():
+    """Recompute neighbours for every active product"""
+    global _index
+    from .models import RelatedProduct
+
+    with _index_lock:
+        _index = SimilarityIndex.from_database()
+        with transaction.atomic():
+            RelatedProduct.objects.exclude(product_id__in=_index.vectors.keys()).delete()
+            return _store(_index, {product_id: _index.neighbours(product_id) for product_id in _index.vectors})
+
+
+def update_product(product_id):
+    """
+    Refresh the rows a single product can affect: its own neighbours, the
+    lists it was already in, and the lists of its CANDIDATE_LIMIT closest
+    products, which it may now enter.
+    """
+    from .models import Product, RelatedProduct
+
+    with _index_lock:
+        index = get_index()
+        row = Product.objects.filter(pk=product_id, status='active').values(*ROW_FIELDS).first()
+        if row:
+            index.put(row)
+        else:
+            index.remove(product_id)
+
+        pointing_here = set(
+            RelatedProduct.objects.filter(related_id=product_id).values_list('product_id', flat=True)
+        )
+        # The product changed, so lists holding it are recomputed in full
+        lists = {pk: index.neighbours(pk) for pk in pointing_here if pk in index.vectors}
+
+        if product_id not in index.vectors:
+            # Sold, deactivated or deleted: drop its rows
+            RelatedProduct.objects.filter(product_id=product_id).delete()
+            return _store(index, lists) if lists else 0
+
+        scores = index.scores(product_id)
+        lists[product_id] = _top(scores.items())
+
+        # Closest products only need this one merged into their current list
+        closest = [
+            (pk, score) for pk, score in _top(scores.items(), CANDIDATE_LIMIT)
+            if pk not in pointing_here
+        ]
+        current = defaultdict(list)
+        rows = RelatedProduct.objects.filter(
+            product_id__in=[pk for pk, _ in closest]
+        ).values_list('product_id', 'related_id', 'score')
+        for pk, related_id, score in rows:
+            current[pk].append((related_id, score))
+        for pk, score in closest:
+            merged = _top(current[pk] + [(product_id, score)])
+            if any(related_id == product_id for related_id, _ in merged):
+                lists[pk] = merged
+
+        return _store(index, lists)
+
+
+def refresh_products(product_ids):
+    """Recompute the neighbours of specific products, e.g. after a deletion"""
+    with _index_lock:
+        index = get_index()
+        return _store(index, {pk: index.neighbours(pk) for pk in product_ids if pk in index.vectors})
+
+
+def _process(func, *args):
+    try:
+        func(*args)
+    except Exception as e:
+        print(f"Error updating related products: {e}")
+    finally:
+        close_old_connections()
+
+
+def _schedule(func, *args):
+    """Run in the background; a single worker keeps updates serialized"""
+    global _executor
+
+    if getattr(settings, 'RELATED_PRODUCTS_SYNC', False):
+        _process(func, *args)
+        return
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='related-products')
+    _executor.submit(_process, func, *args)
+
+
+def schedule_update(product_id):
+    _schedule(update_product, product_id)
+
+
+def schedule_refresh(product_ids):
+    _schedule(refresh_products, list(product_ids))
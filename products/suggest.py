@@ -0,0 +1,459 @@
+"""
+Search-as-you-type suggestions.
+
+Completions come from a sorted array of (key, kind, ref) entries held in
+process memory, where every word-start suffix of a title, brand or category
+name is a key, so "calc" finds "Casio scientific calculator". A lookup is one
+bisect plus a short forward scan and never touches the database.
+
+The index state (active products plus categories) is shared between worker
+processes through a compressed snapshot file, one per database. Requests
+never read or write it: an edit is applied to this process's index at once
+and queued, and a background thread publishes the queued edits together,
+SEARCH_SUGGEST_PUBLISH_DELAY seconds later, on top of the newest snapshot
+under a file lock. When a lookup's stat() shows another process published,
+the same thread loads the new snapshot and swaps it in, while the old index
+keeps answering. Set SEARCH_SUGGEST_SYNC to do all of this inline.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from bisect import bisect_left, insort
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.urls import reverse
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+KIND_CATEGORY = 'category'
+KIND_BRAND = 'brand'
+KIND_TITLE = 'title'
+
+# Categories and brands rank above individual listings for the same prefix
+KIND_BOOST = {KIND_CATEGORY: 3, KIND_BRAND: 2, KIND_TITLE: 1}
+
+MAX_SUGGESTIONS = 8
+# Entries examined per lookup; bounds the cost of one-letter prefixes
+MAX_SCAN = 500
+MIN_PREFIX_LENGTH = 2
+
+_lock = threading.RLock()
+_publish_lock = threading.Lock()
+_index = None
+# (kind, id) -> data applied here but not yet in the snapshot
+_pending = {}
+_worker = None
+_wakeup = threading.Event()
+
+
+def normalize(text):
+    return ' '.join((text or '').lower().split())
+
+
+def _keys(text):
+    """'Casio FX 991' -> ['casio fx 991', 'fx 991', '991']"""
+    words = normalize(text).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+def get_publish_delay():
+    """Seconds a change waits so that edits close together share one snapshot"""
+    return getattr(settings, 'SEARCH_SUGGEST_PUBLISH_DELAY', 2)
+
+
+def get_snapshot_path():
+    """
+    The snapshot file for the default database, or None when the database
+    lives in this process's memory and there is nothing to share
+    """
+    db = connections['default']
+    if db.vendor == 'sqlite' and db.is_in_memory_db():
+        return None
+    name = f"{db.vendor}:{db.settings_dict['HOST']}:{db.settings_dict['PORT']}:{db.settings_dict['NAME']}"
+    base = getattr(settings, 'SEARCH_SUGGEST_SNAPSHOT', settings.BASE_DIR / 'search_suggest.snapshot')
+    return f'{base}.{hashlib.md5(name.encode()).hexdigest()[:12]}'
+
+
+class SuggestIndex:
+    """Sorted prefix array over active product titles, brands and categories"""
+
+    def __init__(self, products=None, categories=None):
+        # product id -> [title, slug, brand, category id, views]
+        self.products = {}
+        # category id -> [name, slug]
+        self.categories = {}
+        self.brands = {}
+        self.brand_counts = Counter()
+        self.category_counts = Counter()
+        self.entries = []
+        self.loaded_mtime = None
+        # Bumped on every incremental change, so derived structures can tell they are stale
+        self.revision = 0
+
+        entries = []
+        for category_id, data in (categories or {}).items():
+            self.categories[int(category_id)] = data
+            entries.extend(self._category_entries(int(category_id)))
+        for product_id, data in (products or {}).items():
+            entries.extend(self._add_product(int(product_id), data))
+        self.entries = sorted(set(entries))
+
+    @classmethod
+    def from_database(cls):
+        from categories.models import Category
+        from .models import Product
+
+        products = {
+            row[0]: list(row[1:])
+            for row in Product.objects.filter(status='active').values_list(
+                'id', 'title', 'slug', 'brand', 'category_id', 'views_count'
+            )
+        }
+        categories = {
+            row[0]: list(row[1:])
+            for row in Category.objects.filter(is_active=True).values_list('id', 'name', 'slug')
+        }
+        return cls(products, categories)
+
+    # Entry bookkeeping
+
+    def _category_entries(self, category_id):
+        return [(key, KIND_CATEGORY, category_id) for key in _keys(self.categories[category_id][0])]
+
+    def _add_product(self, product_id, data):
+        """Record a product and return the entries it introduces"""
+        title, slug, brand, category_id, views = data
+        self.products[product_id] = data
+        self.category_counts[category_id] += 1
+
+        entries = [(key, KIND_TITLE, product_id) for key in _keys(title)]
+        brand_key = normalize(brand)
+        if brand_key:
+            self.brand_counts[brand_key] += 1
+            if self.brand_counts[brand_key] == 1:
+                self.brands[brand_key] = brand.strip()
+                entries.extend((key, KIND_BRAND, brand_key) for key in _keys(brand))
+        return entries
+
+    def _remove_product(self, product_id):
+        """Forget a product and return the entries that should go"""
+        title, slug, brand, category_id, views = self.products.pop(product_id)
+        self.category_counts[category_id] -= 1
+
+        entries = [(key, KIND_TITLE, product_id) for key in _keys(title)]
+        brand_key = normalize(brand)
+        if brand_key:
+            self.brand_counts[brand_key] -= 1
+            if self.brand_counts[brand_key] <= 0:
+                del self.brand_counts[brand_key]
+                self.brands.pop(brand_key, None)
+                entries.extend((key, KIND_BRAND, brand_key) for key in _keys(brand))
+        return entries
+
+    def _insert(self, entries):
+        for entry in entries:
+            position = bisect_left(self.entries, entry)
+            if position == len(self.entries) or self.entries[position] != entry:
+                insort(self.entries, entry)
+
+    def _delete(self, entries):
+        for entry in entries:
+            position = bisect_left(self.entries, entry)
+            if position < len(self.entries) and self.entries[position] == entry:
+                del self.entries[position]
+
+    # Incremental updates
+
+    def set_product(self, product_id, data):
+        """Insert, update (data given) or remove (data None) a product"""
+        self.revision += 1
+        if product_id in self.products:
+            self._delete(self._remove_product(product_id))
+        if data is not None:
+            self._insert(self._add_product(product_id, list(data)))
+
+    def set_category(self, category_id, data):
+        """Insert, rename (data given) or remove (data None) a category"""
+        self.revision += 1
+        if category_id in self.categories:
+            self._delete(self._category_entries(category_id))
+            del self.categories[category_id]
+        if data is not None:
+            self.categories[category_id] = list(data)
+            self._insert(self._category_entries(category_id))
+
+    # Lookups
+
+    def _score(self, kind, ref):
+        if kind == KIND_TITLE:
+            return self.products[ref][4]
+        if kind == KIND_BRAND:
+            return self.brand_counts[ref]
+        return self.category_counts[ref]
+
+    def _suggestion(self, kind, ref):
+        if kind == KIND_TITLE:
+            title, slug = self.products[ref][:2]
+            return {'type': kind, 'text': title, 'url': reverse('products:product_detail', args=[slug])}
+        if kind == KIND_BRAND:
+            name = self.brands[ref]
+            return {'type': kind, 'text': name, 'url': f"{reverse('products:search')}?{urlencode({'query': name})}"}
+        name, slug = self.categories[ref]
+        return {'type': kind, 'text': name, 'url': reverse('categories:category_detail', args=[slug])}
+
+    def lookup(self, prefix, limit=MAX_SUGGESTIONS):
+        prefix = normalize(prefix)
+        if len(prefix) < MIN_PREFIX_LENGTH:
+            return []
+
+        matches = {}
+        position = bisect_left(self.entries, (prefix,))
+        for key, kind, ref in self.entries[position:position + MAX_SCAN]:
+            if not key.startswith(prefix):
+                break
+            # A whole-name match beats one on a later word
+            full_match = key == normalize(self._suggestion_text(kind, ref))
+            rank = (KIND_BOOST[kind], full_match, self._score(kind, ref))
+            if matches.get((kind, ref), (0,)) < rank:
+                matches[(kind, ref)] = rank
+
+        best = sorted(matches.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [self._suggestion(kind, ref) for (kind, ref), _ in best]
+
+    def _suggestion_text(self, kind, ref):
+        if kind == KIND_TITLE:
+            return self.products[ref][0]
+        if kind == KIND_BRAND:
+            return self.brands[ref]
+        return self.categories[ref][0]
+
+    # Snapshots
+
+    def dumps(self):
+        data = {'products': self.products, 'categories': self.categories}
+        return zlib.compress(json.dumps(data, separators=(',', ':')).encode())
+
+    @classmethod
+    def loads(cls, blob):
+        data = json.loads(zlib.decompress(blob))
+        return cls(data['products'], data['categories'])
+
+
+def _snapshot_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _read_snapshot(path):
+    with open(path, 'rb') as snapshot:
+        index = SuggestIndex.loads(snapshot.read())
+    index.loaded_mtime = _snapshot_mtime(path)
+    return index
+
+
+def _write_snapshot(blob, path):
+    """Atomically replace the snapshot; returns its new mtime"""
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as snapshot:
+        snapshot.write(blob)
+    os.replace(temp_path, path)
+    return _snapshot_mtime(path)
+
+
+class _SnapshotLock:
+    """Exclusive lock across processes around read-modify-write of the snapshot"""
+
+    def __init__(self, path):
+        self.path = f'{path}.lock'
+        self.handle = None
+
+    def __enter__(self):
+        _publish_lock.acquire()
+        if fcntl is not None:
+            self.handle = open(self.path, 'a')
+            fcntl.flock(self.handle, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.handle is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_UN)
+            self.handle.close()
+        _publish_lock.release()
+
+
+def _apply_change(index, key, data):
+    kind, pk = key
+    if kind == KIND_CATEGORY:
+        index.set_category(pk, data)
+    else:
+        index.set_product(pk, data)
+
+
+def _newer_index(path):
+    """
+    A freshly loaded index when this process has none yet or another process
+    published a newer snapshot, else None
+    """
+    mtime = _snapshot_mtime(path) if path else None
+    if _index is not None and (path is None or mtime == _index.loaded_mtime):
+        return None
+    if mtime is not None:
+        try:
+            return _read_snapshot(path)
+        except (OSError, ValueError, zlib.error) as e:
+            print(f"Error loading search suggestions snapshot: {e}")
+    return SuggestIndex.from_database()
+
+
+def sync():
+    """
+    Load a newer snapshot if there is one, then publish this process's
+    unpublished changes on top of it. Runs on the worker thread, or inline
+    with SEARCH_SUGGEST_SYNC.
+    """
+    global _index
+
+    path = get_snapshot_path()
+    with _lock:
+        pending = dict(_pending)
+
+    if path is None:
+        # Nothing to share with other processes
+        index = _newer_index(path)
+    else:
+        with _SnapshotLock(path):
+            index = _newer_index(path)
+            # An index built from the database is published too, so the other
+            # processes can load it instead of querying for their own
+            if pending or (index is not None and index.loaded_mtime is None):
+                with _lock:
+                    target = index or _index
+                    if index is not None:
+                        for key, data in pending.items():
+                            _apply_change(target, key, data)
+                    blob = target.dumps()
+                try:
+                    target.loaded_mtime = _write_snapshot(blob, path)
+                except OSError as e:
+                    print(f"Error writing search suggestions snapshot: {e}")
+
+    with _lock:
+        if index is not None:
+            # Including changes made here while it loaded
+            for key, data in _pending.items():
+                _apply_change(index, key, data)
+            _index = index
+        for key, data in pending.items():
+            if _pending.get(key) == data:
+                del _pending[key]
+
+
+def _run_worker():
+    while True:
+        _wakeup.wait()
+        if _pending:
+            # Let a burst of edits go out as one snapshot
+            time.sleep(get_publish_delay())
+        _wakeup.clear()
+        try:
+            sync()
+        except Exception as e:
+            print(f"Error syncing search suggestions: {e}")
+        finally:
+            close_old_connections()
+
+
+def _schedule():
+    global _worker
+
+    if getattr(settings, 'SEARCH_SUGGEST_SYNC', False):
+        sync()
+        return
+
+    if _worker is None:
+        with _lock:
+            if _worker is None:
+                _worker = threading.Thread(target=_run_worker, name='search-suggest', daemon=True)
+                _worker.start()
+    _wakeup.set()
+
+
+def get_index():
+    """
+    The current index, or None until the first one has loaded. A newer
+    snapshot from another process is loaded in the background while the
+    current index keeps serving.
+    """
+    index = _index
+    path = get_snapshot_path()
+    if index is None or (path is not None and _snapshot_mtime(path) != index.loaded_mtime):
+        _schedule()
+        index = _index
+    return index
+
+
+def rebuild():
+    """Build the index from the database and publish it as the snapshot"""
+    global _index
+
+    index = SuggestIndex.from_database()
+    path = get_snapshot_path()
+    with _lock:
+        for key, data in _pending.items():
+            _apply_change(index, key, data)
+        blob = index.dumps()
+    if path is not None:
+        with _SnapshotLock(path):
+            try:
+                index.loaded_mtime = _write_snapshot(blob, path)
+            except OSError as e:
+                print(f"Error writing search suggestions snapshot: {e}")
+    with _lock:
+        _index = index
+    return index
+
+
+def _change(key, data):
+    """Apply a change to this process's index now and publish it shortly"""
+    with _lock:
+        if _index is not None:
+            _apply_change(_index, key, data)
+        _pending[key] = data
+    _schedule()
+
+
+def update_product(product):
+    if product.status == 'active':
+        data = [product.title, product.slug, product.brand, product.category_id, product.views_count]
+    else:
+        data = None
+    _change((KIND_TITLE, product.pk), data)
+
+
+def remove_product(product_id):
+    _change((KIND_TITLE, product_id), None)
+
+
+def update_category(category):
+    data = [category.name, category.slug] if category.is_active else None
+    _change((KIND_CATEGORY, category.pk), data)
+
+
+def remove_category(category_id):
+    _change((KIND_CATEGORY, category_id), None)
+
+
+def suggest(prefix, limit=MAX_SUGGESTIONS):
+    index = get_index()
+    return index.lookup(prefix, limit) if index is not None else []
@@ -0,0 +1,92 @@
+"""
+Cached product card fragments.
+
+    {% load product_cards %}
+    {% prefetch_product_cards products 'shop' %}
+    {% for product in products %}
+        <div class="card">
+            {% product_card product 'shop' %}<a ...>...</a>{% endproduct_card %}
+            <div class="card-body pt-0">...timesince, buttons...</div>
+        </div>
+    {% endfor %}
+
+A fragment is keyed on its variant, the product id and updated_at, which
+Product.save always bumps and ProductImage changes touch (see
+products.signals), so an edited card is simply rendered under a new key.
+prefetch_product_cards fetches every card of the page with one get_many;
+product_card then only renders and stores the misses. A fragment must hold
+whole elements, every tag it opens closed inside it, and per-request output
+(csrf tokens, timesince, view counts, owner actions, wishlist state) goes in
+sibling elements after it.
+"""
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+
+register = template.Library()
+
+CARD_KEY = 'products:card:{}'
+
+# render_context slot holding the fragments fetched by prefetch_product_cards
+PREFETCHED = 'product_cards'
+
+
+def get_timeout():
+    """Backstop for markup that depends on more than the product row (category names)"""
+    return getattr(settings, 'PRODUCT_CARD_CACHE_TIMEOUT', 3600)
+
+
+def card_key(product, variant):
+    stamp = product.updated_at.timestamp() if product.updated_at else ''
+    digest = hashlib.md5(f'{variant}:{product.pk}:{stamp}'.encode()).hexdigest()
+    return CARD_KEY.format(digest)
+
+
+@register.simple_tag(takes_context=True)
+def prefetch_product_cards(context, items, variant, via=None):
+    """
+    Load the cached cards for ``items`` in one round trip. ``via`` names the
+    attribute holding the product when the items wrap one (wishlist entries).
+    """
+    products = [getattr(item, via) if via else item for item in items]
+    keys = [card_key(product, variant) for product in products if product is not None]
+    if keys:
+        found = cache.get_many(keys)
+        # Misses are recorded too, so product_card doesn't ask the cache again
+        context.render_context.setdefault(PREFETCHED, {}).update({key: found.get(key) for key in keys})
+    return ''
+
+
+class ProductCardNode(template.Node):
+    def __init__(self, nodelist, product, variant):
+        self.nodelist = nodelist
+        self.product = product
+        self.variant = variant
+
+    def render(self, context):
+        product = self.product.resolve(context)
+        variant = self.variant.resolve(context)
+        if product is None:
+            return self.nodelist.render(context)
+
+        key = card_key(product, variant)
+        prefetched = context.render_context.get(PREFETCHED, {})
+        html = prefetched[key] if key in prefetched else cache.get(key)
+        if html is None:
+            html = self.nodelist.render(context)
+            cache.set(key, html, get_timeout())
+        return html
+
+
+@register.tag
+def product_card(parser, token):
+    """{% product_card product 'variant' %}...{% endproduct_card %}"""
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a product and a variant name")
+
+    nodelist = parser.parse(('endproduct_card',))
+    parser.delete_first_token()
+    return ProductCardNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]))
@@ -0,0 +1,49 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+from products.images import HIGH_DENSITY
+
+register = template.Library()
+
+
+def _srcset(image, size, extension):
+    """'card.webp 1x, gallery.webp 2x', or '' while renditions are pending"""
+    candidates = []
+    for density, name in enumerate((size, HIGH_DENSITY.get(size)), start=1):
+        entry = image.renditions.get(name) if name else None
+        if entry and entry.get(extension):
+            candidates.append(f'{default_storage.url(entry[extension])} {density}x')
+    return ', '.join(candidates)
+
+
+@register.simple_tag
+def product_picture(image, size='card', alt='', css_class='', style='', loading='lazy'):
+    """
+    Render a <picture> for a ProductImage (or a Product's primary image)
+    with WebP and JPEG srcsets, falling back to the original upload.
+
+    Usage: {% product_picture product 'card' alt=product.title css_class="card-img-top" %}
+    """
+    if hasattr(image, 'primary_image'):
+        image = image.primary_image
+    if not image or not image.image:
+        return ''
+
+    entry = image.renditions.get(size)
+    if not entry:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" style="{}" loading="{}">',
+            image.image.url, alt, css_class, style, loading
+        )
+
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}">'
+        '<img src="{}" srcset="{}" width="{}" height="{}" alt="{}" class="{}" style="{}" loading="{}">'
+        '</picture>',
+        _srcset(image, size, 'webp'),
+        default_storage.url(entry['jpg']),
+        _srcset(image, size, 'jpg'),
+        entry['width'], entry['height'],
+        alt, css_class, style, loading
+    )
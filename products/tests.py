@@ -1,3 +1,113 @@
-from django.test import TestCase
+import re
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from categories.models import Category
+from .models import Product, ProductImage, RelatedProduct
+
+# A plan step that reads a whole listing table, or sorts rows after reading them
+FULL_SCAN_RE = re.compile(r'\bSCAN (products_product|products_productimage|products_relatedproduct)\b')
+TEMP_SORT_RE = re.compile(r'USE TEMP B-TREE FOR .*ORDER BY')
+
+
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL=0, RELATED_PRODUCTS_SYNC=True, SEARCH_SUGGEST_SYNC=True, PAGE_CACHE_TIMEOUT=0)
+class ProductQueryPlanTests(TestCase):
+    """
+    Run each listing view and EXPLAIN every query it sends against the
+    product tables, so a missing or mismatched index shows up as a failure
+    instead of a slow page.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        cls.category = Category.objects.create(name='Electronics', slug='electronics')
+        cls.subcategory = Category.objects.create(name='Phones', slug='phones', parent=cls.category)
+        cls.leaf = Category.objects.create(name='Android', slug='android', parent=cls.subcategory)
+
+        statuses = ['active', 'active', 'active', 'sold', 'inactive']
+        cls.products = []
+        for i in range(30):
+            product = Product.objects.create(
+                title=f'Casio calculator {i}',
+                description='Scientific calculator',
+                price=100 + i,
+                category=(cls.category, cls.subcategory, cls.leaf)[i % 3],
+                seller=cls.seller,
+                status=statuses[i % len(statuses)],
+                city='Pune',
+                is_featured=i % 4 == 0,
+            )
+            ProductImage.objects.create(product=product, image=f'products/{i}.jpg', is_primary=True)
+            cls.products.append(product)
+
+        cls.product = cls.products[0]
+        for other in cls.products[1:7]:
+            RelatedProduct.objects.create(product=cls.product, related=other, score=0.5)
+
+    def assertIndexedQueries(self, url, login=False, allow_sort=False):
+        if login:
+            self.client.force_login(self.seller)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        checked = 0
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or 'products_' not in sql:
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = '\n'.join(row[-1] for row in cursor.fetchall())
+                checked += 1
+
+                with self.subTest(url=url, sql=sql):
+                    self.assertIsNone(FULL_SCAN_RE.search(plan), f'Full table scan:\n{plan}')
+                    if not allow_sort:
+                        self.assertIsNone(TEMP_SORT_RE.search(plan), f'Sort without an index:\n{plan}')
+
+        self.assertGreater(checked, 0)
+
+    def test_landing_page(self):
+        self.assertIndexedQueries(reverse('products:landing'))
+
+    def test_shop(self):
+        self.assertIndexedQueries(reverse('products:shop'))
+
+    def test_shop_next_page(self):
+        response = self.client.get(reverse('products:shop'))
+        self.assertIndexedQueries(reverse('products:shop') + response.context['next_page_url'])
+
+    def test_search_sorted(self):
+        url = reverse('products:search')
+        for sort_by in ('newest', 'price_low', 'price_high', 'title_asc', 'title_desc'):
+            self.assertIndexedQueries(f'{url}?sort_by={sort_by}')
+            self.assertIndexedQueries(f'{url}?sort_by={sort_by}&category={self.category.pk}')
+
+    def test_search_text_query(self):
+        # Matches come from the FTS5 table and are ranked with bm25(), which no
+        # index can order, so only the matched rows may be sorted; the product
+        # table itself must still be read by primary key
+        url = reverse('products:search')
+        self.assertIndexedQueries(f'{url}?query=casio', allow_sort=True)
+        for sort_by in ('newest', 'price_low', 'title_asc'):
+            self.assertIndexedQueries(f'{url}?query=casio&sort_by={sort_by}', allow_sort=True)
+
+    def test_product_detail(self):
+        self.assertIndexedQueries(self.product.get_absolute_url())
+
+    def test_category_detail(self):
+        self.assertIndexedQueries(self.category.get_absolute_url())
+        self.assertIndexedQueries(self.subcategory.get_absolute_url())
+
+    def test_public_profile(self):
+        self.assertIndexedQueries(reverse('accounts:public_profile', args=[self.seller.username]))
+
+    def test_my_products(self):
+        self.assertIndexedQueries(reverse('accounts:my_products'), login=True)
@@ -7,6 +7,7 @@ urlpatterns = [
     path('', views.LandingPageView.as_view(), name='landing'),
     path('shop/', views.ShopView.as_view(), name='shop'),
     path('search/', views.ProductSearchView.as_view(), name='search'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
     path('product/<slug:slug>/', views.ProductDetailView.as_view(), name='product_detail'),
     path('create/', views.ProductCreateView.as_view(), name='product_create'),
     path('product/<slug:slug>/edit/', views.ProductEditView.as_view(), name='product_edit'),
@@ -0,0 +1,134 @@
+"""
+Buffered product view counter.
+
+Page hits are accumulated in memory per process and written back with one
+bulk UPDATE every VIEW_COUNT_FLUSH_INTERVAL seconds by a daemon thread, and
+once more when the process exits, so a crash loses at most one interval.
+Repeat views by the same visitor (session cookie, or IP address without one)
+are counted once per VIEW_COUNT_DEDUP_TIMEOUT; the marker lives in the
+cache, so viewing a product never writes to the session. The default settings
+keep markers in each worker's memory (the cache's LOCAL_PREFIXES), so a
+visitor spread over several workers may be counted once per worker.
+"""
+import atexit
+import hashlib
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Case, F, Value, When
+
+SEEN_KEY = 'views:seen:{}:{}'
+
+_pending = Counter()
+_lock = threading.Lock()
+_flusher = None
+
+
+def get_flush_interval():
+    return getattr(settings, 'VIEW_COUNT_FLUSH_INTERVAL', 5)
+
+
+def get_dedup_timeout():
+    """Seconds during which repeat views by one visitor count once"""
+    return getattr(settings, 'VIEW_COUNT_DEDUP_TIMEOUT', 6 * 60 * 60)
+
+
+def add(product_id, count=1):
+    """Buffer ``count`` views for a product"""
+    with _lock:
+        _pending[product_id] += count
+
+    if get_flush_interval() <= 0:
+        flush()
+    else:
+        _ensure_flusher()
+
+
+def _visitor(request):
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    visitor = f'session:{session_key}' if session_key else f'ip:{request.META.get("REMOTE_ADDR", "")}'
+    return hashlib.md5(visitor.encode()).hexdigest()
+
+
+def record_view(request, product_id):
+    """Count a page view unless this visitor has seen the product recently"""
+    if not cache.add(SEEN_KEY.format(_visitor(request), product_id), 1, get_dedup_timeout()):
+        return False
+
+    add(product_id)
+    return True
+
+
+def pending(product_id):
+    """Views buffered in this process but not yet written to the database"""
+    with _lock:
+        return _pending.get(product_id, 0)
+
+
+def flush():
+    """Write all buffered views in a single UPDATE; returns products touched"""
+    from .models import Product
+
+    with _lock:
+        hits = dict(_pending)
+        _pending.clear()
+
+    if not hits:
+        return 0
+
+    # Group products by hit count so the CASE stays short under load
+    by_count = defaultdict(list)
+    for product_id, count in hits.items():
+        by_count[count].append(product_id)
+
+    try:
+        Product.objects.filter(pk__in=hits.keys()).update(
+            views_count=F('views_count') + Case(
+                *[When(pk__in=ids, then=Value(count)) for count, ids in by_count.items()],
+                default=Value(0)
+            )
+        )
+    except Exception as e:
+        print(f"Error flushing view counts: {e}")
+        with _lock:
+            _pending.update(hits)
+        return 0
+
+    return len(hits)
+
+
+def _run_flusher(stop_event):
+    interval = get_flush_interval()
+    while not stop_event.wait(interval):
+        flush()
+        close_old_connections()
+
+
+def _ensure_flusher():
+    global _flusher
+
+    if _flusher is not None:
+        return
+
+    with _lock:
+        if _flusher is not None:
+            return
+        stop_event = threading.Event()
+        thread = threading.Thread(
+            target=_run_flusher,
+            args=(stop_event,),
+            name='view-counter-flusher',
+            daemon=True
+        )
+        thread.start()
+        _flusher = (thread, stop_event)
+
+
+@atexit.register
+def _flush_at_exit():
+    if _flusher is not None:
+        _flusher[1].set()
+    flush()
@@ -11,65 +11,100 @@ from django.db.models import Q, Count
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.utils.decorators import method_decorator
-from .models import Product, ProductImage, Wishlist, Contact
+from .models import Product, ProductImage, Wishlist, Contact, SiteCounter
 from .forms import ProductForm, ProductSearchForm
-from categories.models import Category
-
-class LandingPageView(TemplateView):
+from .search import search_products
+from . import facets, fuzzy, suggest, view_counter
+from .pagination import CursorPaginationMixin
+from .page_cache import AnonymousPageCacheMixin, product_tag
+from categories.tree import get_tree
+
+# Keyset orderings; each ends in a unique column so cursors are unambiguous
+RECENT_ORDERING = ('-created_at', '-id')
+SEARCH_SORT_ORDERINGS = {
+    'newest': RECENT_ORDERING,
+    'price_low': ('price', 'id'),
+    'price_high': ('-price', '-id'),
+    'title_asc': ('title', 'id'),
+    'title_desc': ('-title', '-id'),
+}
+
+class LandingPageView(AnonymousPageCacheMixin, TemplateView):
     template_name = 'products/landing.html'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['featured_products'] = Product.objects.filter(
             status='active', is_featured=True
-        ).order_by('-created_at')[:6]
-        context['categories'] = Category.objects.filter(is_active=True, parent=None)[:6]
+        ).with_primary_image().order_by('-created_at')[:6]
+        context['categories'] = get_tree().roots[:6]
         
-        # Calculate real statistics
-        context['total_products'] = Product.objects.filter(status='active').count()
-        context['total_users'] = User.objects.filter(is_active=True).count()
-        context['successful_deals'] = Product.objects.filter(status='sold').count()
+        # Precomputed statistics, maintained by products.signals
+        stats = SiteCounter.get_values()
+        context['total_products'] = stats.get(SiteCounter.ACTIVE_PRODUCTS, 0)
+        context['total_users'] = stats.get(SiteCounter.ACTIVE_USERS, 0)
+        context['successful_deals'] = stats.get(SiteCounter.SOLD_PRODUCTS, 0)
         
         return context
 
-class ShopView(ListView):
+class ShopView(AnonymousPageCacheMixin, CursorPaginationMixin, ListView):
     model = Product
     template_name = 'products/shop.html'
     context_object_name = 'products'
     paginate_by = 12
+    cursor_fragment_template = 'products/_shop_cards.html'
 
     def get_queryset(self):
-        return Product.objects.filter(status='active').order_by('-created_at')
+        return Product.objects.filter(status='active').with_primary_image().order_by(*RECENT_ORDERING)
+
+    def get_cursor_ordering(self):
+        return RECENT_ORDERING
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['featured_products'] = Product.objects.filter(
             status='active', is_featured=True
-        ).order_by('-created_at')[:8]
-        context['categories'] = Category.objects.filter(is_active=True, parent=None)[:8]
+        ).with_primary_image().order_by('-created_at')[:8]
+        context['categories'] = get_tree().roots[:8]
         context['search_form'] = ProductSearchForm()
         return context
 
-class ProductDetailView(DetailView):
+class ProductDetailView(AnonymousPageCacheMixin, DetailView):
     model = Product
     template_name = 'products/product_detail.html'
     context_object_name = 'product'
+    page_cache_feed = False
 
     def get_object(self):
         product = get_object_or_404(Product, slug=self.kwargs['slug'])
-        # Increment view count
-        product.increment_views()
+        # Buffered, once per visitor (session cookie or IP) per VIEW_COUNT_DEDUP_TIMEOUT
+        view_counter.record_view(self.request, product.pk)
+        self.page_cache_tags.add(product_tag(product.pk))
+        self.page_cache_extra['product_id'] = product.pk
         return product
 
+    def page_cache_hit(self, entry):
+        view_counter.record_view(self.request, entry['extra']['product_id'])
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        product = self.get_object()
+        product = self.object
         
-        # Related products from the same category
-        context['related_products'] = Product.objects.filter(
-            category=product.category,
-            status='active'
-        ).exclude(id=product.id).order_by('-created_at')[:6]
+        # Precomputed content-based neighbours (products.similarity)
+        related_products = list(
+            Product.objects.filter(
+                neighbour_of__product=product,
+                status='active'
+            ).with_primary_image().order_by('-neighbour_of__score')[:6]
+        )
+        if not related_products:
+            # Not indexed yet: newest items from the same category
+            related_products = Product.objects.filter(
+                category=product.category,
+                status='active'
+            ).exclude(id=product.id).with_primary_image().order_by('-created_at')[:6]
+        context['related_products'] = related_products
+        self.page_cache_tags.update(product_tag(related.pk) for related in related_products)
         
                 # Check if product is in user's wishlist
         if self.request.user.is_authenticated:
@@ -82,15 +117,22 @@ class ProductDetailView(DetailView):
         
         return context
 
-class ProductSearchView(ListView):
+class ProductSearchView(CursorPaginationMixin, ListView):
     model = Product
     template_name = 'products/search_results.html'
     context_object_name = 'products'
     paginate_by = 12
+    cursor_fragment_template = 'products/_search_cards.html'
+    sort_ordering = None
+    corrected_query = None
+    # Filtered queryset and text query, kept for the typo-corrected retry
+    search_base = None
+    search_query = None
 
     def get_queryset(self):
         form = ProductSearchForm(self.request.GET)
-        queryset = Product.objects.filter(status='active')
+        queryset = Product.objects.filter(status='active').select_related('category').with_primary_image()
+        ranked = False
 
         if form.is_valid():
             query = form.cleaned_data.get('query')
@@ -100,14 +142,6 @@ class ProductSearchView(ListView):
             city = form.cleaned_data.get('city')
             condition = form.cleaned_data.get('condition')
 
-            if query:
-                queryset = queryset.filter(
-                    Q(title__icontains=query) |
-                    Q(description__icontains=query) |
-                    Q(brand__icontains=query) |
-                    Q(model__icontains=query)
-                )
-
             if category:
                 queryset = queryset.filter(category=category)
 
@@ -123,29 +157,113 @@ class ProductSearchView(ListView):
             if condition:
                 queryset = queryset.filter(condition=condition)
 
+            if query:
+                self.search_base, self.search_query = queryset, query
+                queryset, ranked = search_products(queryset, query)
+
+        return self.order(queryset, ranked)
+
+    def order(self, queryset, ranked):
         # Apply sorting
         sort_by = self.request.GET.get('sort_by', '')
-        if sort_by == 'price_low':
-            queryset = queryset.order_by('price')
-        elif sort_by == 'price_high':
-            queryset = queryset.order_by('-price')
-        elif sort_by == 'title_asc':
-            queryset = queryset.order_by('title')
-        elif sort_by == 'title_desc':
-            queryset = queryset.order_by('-title')
+        if ranked and sort_by not in SEARCH_SORT_ORDERINGS:
+            # Default for text queries: best match first (offset pagination)
+            queryset = queryset.order_by('search_rank', '-created_at')
         else:
             # Default: Most recent first
-            queryset = queryset.order_by('-created_at')
+            self.sort_ordering = SEARCH_SORT_ORDERINGS.get(sort_by, RECENT_ORDERING)
+            queryset = queryset.order_by(*self.sort_ordering)
 
         return queryset
 
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Retry a text search with typos corrected when its first page lists
+        fewer than FUZZY_SEARCH_MIN_RESULTS products and the correction finds
+        more. The page fetched for display is the hit count, so a search that
+        finds enough costs no extra query.
+        """
+        result = super().paginate_queryset(queryset, page_size)
+        hits = len(result[2])
+        first_page = (
+            self.request.GET.get(self.page_kwarg, '1') == '1'
+            and not self.request.GET.get(self.cursor_query_param)
+        )
+        if self.search_query is None or hits >= fuzzy.get_min_results() or not first_page:
+            return result
+
+        corrected = fuzzy.correct_query(self.search_query)
+        if not corrected:
+            return result
+
+        cursor_page = self.cursor_page
+        fallback = super().paginate_queryset(self.order(*search_products(self.search_base, corrected)), page_size)
+        if len(fallback[2]) <= hits:
+            self.cursor_page = cursor_page
+            return result
+
+        self.corrected_query = corrected
+        return fallback
+
+    def get_cursor_ordering(self):
+        return self.sort_ordering
+
+    def get_page_params(self):
+        """Query string for page links; later pages search for what the first one showed"""
+        params = self.request.GET.copy()
+        for key in (self.page_kwarg, self.cursor_query_param):
+            params.pop(key, None)
+        if self.corrected_query:
+            params['query'] = self.corrected_query
+        return params
+
+    def get_cursor_url(self, cursor):
+        if cursor is None:
+            return None
+        params = self.get_page_params()
+        params[self.cursor_query_param] = cursor
+        return f'?{params.urlencode()}'
+
+    def get_refine_url(self, **filters):
+        """Current search with ``filters`` replaced, back on the first page"""
+        params = self.request.GET.copy()
+        for key in (self.page_kwarg, self.cursor_query_param, *filters):
+            params.pop(key, None)
+        for key, value in filters.items():
+            if value is not None:
+                params[key] = value
+        return f'?{params.urlencode()}'
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['search_form'] = ProductSearchForm(self.request.GET)
+        search_form = ProductSearchForm(self.request.GET)
+        is_ajax = self.request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+        if not is_ajax and search_form.is_valid():
+            # Count what is actually listed, i.e. the corrected query if one was used
+            search_facets = facets.get_facets(
+                dict(search_form.cleaned_data, query=self.corrected_query or search_form.cleaned_data['query'])
+            )
+            search_form.apply_facets(search_facets)
+            context['city_facets'] = [
+                dict(facet, url=self.get_refine_url(city=facet['name']))
+                for facet in search_facets['city']
+            ]
+            context['price_facets'] = [
+                dict(facet, url=self.get_refine_url(min_price=facet['min'], max_price=facet['max']))
+                for facet in search_facets['price_band']
+            ]
+        context['search_form'] = search_form
         context['query'] = self.request.GET.get('query', '')
+        context['corrected_query'] = self.corrected_query
+        context['page_params'] = self.get_page_params().urlencode()
         context['sort_by'] = self.request.GET.get('sort_by', '')
         return context
 
+def search_suggest(request):
+    """Title, brand and category completions for the search box"""
+    query = request.GET.get('q', '')
+    return JsonResponse({'query': query, 'suggestions': suggest.suggest(query)})
+
 class ProductCreateView(LoginRequiredMixin, CreateView):
     model = Product
     form_class = ProductForm
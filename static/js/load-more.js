@@ -0,0 +1,38 @@
+// "Load more" for cursor-paginated product lists
+//
+// Links marked with data-load-more fetch the next slice as JSON
+// ({html, next_url}) and append the cards to the data-target grid.
+
+document.addEventListener('click', async function (event) {
+    const button = event.target.closest('[data-load-more]');
+    if (!button) {
+        return;
+    }
+
+    event.preventDefault();
+    const grid = document.querySelector(button.dataset.target);
+    if (!grid || button.classList.contains('disabled')) {
+        return;
+    }
+
+    button.classList.add('disabled');
+
+    try {
+        const response = await fetch(button.getAttribute('href'), {
+            headers: { 'X-Requested-With': 'XMLHttpRequest' }
+        });
+        const data = await response.json();
+
+        grid.insertAdjacentHTML('beforeend', data.html);
+
+        if (data.next_url) {
+            button.setAttribute('href', data.next_url);
+            button.classList.remove('disabled');
+        } else {
+            button.closest('.load-more-container').remove();
+        }
+    } catch (error) {
+        // Fall back to a normal page load
+        window.location.href = button.getAttribute('href');
+    }
+});
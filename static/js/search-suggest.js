@@ -0,0 +1,127 @@
+// Search-as-you-type suggestions
+//
+// Inputs marked with data-suggest-url fetch completions as the user types
+// and show them in a dropdown under the box. Arrow keys move through the
+// list, Enter opens the highlighted suggestion and Escape closes it.
+
+(function () {
+    const DEBOUNCE_MS = 120;
+    const MIN_LENGTH = 2;
+    const ICONS = {
+        category: 'fas fa-folder',
+        brand: 'fas fa-tag',
+        title: 'fas fa-search'
+    };
+
+    function escapeHtml(text) {
+        const div = document.createElement('div');
+        div.textContent = text;
+        return div.innerHTML;
+    }
+
+    function attach(input) {
+        const container = input.parentElement;
+        container.style.position = 'relative';
+
+        const menu = document.createElement('div');
+        menu.className = 'dropdown-menu w-100 shadow-sm';
+        menu.style.top = '100%';
+        menu.style.left = '0';
+        container.appendChild(menu);
+
+        let timer = null;
+        let controller = null;
+        let active = -1;
+
+        function items() {
+            return menu.querySelectorAll('.dropdown-item');
+        }
+
+        function close() {
+            menu.classList.remove('show');
+            active = -1;
+        }
+
+        function highlight(index) {
+            const links = items();
+            links.forEach(function (link, i) {
+                link.classList.toggle('active', i === index);
+            });
+            active = index;
+        }
+
+        function render(suggestions) {
+            if (!suggestions.length) {
+                close();
+                return;
+            }
+            menu.innerHTML = suggestions.map(function (suggestion) {
+                return '<a class="dropdown-item text-truncate" href="' + escapeHtml(suggestion.url) + '">' +
+                    '<i class="' + ICONS[suggestion.type] + ' text-muted me-2"></i>' +
+                    escapeHtml(suggestion.text) +
+                    '</a>';
+            }).join('');
+            menu.classList.add('show');
+            active = -1;
+        }
+
+        async function fetchSuggestions(query) {
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+
+            try {
+                const url = input.dataset.suggestUrl + '?q=' + encodeURIComponent(query);
+                const response = await fetch(url, { signal: controller.signal });
+                const data = await response.json();
+                if (data.query === input.value.trim()) {
+                    render(data.suggestions);
+                }
+            } catch (error) {
+                // Aborted by a newer keystroke, or offline: keep the plain search box
+            }
+        }
+
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            const query = input.value.trim();
+            if (query.length < MIN_LENGTH) {
+                close();
+                return;
+            }
+            timer = setTimeout(function () {
+                fetchSuggestions(query);
+            }, DEBOUNCE_MS);
+        });
+
+        input.addEventListener('keydown', function (event) {
+            const links = items();
+            if (!menu.classList.contains('show') || !links.length) {
+                return;
+            }
+
+            if (event.key === 'ArrowDown') {
+                event.preventDefault();
+                highlight((active + 1) % links.length);
+            } else if (event.key === 'ArrowUp') {
+                event.preventDefault();
+                highlight((active - 1 + links.length) % links.length);
+            } else if (event.key === 'Enter' && active >= 0) {
+                event.preventDefault();
+                window.location.href = links[active].getAttribute('href');
+            } else if (event.key === 'Escape') {
+                close();
+            }
+        });
+
+        input.addEventListener('blur', function () {
+            // Let a click on a suggestion land before the menu disappears
+            setTimeout(close, 150);
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('input[data-suggest-url]').forEach(attach);
+    });
+})();
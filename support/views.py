@@ -3,9 +3,9 @@ from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import CreateView, ListView, DetailView, TemplateView
 from django.urls import reverse_lazy
-from django.core.mail import send_mail, EmailMultiAlternatives
+from django.db import transaction
 from django.template.loader import render_to_string
-from django.conf import settings
+from notifications.outbox import queue_email
 from .models import SupportTicket, TicketReply
 from .forms import SupportTicketForm, TicketReplyForm
 
@@ -65,13 +65,15 @@ class CreateSupportTicketView(CreateView):
         if self.request.user.is_authenticated:
             form.instance.user = self.request.user
         
-        response = super().form_valid(form)
-        
-        # Send email notification to admin
-        self.send_admin_notification(self.object)
-        
-        # Send confirmation email to user
-        self.send_user_confirmation(self.object)
+        # The ticket and both emails are committed together; the outbox sends them afterwards
+        with transaction.atomic():
+            response = super().form_valid(form)
+            
+            # Queue email notification to admin
+            self.send_admin_notification(self.object)
+            
+            # Queue confirmation email to user
+            self.send_user_confirmation(self.object)
         
         messages.success(
             self.request, 
@@ -135,17 +137,17 @@ View and respond to this ticket in the admin panel.
             </html>
             """
             
-            email = EmailMultiAlternatives(
-                subject=subject,
-                body=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=['studiswap@gmail.com'],
-            )
-            email.attach_alternative(html_message, "text/html")
-            email.send(fail_silently=True)
+            # Own savepoint: a failed insert must not roll back the ticket
+            with transaction.atomic():
+                queue_email(
+                    subject=subject,
+                    body=message,
+                    html_body=html_message,
+                    to=['studiswap@gmail.com'],
+                )
             
         except Exception as e:
-            print(f"Error sending admin notification: {e}")
+            print(f"Error queueing admin notification: {e}")
     
     def send_user_confirmation(self, ticket):
         """Send confirmation email to user"""
@@ -201,17 +203,16 @@ STUDISWAP Support Team
             </html>
             """
             
-            email = EmailMultiAlternatives(
-                subject=subject,
-                body=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=[ticket.email],
-            )
-            email.attach_alternative(html_message, "text/html")
-            email.send(fail_silently=True)
+            with transaction.atomic():
+                queue_email(
+                    subject=subject,
+                    body=message,
+                    html_body=html_message,
+                    to=[ticket.email],
+                )
             
         except Exception as e:
-            print(f"Error sending user confirmation: {e}")
+            print(f"Error queueing user confirmation: {e}")
 
 
 class TicketSuccessView(TemplateView):